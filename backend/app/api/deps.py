@@ -4,10 +4,11 @@ Handles authentication using our simple token system.
 """
 
 from typing import Optional
-from fastapi import Depends, HTTPException, status, Header
+from fastapi import Depends, HTTPException, status, Header, Query, Request
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
+from app.core.database import get_db, SessionLocal
+from app.core.security import SIGNED_URL_PARAM, verify_signed_url
 from app.models.user import User, UserToken
 
 
@@ -110,3 +111,49 @@ def get_optional_current_user(
         return user if user and user.is_active else None
     except:
         return None
+
+
+def get_websocket_user(token: Optional[str]) -> Optional[User]:
+    """
+    Resolve the user for a WebSocket handshake token.
+
+    Browsers cannot set headers on WebSocket upgrades, so the token arrives
+    as a query parameter. A short-lived session is used so long-lived
+    sockets do not pin a database connection.
+    """
+    if not token:
+        return None
+
+    db = SessionLocal()
+    try:
+        db_token = db.query(UserToken).filter(UserToken.token == token).first()
+        if not db_token:
+            return None
+
+        user = db.query(User).filter(User.id == db_token.user_id).first()
+        return user if user and user.is_active else None
+    except:
+        return None
+    finally:
+        db.close()
+
+
+def require_signed_url(
+    request: Request,
+    sig: Optional[str] = Query(None, alias=SIGNED_URL_PARAM)
+) -> None:
+    """
+    Require a valid signed URL for the requested path.
+    
+    Media players and CDNs fetch video URLs without an Authorization
+    header, so access is granted by the signature in the query string.
+    
+    Raises:
+        HTTPException: If the signature is missing, invalid or expired
+    """
+    method = "GET" if request.method == "HEAD" else request.method
+    if not sig or not verify_signed_url(sig, request.url.path, method):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired signed URL"
+        )
@@ -5,7 +5,7 @@ Combines all endpoint routers into a single API router.
 
 from fastapi import APIRouter
 
-from app.api.v1.endpoints import auth, users, games, teams, videos, arena, streaming
+from app.api.v1.endpoints import auth, users, games, teams, videos, arena, streaming, websocket, jobs
 from app.core.config import settings
 
 # Create API router
@@ -54,6 +54,18 @@ api_router.include_router(
     tags=["Video Processing"]
 )
 
+api_router.include_router(
+    jobs.router,
+    prefix="/jobs",
+    tags=["Background Jobs"]
+)
+
+api_router.include_router(
+    websocket.router,
+    prefix="/ws",
+    tags=["WebSocket"]
+)
+
 # API version info endpoint
 @api_router.get("/", include_in_schema=False)
 async def api_info():
@@ -69,6 +81,8 @@ async def api_info():
             "games": f"{settings.API_V1_STR}/games",
             "arena": f"{settings.API_V1_STR}/arena",
             "streaming": f"{settings.API_V1_STR}/streaming",
-            "videos": f"{settings.API_V1_STR}/videos"
+            "videos": f"{settings.API_V1_STR}/videos",
+            "jobs": f"{settings.API_V1_STR}/jobs",
+            "websocket": f"{settings.API_V1_STR}/ws"
         }
     }
\ No newline at end of file
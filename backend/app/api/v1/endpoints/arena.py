@@ -2,21 +2,64 @@
 Arena configuration and camera positioning endpoints.
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Query, Request, Response
+from pydantic import BaseModel, Field
+from typing import List, Optional
+
+from app.core.config import settings
+from app.services.arena_service import CACHE_CONTROL, EncodedResponse, arena_registry
+from app.services.coverage_service import coverage_validator
+from app.services.placement_service import placement_optimizer
 
 router = APIRouter()
 
+# Cameras may stand off the ice (stands, benches); readings farther from the
+# rink origin than this, in feet, are rejected
+MAX_REPORT_DISTANCE_FT = 500.0
+
+
+class CameraReport(BaseModel):
+    """Where a camera actually is, in rink feet."""
+    camera_id: Optional[str] = None
+    position: str
+    x: float = Field(..., ge=-MAX_REPORT_DISTANCE_FT, le=MAX_REPORT_DISTANCE_FT, allow_inf_nan=False)
+    y: float = Field(..., ge=-MAX_REPORT_DISTANCE_FT, le=MAX_REPORT_DISTANCE_FT, allow_inf_nan=False)
+    angle: float = Field(..., ge=-360, le=360, allow_inf_nan=False)
+    field_of_view: Optional[float] = Field(None, gt=0, le=180)
+
+
+class CameraSetup(BaseModel):
+    cameras: List[CameraReport] = Field(..., max_length=settings.MAX_CAMERAS_PER_GAME)
+
+
+def encoded_response(request: Request, encoded: EncodedResponse) -> Response:
+    """Serve a pre-encoded body, answering conditional requests with 304."""
+    headers = {"ETag": encoded.etag, "Cache-Control": CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or encoded.etag in if_none_match):
+        return Response(status_code=304, headers=headers)
+    return Response(content=encoded.body, media_type="application/json", headers=headers)
+
 @router.get("/types")
-async def get_arena_types():
+async def get_arena_types(request: Request):
     """Get available arena types."""
-    return {"message": "Get arena types endpoint - to be implemented"}
+    return encoded_response(request, arena_registry.types_response)
 
 @router.get("/{arena_type}/positions")
-async def get_optimal_positions():
+async def get_optimal_positions(
+    request: Request,
+    arena_type: str,
+    camera_count: int = Query(settings.MAX_CAMERAS_PER_GAME, ge=1, le=settings.MAX_CAMERAS_PER_GAME),
+    strategy: str = Query("priority", pattern="^(priority|coverage)$"),
+    occupied: Optional[str] = Query(None, description="Comma-separated occupied positions (coverage strategy)")
+):
     """Get optimal camera positions for arena type."""
-    return {"message": "Get positions endpoint - to be implemented"}
+    if strategy == "coverage":
+        taken = [item.strip() for item in (occupied or "").split(",") if item.strip()]
+        return encoded_response(request, placement_optimizer.plan_response(arena_type, taken, camera_count))
+    return encoded_response(request, arena_registry.positions_response(arena_type, camera_count))
 
 @router.post("/{arena_type}/validate")
-async def validate_camera_setup():
+async def validate_camera_setup(arena_type: str, setup: CameraSetup):
     """Validate camera setup for position."""
-    return {"message": "Validate setup endpoint - to be implemented"}
\ No newline at end of file
+    return coverage_validator.validate(arena_type, [camera.model_dump() for camera in setup.cameras])
\ No newline at end of file
@@ -2,10 +2,25 @@
 Game session management endpoints for creating, joining, and coordinating games.
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel
+from typing import Optional
+
+from app.api.deps import get_current_active_user
+from app.core.config import settings
+from app.models.user import User
+from app.services.live_playlist import live_playlists
+from app.services.placement_service import placement_optimizer
+from app.services.position_service import position_service
+from app.websocket.presence import presence
 
 router = APIRouter()
 
+class PositionClaim(BaseModel):
+    preferred_position: Optional[str] = None
+    camera_count: int = settings.MAX_CAMERAS_PER_GAME
+    allow_fallback: bool = True
+
 @router.post("/")
 async def create_game():
     """Create new game session."""
@@ -24,4 +39,53 @@ async def join_game():
 @router.get("/join/{code}")
 async def join_by_code():
     """Join game by code."""
-    return {"message": "Join by code endpoint - to be implemented"}
\ No newline at end of file
+    return {"message": "Join by code endpoint - to be implemented"}
+
+@router.post("/{game_id}/end")
+async def end_game(
+    game_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """End a game's live streams and turn their playlists into VOD playlists."""
+    streams = await live_playlists.finalize_game(game_id)
+    return {"game_id": game_id, "finalized_streams": streams}
+
+@router.get("/{game_id}/positions")
+async def get_positions(game_id: str):
+    """Get camera position occupancy for a game."""
+    occupancy = await position_service.occupancy(game_id)
+    taken = [p for p, owner in occupancy.items() if owner is not None]
+    return {
+        "game_id": game_id,
+        "positions": occupancy,
+        "available": [p for p, owner in occupancy.items() if owner is None],
+        "recommended_next": placement_optimizer.next_position(position_service.arena_type, taken)
+    }
+
+@router.post("/{game_id}/position")
+async def claim_position(
+    game_id: str,
+    claim: PositionClaim,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Claim a camera position, falling back through the priority order."""
+    assignment = await position_service.claim(
+        game_id,
+        str(current_user.id),
+        preferred=claim.preferred_position,
+        camera_count=claim.camera_count,
+        allow_fallback=claim.allow_fallback
+    )
+    presence.update(game_id, assignment.user_id, position=assignment.position)
+    return assignment.to_dict()
+
+@router.delete("/{game_id}/position")
+async def release_position(
+    game_id: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Release the current user's camera position."""
+    position = await position_service.release(game_id, str(current_user.id))
+    if position is not None:
+        presence.update(game_id, str(current_user.id), position=None)
+    return {"game_id": game_id, "released_position": position}
\ No newline at end of file
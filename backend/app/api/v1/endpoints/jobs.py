@@ -0,0 +1,37 @@
+"""
+Background job status endpoints.
+
+Jobs are queued by other endpoints through the local job engine
+(``app.workers.engine``); clients poll ``GET /{job_id}`` for the state and
+the progress meta the task reports.
+"""
+
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+
+from app.api.deps import get_current_active_user
+from app.models.user import User
+from app.workers.engine import job_engine
+
+router = APIRouter()
+
+@router.get("/")
+async def get_job_stats(current_user: User = Depends(get_current_active_user)):
+    """Worker pool and queue counters."""
+    return job_engine.stats()
+
+@router.get("/{job_id}")
+async def get_job(job_id: str, current_user: User = Depends(get_current_active_user)):
+    """Job state, progress and result."""
+    record = await run_in_threadpool(job_engine.get, job_id, str(current_user.id))
+    return record.status()
+
+@router.delete("/{job_id}")
+async def revoke_job(
+    job_id: str,
+    terminate: bool = False,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Cancel a queued job; ``terminate`` also stops it while running."""
+    record = await run_in_threadpool(job_engine.revoke, job_id, terminate, str(current_user.id))
+    return record.status()
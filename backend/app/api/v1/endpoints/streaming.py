@@ -1,22 +1,176 @@
 """
 Real-time streaming and video upload endpoints.
+
+Uploads are resumable: ``/start`` allocates a session for the full file,
+each ``/{session_id}/chunk`` names its byte offset (``Upload-Offset``
+header or ``offset`` query parameter), and ``/{session_id}/status``
+returns the ranges still missing so a client only resends what was lost.
+Chunk bodies are streamed straight to disk and never buffered whole.
+
+A chunk sent with an ``Upload-Digest`` header (hex BLAKE2b-256) is verified
+and stored by content. ``HEAD /chunks/{digest}`` tells a client whether the
+server already has it, in which case the same chunk request with an empty
+body links the stored copy instead of transferring it again.
+
+The first chunk is checked against the supported container formats, so a
+wrong file is rejected before the rest is sent, and ``/stop`` returns the
+MP4/MOV metadata (duration, resolution, codecs, frame rate, creation time).
+
+Sessions started with ``live: true`` become the camera's live HLS playlist.
+MPEG-TS and fragmented MP4 are cut at keyframes into segments as their
+contiguous range grows; with ffmpeg, other formats are segmented once the
+upload is complete.
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Optional
+
+from app.api.deps import get_current_active_user
+from app.core.exceptions import ChunkNotFoundException, InvalidUploadRangeException, InvalidVideoFormatException
+from app.models.user import User
+from app.services.chunk_store import chunk_store
+from app.services.live_playlist import live_playlists
+from app.services.upload_service import UploadSession, upload_service
+from app.utils.media_probe import HEADER_BYTES, media_probe
 
 router = APIRouter()
 
+class UploadStart(BaseModel):
+    upload_length: int = Field(..., gt=0)
+    game_id: Optional[str] = None
+    position: Optional[str] = None
+    filename: Optional[str] = None
+    live: bool = False
+
+class UploadStop(BaseModel):
+    session_id: str
+
+def live_stream_name(session: UploadSession) -> str:
+    """Live playlist name of an upload: its camera position, else its owner."""
+    return session.metadata.get("position") or f"camera-{session.owner}"
+
+def read_upload_header(session: UploadSession) -> bytes:
+    with open(upload_service.data_path(session.session_id), "rb") as f:
+        return f.read(min(session.offset, HEADER_BYTES))
+
+def check_upload_format(session: UploadSession) -> None:
+    """Reject and discard an upload whose first bytes are not a supported video."""
+    header = read_upload_header(session)
+    live = bool(session.metadata.get("live"))
+    try:
+        format_type = media_probe.check_header(header, session.length, live=live)
+        if live:
+            live_playlists.check_upload(header, format_type)
+    except InvalidVideoFormatException:
+        upload_service.discard(session.session_id)
+        raise
+
+def probe_upload(session: UploadSession) -> Optional[Dict[str, Any]]:
+    """Container metadata of a finished MP4/MOV upload; discards it if unreadable."""
+    live = bool(session.metadata.get("live"))
+    if media_probe.check_header(read_upload_header(session), live=live) not in ("mp4", "mov"):
+        return None
+    try:
+        return media_probe.probe(upload_service.data_path(session.session_id)).to_dict()
+    except InvalidVideoFormatException:
+        upload_service.discard(session.session_id)
+        raise
+
+def upload_headers(response: Response, status: dict) -> dict:
+    """Mirror the tus offset headers on a status body."""
+    response.headers["Upload-Offset"] = str(status["upload_offset"])
+    response.headers["Upload-Length"] = str(status["upload_length"])
+    return status
+
 @router.post("/start")
-async def start_streaming():
-    """Start streaming session."""
-    return {"message": "Start streaming endpoint - to be implemented"}
+async def start_streaming(
+    start: UploadStart,
+    response: Response,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Start a resumable upload session."""
+    metadata = start.model_dump(exclude={"upload_length"}, exclude_none=True)
+    session = await run_in_threadpool(
+        upload_service.create, str(current_user.id), start.upload_length, metadata
+    )
+    status = session.status()
+    status["chunk_size"] = upload_service.chunk_size
+    return upload_headers(response, status)
 
 @router.post("/stop")
-async def stop_streaming():
-    """Stop streaming session."""
-    return {"message": "Stop streaming endpoint - to be implemented"}
+async def stop_streaming(
+    stop: UploadStop,
+    response: Response,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Finish an upload once every byte has been received."""
+    session = await run_in_threadpool(upload_service.finish, stop.session_id, str(current_user.id))
+    status = session.status()
+    status["media"] = await run_in_threadpool(probe_upload, session)
+    return upload_headers(response, status)
+
+@router.get("/{session_id}/status")
+async def upload_status(
+    session_id: str,
+    response: Response,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get received and missing byte ranges of an upload."""
+    session = await run_in_threadpool(upload_service.get, session_id, str(current_user.id))
+    return upload_headers(response, session.status())
+
+@router.head("/chunks/{digest}")
+async def chunk_exists(
+    digest: str,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Check whether you already uploaded a chunk, without transferring it."""
+    size = chunk_store.size(digest, str(current_user.id))
+    if size is None:
+        raise ChunkNotFoundException(digest)
+    return Response(headers={"Content-Length": str(size), "Upload-Digest": digest})
 
 @router.post("/{session_id}/chunk")
-async def upload_chunk():
-    """Upload video chunk."""
-    return {"message": "Upload chunk endpoint - to be implemented"}
\ No newline at end of file
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: Optional[int] = Header(None),
+    upload_digest: Optional[str] = Header(None),
+    offset: Optional[int] = Query(None),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Upload a video chunk at its byte offset; resending a chunk is safe."""
+    start = upload_offset if upload_offset is not None else offset
+    if start is None:
+        raise InvalidUploadRangeException(session_id, -1, 0, "Upload-Offset header or offset parameter required")
+    declared = request.headers.get("content-length")
+    if declared is not None and declared.isdigit() and int(declared) > upload_service.max_chunk:
+        raise InvalidUploadRangeException(
+            session_id, start, int(declared), f"chunk exceeds {upload_service.max_chunk} bytes"
+        )
+
+    if upload_digest is None:
+        session = await upload_service.write_stream(session_id, start, request.stream(), str(current_user.id))
+    elif declared == "0":
+        session = await run_in_threadpool(
+            upload_service.link_chunk, session_id, start, upload_digest.lower(), str(current_user.id)
+        )
+    else:
+        session = await upload_service.write_chunk_stream(
+            session_id, start, request.stream(), upload_digest.lower(), str(current_user.id)
+        )
+    if start < HEADER_BYTES:
+        await run_in_threadpool(check_upload_format, session)
+
+    if session.metadata.get("live") and session.metadata.get("game_id"):
+        await live_playlists.publish_upload(
+            session.metadata["game_id"],
+            live_stream_name(session),
+            upload_service.data_path(session_id),
+            session.offset,
+            session.offset == session.length
+        )
+    return upload_headers(response, session.status())
@@ -1,25 +1,136 @@
 """
 Video processing, access, and download endpoints.
+
+Stream and download URLs are signed (``GET /{video_id}/url``), so players
+and CDNs can fetch them without an Authorization header. Live HLS playlists
+(``GET /live/{game_id}``) share one signature per stream between the
+playlist and its segments.
 """
 
-from fastapi import APIRouter
+import re
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+
+from app.api.deps import get_current_active_user, require_signed_url
+from app.core.config import settings
+from app.core.exceptions import VideoNotFoundException
+from app.core.security import SIGNED_URL_PARAM, create_signed_url, sign_resource, verify_signed_url
+from app.models.user import User
+from app.services.live_playlist import live_playlists
+from app.services.video_delivery import VideoAsset, range_response, video_library
 
 router = APIRouter()
 
+_LIVE_SEGMENT = re.compile(r"^(\d+\.(ts|m4s)|init\.mp4)$")
+
+def live_resource(game_id: str, stream: str) -> str:
+    """Path a live stream's signature covers (playlist and segments)."""
+    return f"{settings.API_V1_STR}/videos/live/{game_id}/{stream}"
+
+def require_live_signature(game_id: str, stream: str, sig: Optional[str]) -> None:
+    if not sig or not verify_signed_url(sig, live_resource(game_id, stream), "GET"):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid or expired signed URL"
+        )
+
+@router.get("/live/{game_id}")
+async def get_live_streams(
+    game_id: str,
+    expires_in: int = 3600,
+    current_user: User = Depends(get_current_active_user)
+):
+    """List a game's live streams with signed playlist URLs."""
+    streams = []
+    for stream in live_playlists.streams(game_id):
+        playlist = live_playlists.get(game_id, stream)
+        token, expires_at = sign_resource(live_resource(game_id, stream), expires_in)
+        streams.append({
+            "stream": stream,
+            "playlist_url": f"{live_resource(game_id, stream)}.m3u8?{SIGNED_URL_PARAM}={token}",
+            "segments": playlist.next_sequence,
+            "ended": playlist.ended,
+            "expires_at": expires_at
+        })
+    return {"game_id": game_id, "streams": streams}
+
+@router.get("/live/{game_id}/{stream}.m3u8")
+async def get_live_playlist(
+    game_id: str,
+    stream: str,
+    hls_msn: Optional[int] = Query(None, alias="_HLS_msn"),
+    sig: Optional[str] = Query(None, alias=SIGNED_URL_PARAM)
+):
+    """HLS media playlist; ``_HLS_msn`` blocks until that segment exists."""
+    require_live_signature(game_id, stream, sig)
+    playlist = live_playlists.get(game_id, stream)
+    if hls_msn is not None:
+        if hls_msn > playlist.next_sequence + 2:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="_HLS_msn is too far ahead of the playlist"
+            )
+        if not await live_playlists.wait(playlist, hls_msn):
+            return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    return Response(
+        content=playlist.render(f"?{SIGNED_URL_PARAM}={sig}"),
+        media_type="application/vnd.apple.mpegurl",
+        headers={"Cache-Control": "max-age=86400" if playlist.ended else "no-cache"}
+    )
+
+@router.api_route("/live/{game_id}/{stream}/{segment}", methods=["GET", "HEAD"])
+async def get_live_segment(
+    game_id: str,
+    stream: str,
+    segment: str,
+    request: Request,
+    sig: Optional[str] = Query(None, alias=SIGNED_URL_PARAM)
+):
+    """Live segment; segments never change once published."""
+    require_live_signature(game_id, stream, sig)
+    playlist = live_playlists.get(game_id, stream)
+    if not _LIVE_SEGMENT.match(segment):
+        raise VideoNotFoundException(f"{game_id}/{stream}/{segment}")
+    try:
+        asset = VideoAsset(f"{game_id}/{stream}/{segment}", playlist.segment_path(segment))
+    except FileNotFoundError:
+        raise VideoNotFoundException(f"{game_id}/{stream}/{segment}")
+    return range_response(request, asset)
+
 @router.get("/{video_id}")
 async def get_video():
     """Get video details."""
     return {"message": "Get video endpoint - to be implemented"}
 
-@router.get("/{video_id}/download")
-async def download_video():
-    """Download processed video."""
-    return {"message": "Download video endpoint - to be implemented"}
+@router.get("/{video_id}/url")
+async def get_video_urls(
+    video_id: str,
+    expires_in: int = 3600,
+    current_user: User = Depends(get_current_active_user)
+):
+    """Issue signed stream and download URLs for a video."""
+    await video_library.resolve(video_id)
+    base = f"{settings.API_V1_STR}/videos/{video_id}"
+    _, expires_at = sign_resource(f"{base}/stream", expires_in)
+    return {
+        "video_id": video_id,
+        "stream_url": create_signed_url(f"{base}/stream", expires_in),
+        "download_url": create_signed_url(f"{base}/download", expires_in),
+        "expires_at": expires_at
+    }
+
+@router.api_route("/{video_id}/download", methods=["GET", "HEAD"], dependencies=[Depends(require_signed_url)])
+async def download_video(video_id: str, request: Request):
+    """Download processed video; resumable with Range requests."""
+    asset = await video_library.resolve(video_id)
+    return range_response(request, asset, filename=asset.filename)
 
-@router.get("/{video_id}/stream")
-async def stream_video():
-    """Stream video content."""
-    return {"message": "Stream video endpoint - to be implemented"}
+@router.api_route("/{video_id}/stream", methods=["GET", "HEAD"], dependencies=[Depends(require_signed_url)])
+async def stream_video(video_id: str, request: Request):
+    """Stream video content with byte-range seeking."""
+    return range_response(request, await video_library.resolve(video_id))
 
 @router.get("/game/{game_id}")
 async def get_game_videos():
@@ -0,0 +1,170 @@
+"""
+WebSocket endpoints for live game coordination.
+"""
+
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+
+from app.api.deps import get_websocket_user
+from app.core.exceptions import InvalidMessageException, WebSocketConnectionException
+from app.services.position_service import position_service
+from app.websocket.broadcast import broadcast_bus
+from app.websocket.connection_manager import (
+    CLOSE_POLICY_VIOLATION,
+    CLOSE_TRY_AGAIN_LATER,
+    GameConnection,
+    connection_manager,
+)
+from app.websocket.game_state import game_state
+from app.websocket.presence import presence
+from app.websocket.protocol import (
+    TelemetryDecoder,
+    TelemetryReport,
+    encode_control,
+    negotiate,
+)
+from app.websocket.sync_manager import clock_sync
+
+router = APIRouter()
+
+CLIENT_ROLES = ("camera", "viewer")
+
+
+async def check_game_access(game_id: str, user_id: str, role: str) -> Optional[str]:
+    """
+    Check that the game is live and the user may join it in this role.
+
+    Games exist while cameras hold positions in them. Cameras must hold one
+    of those positions themselves before they may publish telemetry.
+
+    Returns:
+        The reason to refuse the socket, or None if it may be accepted
+    """
+    owners = [owner for owner in (await position_service.occupancy(game_id)).values() if owner]
+    if not owners:
+        return f"Unknown game: {game_id}"
+    if role == "camera" and user_id not in owners:
+        return "Claim a camera position before joining as a camera"
+    return None
+
+
+def publish_telemetry(connection: GameConnection, report: TelemetryReport) -> None:
+    """Fan a camera's latest report out to the game; stale reports coalesce."""
+    event = report.to_dict()
+    event["type"] = "telemetry"
+    event["camera"] = connection.user_id
+    broadcast_bus.publish(connection.game_id, event, key=f"telemetry:{connection.user_id}")
+
+
+@router.websocket("/game/{game_id}")
+async def game_websocket(
+    websocket: WebSocket,
+    game_id: str,
+    token: Optional[str] = Query(None),
+    role: str = Query("viewer")
+):
+    """
+    Game coordination WebSocket for cameras and viewers.
+
+    Clients may offer the ``hlt.bin.v1`` subprotocol for compact binary
+    telemetry; anything else falls back to JSON messages. Every socket is
+    greeted with the game log's ``epoch`` and head ``seq``; a reconnecting
+    client sends ``resume`` with the last ``event_seq`` it saw. Cameras
+    must answer ``clock_sync`` probes with their own clock in ``client_ts``
+    and may only join once they hold a camera position in the game.
+    """
+    user = await run_in_threadpool(get_websocket_user, token)
+    if user is None:
+        await websocket.close(code=CLOSE_POLICY_VIOLATION, reason="Invalid or missing token")
+        return
+
+    if role not in CLIENT_ROLES:
+        await websocket.close(code=CLOSE_POLICY_VIOLATION, reason=f"Unknown role: {role}")
+        return
+
+    refusal = await check_game_access(game_id, str(user.id), role)
+    if refusal is not None:
+        await websocket.close(code=CLOSE_POLICY_VIOLATION, reason=refusal)
+        return
+
+    try:
+        connection = await connection_manager.connect(
+            websocket,
+            game_id,
+            user_id=str(user.id),
+            role=role,
+            subprotocol=negotiate(websocket.scope.get("subprotocols", []))
+        )
+    except WebSocketConnectionException as e:
+        await websocket.close(code=CLOSE_TRY_AGAIN_LATER, reason=e.message)
+        return
+
+    decoder = TelemetryDecoder()
+    try:
+        await broadcast_bus.join(game_id)
+        log = game_state.get(game_id)
+        connection_manager.send(connection, {
+            "type": "welcome",
+            "game_id": game_id,
+            "epoch": log.epoch,
+            "seq": log.head,
+            "protocol": connection.protocol or "json"
+        })
+        presence.send_snapshot(connection)
+        if role == "camera":
+            presence.update(game_id, connection.user_id, status="online")
+            clock_sync.start(connection)
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            connection.touch()
+
+            data = frame.get("bytes")
+            if data is not None:
+                if role != "camera":
+                    continue
+                try:
+                    publish_telemetry(connection, decoder.decode(data))
+                except InvalidMessageException:
+                    connection_manager.send(
+                        connection, encode_control("request_keyframe", protocol=connection.protocol)
+                    )
+                continue
+
+            try:
+                message = json.loads(frame.get("text") or "")
+            except ValueError:
+                continue
+            if not isinstance(message, dict):
+                continue
+
+            message_type = message.get("type")
+            if message_type == "ping":
+                connection_manager.send(connection, {"type": "pong", "ts": message.get("ts")})
+            elif message_type == "resume":
+                try:
+                    last_seq = int(message.get("last_seq", 0))
+                except (TypeError, ValueError):
+                    last_seq = 0
+                log = game_state.get(game_id)
+                connection_manager.send(connection, log.resume(message.get("epoch"), last_seq))
+                presence.send_snapshot(connection)
+            elif message_type == "clock_sync" and role == "camera":
+                clock_sync.handle_reply(connection, message)
+            elif message_type == "telemetry" and role == "camera":
+                try:
+                    publish_telemetry(connection, decoder.decode_json(message))
+                except InvalidMessageException as e:
+                    connection_manager.send(connection, {"type": "error", "message": e.message})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if role == "camera":
+            clock_sync.stop(connection)
+            presence.leave(game_id, connection.user_id)
+        connection_manager.disconnect(connection)
+        await broadcast_bus.leave(game_id)
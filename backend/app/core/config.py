@@ -27,6 +27,9 @@ class Settings(BaseSettings):
     JWT_ALGORITHM: str = "HS256"
     JWT_ACCESS_TOKEN_EXPIRE_HOURS: int = 24
     JWT_REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    URL_SIGNING_KEYS: str = ""  # "kid:secret,kid:secret"; first signs, all verify
+    SIGNED_URL_BUCKET_SECONDS: int = 300  # expiry rounding, keeps URLs cacheable
+    SIGNED_URL_CACHE_SIZE: int = 4096  # recently verified signatures
     
     # Database settings (SQLite for local development)
     DATABASE_URL: str = "sqlite:///./hockey_live.db"
@@ -62,12 +65,17 @@ class Settings(BaseSettings):
     AWS_REGION: str = "us-east-1"
     AWS_S3_BUCKET: str = "dev-bucket"
     AWS_CLOUDFRONT_DOMAIN: Optional[str] = None
+    AWS_S3_ENDPOINT_URL: Optional[str] = None  # S3-compatible stores (MinIO, moto server)
+    STORAGE_BACKEND: str = "local"  # local (VIDEO_STORAGE_DIR) or s3
+    S3_MULTIPART_PART_MB: int = 16
+    S3_UPLOAD_CONCURRENCY: int = 8  # parallel part uploads (and pooled connections)
     
     # Video processing settings
     MAX_VIDEO_SIZE_MB: int = 500
     SUPPORTED_VIDEO_FORMATS: List[str] = ["mp4", "mov", "avi", "mkv"]
     VIDEO_PROCESSING_TIMEOUT: int = 300  # 5 minutes
     VIDEO_CHUNK_SIZE_MB: int = 10
+    VIDEO_STORAGE_DIR: str = "/tmp/hockey_videos"  # processed videos, {video_id}.{format}
     
     @field_validator("SUPPORTED_VIDEO_FORMATS", mode="before")
     @classmethod
@@ -85,11 +93,21 @@ class Settings(BaseSettings):
     # WebSocket settings
     WEBSOCKET_HEARTBEAT_INTERVAL: int = 30  # seconds
     MAX_WEBSOCKET_CONNECTIONS_PER_GAME: int = 10
+    BROADCAST_BACKEND: str = "memory"  # memory (single worker) or redis
+    BROADCAST_TICK_MS: int = 50  # cross-worker batching window
+    GAME_EVENT_LOG_SIZE: int = 1024  # events kept in memory per game for resume
+    GAME_STATE_DIR: Optional[str] = None  # append-only event logs; disabled when unset
+    PRESENCE_TICK_MS: int = 250  # roster changes are merged into one diff per tick
+    CLOCK_SYNC_SAMPLES: int = 8  # probes per clock-sync burst
+    CLOCK_SYNC_INTERVAL: int = 300  # seconds between bursts (drift tracking)
     
     # Background task settings (optional for local development)
     CELERY_BROKER_URL: str = "redis://localhost:6379/1"
     CELERY_RESULT_BACKEND: str = "redis://localhost:6379/1"
     CELERY_TASK_TIMEOUT: int = 600  # 10 minutes
+    JOB_WORKERS: int = 2  # local job engine worker processes
+    JOB_STATE_DIR: str = "/tmp/hockey_jobs"
+    JOB_RESULT_EXPIRES: int = 86400  # seconds finished jobs stay queryable
     
     @field_validator("CELERY_BROKER_URL", mode="before")
     @classmethod
@@ -125,6 +143,8 @@ class Settings(BaseSettings):
     MAX_UPLOAD_SIZE_MB: int = 100
     UPLOAD_CHUNK_SIZE_KB: int = 256
     TEMP_UPLOAD_DIR: str = "/tmp/hockey_uploads"
+    UPLOAD_CLEANUP_INTERVAL: int = 600  # seconds between expired-session sweeps
+    CHUNK_GC_GRACE_SECONDS: int = 3600  # unreferenced chunks survive this long
     
     # Arena positioning settings
     POSITION_VALIDATION_TOLERANCE: float = 2.0  # meters
@@ -135,6 +155,18 @@ class Settings(BaseSettings):
     DEFAULT_OUTPUT_RESOLUTION: str = "1080p"
     DEFAULT_OUTPUT_FPS: int = 30
     VIDEO_COMPILATION_TIMEOUT: int = 1800  # 30 minutes
+    FFMPEG_BINARY: Optional[str] = None  # defaults to ffmpeg on PATH when installed
+    HLS_DIR: str = "/tmp/hockey_hls"  # live segments and playlists
+    HLS_TARGET_DURATION: int = 6  # seconds
+    AUDIO_SYNC_SAMPLE_RATE: int = 8000  # Hz decoded for audio alignment
+    AUDIO_SYNC_MAX_OFFSET_SECONDS: int = 300  # largest start difference searched
+    CAMERA_SWITCH_PENALTY: float = 1.0  # score-seconds a cut must gain
+    MIN_SHOT_SECONDS: float = 3.0
+    FRAME_POOL_WORKERS: int = 0  # 0 = one decode/analysis process per core
+    FRAME_POOL_MAX_FRAMES: int = 300  # frames per shared-memory slot (one chunk)
+    FRAME_ANALYSIS_WIDTH: int = 320
+    FRAME_ANALYSIS_HEIGHT: int = 180
+    FRAME_ANALYSIS_FPS: int = 10
     
     class Config:
         env_file = ".env"
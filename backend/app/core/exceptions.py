@@ -3,7 +3,7 @@ Custom exceptions for Hockey Live App backend.
 Provides detailed error handling for various application scenarios.
 """
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 
 class CustomException(Exception):
@@ -309,6 +309,66 @@ class FileUploadException(CustomException):
         )
 
 
+class UploadSessionNotFoundException(CustomException):
+    """Raised when a resumable upload session does not exist or has expired."""
+    
+    def __init__(self, session_id: str):
+        super().__init__(
+            message=f"Upload session not found: {session_id}",
+            code=404,
+            error_code="UPLOAD_SESSION_NOT_FOUND",
+            details={"session_id": session_id}
+        )
+
+
+class InvalidUploadRangeException(CustomException):
+    """Raised when a chunk's byte range does not fit the upload."""
+    
+    def __init__(self, session_id: str, offset: int, length: int, reason: str):
+        super().__init__(
+            message=f"Invalid upload range: {reason}",
+            code=400,
+            error_code="INVALID_UPLOAD_RANGE",
+            details={"session_id": session_id, "offset": offset, "length": length, "reason": reason}
+        )
+
+
+class UploadIncompleteException(CustomException):
+    """Raised when finishing an upload that still has missing byte ranges."""
+    
+    def __init__(self, session_id: str, missing: List[List[int]]):
+        super().__init__(
+            message=f"Upload {session_id} is missing {len(missing)} byte range(s)",
+            code=409,
+            error_code="UPLOAD_INCOMPLETE",
+            details={"session_id": session_id, "missing": missing}
+        )
+
+
+class ChunkNotFoundException(CustomException):
+    """Raised when a chunk digest is not in the chunk store."""
+    
+    def __init__(self, digest: str):
+        super().__init__(
+            message=f"Chunk not found: {digest}",
+            code=404,
+            error_code="CHUNK_NOT_FOUND",
+            details={"digest": digest}
+        )
+
+
+class ChunkDigestMismatchException(CustomException):
+    """Raised when an uploaded chunk does not hash to its declared digest."""
+    
+    def __init__(self, expected: str, actual: str):
+        super().__init__(
+            message="Chunk content does not match its digest",
+            code=400,
+            error_code="CHUNK_DIGEST_MISMATCH",
+            details={"expected": expected, "actual": actual}
+        )
+
+
 class StorageException(CustomException):
     """Raised when storage operation fails."""
     
@@ -321,6 +381,32 @@ class StorageException(CustomException):
         )
 
 
+# Background Job Exceptions
+
+class JobNotFoundException(CustomException):
+    """Raised when a background job does not exist or its result has expired."""
+    
+    def __init__(self, job_id: str):
+        super().__init__(
+            message=f"Job not found: {job_id}",
+            code=404,
+            error_code="JOB_NOT_FOUND",
+            details={"job_id": job_id}
+        )
+
+
+class JobFailedException(CustomException):
+    """Raised when waiting on a background job that failed, timed out or was revoked."""
+    
+    def __init__(self, job_id: str, error_details: str):
+        super().__init__(
+            message=f"Job failed: {error_details}",
+            code=500,
+            error_code="JOB_FAILED",
+            details={"job_id": job_id, "error": error_details}
+        )
+
+
 # Validation Exceptions
 
 class ValidationException(CustomException):
@@ -360,4 +446,16 @@ class WebSocketConnectionException(CustomException):
             code=400,
             error_code="WEBSOCKET_CONNECTION_FAILED",
             details={"reason": reason}
+        )
+
+
+class InvalidMessageException(CustomException):
+    """Raised when a WebSocket message cannot be decoded."""
+    
+    def __init__(self, reason: str):
+        super().__init__(
+            message=f"Invalid WebSocket message: {reason}",
+            code=400,
+            error_code="INVALID_MESSAGE",
+            details={"reason": reason}
         )
\ No newline at end of file
@@ -3,8 +3,13 @@ Security utilities for authentication and authorization.
 Handles JWT token generation, password hashing, and role-based access control.
 """
 
+import base64
+import hashlib
+import hmac
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
+from typing import Any, Dict, Optional, Tuple, Union
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 from fastapi import HTTPException, status
@@ -215,6 +220,101 @@ def generate_game_code() -> str:
     chars = "ABCDEFGHIJKLMNPQRSTUVWXYZ123456789"  # No O, 0
     return ''.join(random.choices(chars, k=settings.GAME_CODE_LENGTH))
 
+# Compact signed URLs
+#
+# Token format: "{kid}~{expiry in base 36}~{signature}", where the signature is
+# HMAC-SHA256 over "METHOD\nresource\nexpiry\nkid", truncated to 128 bits and
+# base64url encoded. Expiry is rounded up to SIGNED_URL_BUCKET_SECONDS, so every
+# URL for a resource issued within one bucket is identical and CDN-cacheable.
+
+SIGNED_URL_PARAM = "sig"
+
+_signing_keys: Dict[str, bytes] = {}
+_active_kid: Optional[str] = None
+_verified: "OrderedDict[Tuple[str, str, str], int]" = OrderedDict()
+
+
+def _load_signing_keys() -> None:
+    """Load URL_SIGNING_KEYS ("kid:secret,..."; first entry signs), or derive one from SECRET_KEY."""
+    global _active_kid
+    for entry in settings.URL_SIGNING_KEYS.split(","):
+        kid, _, secret = entry.strip().partition(":")
+        if kid and secret:
+            add_signing_key(kid, secret, activate=_active_kid is None)
+    if _active_kid is None:
+        derived = hmac.new(settings.SECRET_KEY.encode(), b"signed-url", hashlib.sha256).hexdigest()
+        add_signing_key("k0", derived)
+
+
+def add_signing_key(kid: str, secret: str, activate: bool = True) -> None:
+    """
+    Add a URL signing key; old keys keep verifying until retired.
+    
+    Args:
+        kid: Short key id embedded in every token (no "~")
+        secret: Key material
+        activate: Sign new URLs with this key
+    """
+    global _active_kid
+    if not kid or "~" in kid:
+        raise ValueError(f"Invalid signing key id: {kid!r}")
+    _signing_keys[kid] = secret.encode()
+    if activate:
+        _active_kid = kid
+    _verified.clear()
+
+
+def retire_signing_key(kid: str) -> None:
+    """Stop accepting URLs signed with a key."""
+    if kid == _active_kid:
+        raise ValueError("Cannot retire the active signing key")
+    _signing_keys.pop(kid, None)
+    _verified.clear()
+
+
+def _url_signature(key: bytes, method: str, resource_path: str, expiry: str, kid: str) -> str:
+    message = f"{method.upper()}\n{resource_path}\n{expiry}\n{kid}".encode()
+    digest = hmac.new(key, message, hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def _to_base36(value: int) -> str:
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+    encoded = ""
+    while True:
+        value, remainder = divmod(value, 36)
+        encoded = digits[remainder] + encoded
+        if not value:
+            return encoded
+
+
+def sign_resource(
+    resource_path: str,
+    expires_in: int = 3600,
+    method: str = "GET",
+    now: Optional[float] = None
+) -> Tuple[str, int]:
+    """
+    Create a compact signature token for a resource.
+    
+    Args:
+        resource_path: Path the token grants access to
+        expires_in: Minimum validity in seconds
+        method: HTTP method the token is valid for
+        now: Current UNIX time (for tests)
+        
+    Returns:
+        Token and its expiry as a UNIX timestamp
+    """
+    bucket = settings.SIGNED_URL_BUCKET_SECONDS
+    expiry = -(-int((now or time.time()) + expires_in) // bucket) * bucket
+    encoded_expiry = _to_base36(expiry)
+    signature = _url_signature(
+        _signing_keys[_active_kid], method, resource_path, encoded_expiry, _active_kid
+    )
+    return f"{_active_kid}~{encoded_expiry}~{signature}", expiry
+
+
 def create_signed_url(
     resource_path: str, 
     expires_in: int = 3600,
@@ -231,34 +331,70 @@ def create_signed_url(
     Returns:
         Signed URL string
     """
-    expire = datetime.utcnow() + timedelta(seconds=expires_in)
-    
-    payload = {
-        "resource": resource_path,
-        "method": method,
-        "exp": expire
-    }
-    
-    token = jwt.encode(
-        payload,
-        settings.SECRET_KEY,
-        algorithm=settings.JWT_ALGORITHM
-    )
-    
-    return f"/api/v1/secure/{token}"
+    token, _ = sign_resource(resource_path, expires_in, method)
+    return f"{resource_path}?{SIGNED_URL_PARAM}={token}"
 
-def verify_signed_url(token: str, resource_path: str, method: str) -> bool:
+def verify_signed_url(
+    token: str,
+    resource_path: str,
+    method: str,
+    now: Optional[float] = None
+) -> bool:
     """
     Verify a signed URL token.
     
+    Compact tokens are checked with a constant-time HMAC compare, and
+    recently verified ones are remembered until they expire. JWT tokens
+    from the previous format are still accepted.
+    
     Args:
         token: Signed URL token
         resource_path: Expected resource path
         method: Expected HTTP method
+        now: Current UNIX time (for tests)
         
     Returns:
         True if URL is valid, False otherwise
     """
+    if token.startswith("eyJ"):
+        return _verify_jwt_signed_url(token, resource_path, method)
+    
+    now = now or time.time()
+    key = (token, resource_path, method.upper())
+    expiry = _verified.get(key)
+    if expiry is not None:
+        if now < expiry:
+            _verified.move_to_end(key)
+            return True
+        _verified.pop(key, None)
+        return False
+    
+    kid, _, rest = token.partition("~")
+    encoded_expiry, _, signature = rest.partition("~")
+    secret = _signing_keys.get(kid)
+    if secret is None or not encoded_expiry or not signature:
+        return False
+    try:
+        expiry = int(encoded_expiry, 36)
+    except ValueError:
+        return False
+    if now >= expiry:
+        return False
+    
+    expected = _url_signature(secret, method, resource_path, encoded_expiry, kid)
+    try:
+        # compare_digest rejects str arguments with non-ASCII characters
+        if not hmac.compare_digest(expected.encode("ascii"), signature.encode("ascii")):
+            return False
+    except UnicodeEncodeError:
+        return False
+    
+    _verified[key] = expiry
+    if len(_verified) > settings.SIGNED_URL_CACHE_SIZE:
+        _verified.popitem(last=False)
+    return True
+
+def _verify_jwt_signed_url(token: str, resource_path: str, method: str) -> bool:
     try:
         payload = jwt.decode(
             token,
@@ -272,4 +408,7 @@ def verify_signed_url(token: str, resource_path: str, method: str) -> bool:
         )
         
     except JWTError:
-        return False
\ No newline at end of file
+        return False
+
+
+_load_signing_keys()
@@ -6,9 +6,12 @@ Supports multi-platform clients: mobile app, web portal, and desktop application
 """
 
 from fastapi import FastAPI, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
+import math
 import time
 import uvicorn
 
@@ -16,6 +19,12 @@ from app.core.config import settings
 from app.core.exceptions import CustomException
 from app.core.database import create_tables
 from app.api.v1.api import api_router
+from app.services.upload_service import upload_service
+from app.workers.engine import job_engine
+from app.websocket.connection_manager import connection_manager
+from app.websocket.broadcast import broadcast_bus
+from app.websocket.game_state import game_state
+from app.websocket.presence import presence
 
 # Create FastAPI application
 app = FastAPI(
@@ -43,6 +52,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Bodies larger than this, or sent to upload routes, are never read by the logger
+BODY_LOG_LIMIT = 4096
+UPLOAD_PATH_PREFIXES = (
+    f"{settings.API_V1_STR}/streaming/",
+    f"{settings.API_V1_STR}/videos/",
+)
+
+def should_log_body(request: Request) -> bool:
+    """Whether the request body is small JSON that is safe to buffer for logging."""
+    if request.url.path.startswith(UPLOAD_PATH_PREFIXES):
+        return False
+    if not request.headers.get("content-type", "").startswith("application/json"):
+        return False
+    length = request.headers.get("content-length")
+    return length is not None and length.isdigit() and int(length) <= BODY_LOG_LIMIT
+
 # Request timing middleware
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
@@ -56,14 +81,24 @@ async def add_process_time_header(request: Request, call_next):
     print(f"Headers: {dict(request.headers)}")
     print(f"Client IP: {request.client.host if request.client else 'Unknown'}")
     
-    # Try to read body for POST requests
-    if request.method in ["POST", "PUT", "PATCH"]:
+    # Log small JSON bodies only; uploads are streamed by their handlers
+    if request.method in ["POST", "PUT", "PATCH"] and should_log_body(request):
         body = await request.body()
         if body:
-            try:
-                print(f"Body: {body.decode('utf-8')}")
-            except:
-                print(f"Body (bytes): {body}")
+            print(f"Body: {body.decode('utf-8', errors='replace')}")
+
+        # The handler runs on a fresh receive channel; replay the consumed
+        # body once, then pass through so disconnects still arrive
+        receive = request._receive
+        replayed = False
+
+        async def replay_body():
+            nonlocal replayed
+            if replayed:
+                return await receive()
+            replayed = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        request._receive = replay_body
     
     response = await call_next(request)
     process_time = time.time() - start_time
@@ -88,6 +123,24 @@ async def custom_exception_handler(request: Request, exc: CustomException):
         }
     )
 
+def _json_safe(value):
+    """Copy of validation error details with NaN/Infinity inputs as strings."""
+    if isinstance(value, float) and not math.isfinite(value):
+        return str(value)
+    if isinstance(value, dict):
+        return {key: _json_safe(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_json_safe(item) for item in value]
+    return value
+
+@app.exception_handler(RequestValidationError)
+async def validation_exception_handler(request: Request, exc: RequestValidationError):
+    """FastAPI's 422 response, which cannot otherwise echo rejected NaN/Infinity inputs."""
+    return JSONResponse(
+        status_code=422,
+        content={"detail": _json_safe(jsonable_encoder(exc.errors()))}
+    )
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -113,8 +166,22 @@ async def root():
 # Create database tables on startup
 @app.on_event("startup")
 async def startup_event():
-    """Create database tables on application startup."""
+    """Create database tables and start WebSocket services on application startup."""
     create_tables()
+    await connection_manager.start()
+    await broadcast_bus.start()
+    await upload_service.start()
+    await job_engine.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close live WebSocket connections on application shutdown."""
+    await job_engine.stop()
+    await upload_service.stop()
+    await presence.stop()
+    await broadcast_bus.stop()
+    await game_state.stop()
+    await connection_manager.stop()
 
 # Include API routes
 app.include_router(api_router, prefix=settings.API_V1_STR)
@@ -0,0 +1,386 @@
+"""
+Arena configuration registry.
+
+Rink templates (docs/research/arena_configurations.md, positions from
+docs/phase1/arena_positioning_system.md) are static data every phone fetches
+at game setup. They are validated once at import into frozen ``__slots__``
+objects, and every API response is encoded to JSON bytes up front with a
+content-derived ETag, so serving an arena request does no serialization and
+clients and CDNs may cache the responses indefinitely.
+
+Coordinates are in feet with the origin at a corner of the rink:
+``x`` runs along the rink length, ``y`` across its width. Angles are the
+camera heading in degrees, counter-clockwise from the +x axis.
+"""
+
+import hashlib
+import json
+import logging
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Tuple
+
+from app.core.config import settings
+from app.core.exceptions import ArenaNotFoundException
+from app.services.position_service import POSITION_EFFECTIVENESS, POSITION_PRIORITY
+
+logger = logging.getLogger(__name__)
+
+# Per-position camera guidance shared by every rink type
+POSITION_PROFILES: Dict[str, Dict[str, Any]] = {
+    "center_ice_elevated": {
+        "description": "Center Ice Elevated - Primary Coverage",
+        "coverage_area": "full_ice_overview",
+        "height_recommendation": "3-4 meters (10-13 feet)",
+        "height_m": 3.5,
+        "field_of_view": 110.0,
+        "coverage_radius": 130.0,
+        "setup_instructions": (
+            "Find highest available seating at center ice",
+            "Position 3-4 meters above ice level if possible",
+            "Aim camera to capture entire ice surface",
+            "Use wide-angle view to frame both goal areas",
+            "This is the PRIORITY position - most important coverage",
+        ),
+    },
+    "corner_diagonal_1": {
+        "description": "Corner Diagonal 1 - Excellent Game Coverage",
+        "coverage_area": "diagonal_ice_coverage",
+        "height_recommendation": "2-3 meters elevated",
+        "height_m": 2.5,
+        "field_of_view": 90.0,
+        "coverage_radius": 160.0,
+        "setup_instructions": (
+            "Position in corner seating area (offensive zone end)",
+            "Find elevated position for diagonal view",
+            "Capture both corners and center ice area",
+            "Good for following puck movement and player flow",
+            "Excellent secondary coverage position",
+        ),
+    },
+    "corner_diagonal_2": {
+        "description": "Corner Diagonal 2 - Opposite Diagonal Coverage",
+        "coverage_area": "diagonal_ice_coverage",
+        "height_recommendation": "2-3 meters elevated",
+        "height_m": 2.5,
+        "field_of_view": 90.0,
+        "coverage_radius": 160.0,
+        "setup_instructions": (
+            "Position in opposite corner seating area",
+            "Mirror the setup of Corner Diagonal 1",
+            "Provides complementary diagonal coverage",
+            "Captures different angles of the same plays",
+            "Essential for 3+ camera setups",
+        ),
+    },
+    "bench_side": {
+        "description": "Bench Side - Line Changes and Bench Activity",
+        "coverage_area": "bench_side_action",
+        "height_recommendation": "1-2 meters elevated",
+        "height_m": 1.5,
+        "field_of_view": 110.0,
+        "coverage_radius": 100.0,
+        "setup_instructions": (
+            "Position opposite the player benches",
+            "Focus on bench-side board play",
+            "Good for capturing line changes",
+            "Useful for coach reactions and bench activity",
+            "Secondary priority position",
+        ),
+    },
+    "goal_line_1": {
+        "description": "Goal Line 1 - Specialized Goal Coverage",
+        "coverage_area": "goal_area_detail",
+        "height_recommendation": "chest level or higher",
+        "height_m": 1.5,
+        "field_of_view": 90.0,
+        "coverage_radius": 60.0,
+        "setup_instructions": (
+            "Position directly behind goal line",
+            "Center between goal posts",
+            "Focus on goal crease and slot area",
+            "Specialized for goal-scoring situations",
+            "Use only with 5+ cameras for variety",
+        ),
+    },
+    "goal_line_2": {
+        "description": "Goal Line 2 - Opposite Goal Coverage",
+        "coverage_area": "goal_area_detail",
+        "height_recommendation": "chest level or higher",
+        "height_m": 1.5,
+        "field_of_view": 90.0,
+        "coverage_radius": 60.0,
+        "setup_instructions": (
+            "Position directly behind opposite goal line",
+            "Mirror Goal Line 1 setup",
+            "Provides goal coverage for both ends",
+            "Specialized angle for scoring plays",
+            "Use only with 6 cameras for complete coverage",
+        ),
+    },
+}
+
+# Rink templates: dimensions in feet, positions as (x, y, angle)
+ARENA_TEMPLATES: Dict[str, Dict[str, Any]] = {
+    "standard": {
+        "display_name": "Standard North American",
+        "description": "NHL-size rink used by most North American arenas",
+        "length": 200.0,
+        "width": 85.0,
+        "goal_line_distance": 11.0,
+        "faceoff_circle_diameter": 30.0,
+        "neutral_zone_width": 50.0,
+        "corner_radius": 28.0,
+        "positions": {
+            "center_ice_elevated": (100.0, 85.0, 270.0),
+            "corner_diagonal_1": (175.0, 20.0, 135.0),
+            "corner_diagonal_2": (25.0, 65.0, 315.0),
+            "bench_side": (100.0, 0.0, 90.0),
+            "goal_line_1": (11.0, 42.5, 0.0),
+            "goal_line_2": (189.0, 42.5, 180.0),
+        },
+    },
+    "olympic": {
+        "display_name": "Olympic/International",
+        "description": "IIHF rink; wider ice with adjusted corner and bench positions",
+        "length": 197.0,
+        "width": 98.4,
+        "goal_line_distance": 13.0,
+        "faceoff_circle_diameter": 30.0,
+        "neutral_zone_width": 50.0,
+        "corner_radius": 28.0,
+        "positions": {
+            "center_ice_elevated": (98.5, 98.4, 270.0),
+            "corner_diagonal_1": (167.0, 23.0, 135.0),
+            "corner_diagonal_2": (30.0, 75.0, 315.0),
+            "bench_side": (98.5, 0.0, 90.0),
+            "goal_line_1": (13.0, 49.2, 0.0),
+            "goal_line_2": (184.0, 49.2, 180.0),
+        },
+    },
+    "junior": {
+        "display_name": "Junior/Youth",
+        "description": "Smaller rink; closer positions and tighter corner angles",
+        "length": 185.0,
+        "width": 85.0,
+        "goal_line_distance": 10.0,
+        "faceoff_circle_diameter": 28.0,
+        "neutral_zone_width": 45.0,
+        "corner_radius": 25.0,
+        "positions": {
+            "center_ice_elevated": (92.5, 85.0, 270.0),
+            "corner_diagonal_1": (162.0, 20.0, 135.0),
+            "corner_diagonal_2": (23.0, 65.0, 315.0),
+            "bench_side": (92.5, 0.0, 90.0),
+            "goal_line_1": (10.0, 42.5, 0.0),
+            "goal_line_2": (175.0, 42.5, 180.0),
+        },
+    },
+}
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class _Frozen:
+    """Base for registry objects: attributes are set once in ``__init__``."""
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def _set(self, **values) -> None:
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+
+class CameraPosition(_Frozen):
+    """One recommended camera position on a specific rink."""
+
+    __slots__ = (
+        "name",
+        "x",
+        "y",
+        "angle",
+        "priority",
+        "effectiveness",
+        "height_m",
+        "field_of_view",
+        "coverage_radius",
+        "description",
+        "coverage_area",
+        "height_recommendation",
+        "setup_instructions",
+    )
+
+    def __init__(self, name: str, x: float, y: float, angle: float, profile: Mapping[str, Any]):
+        self._set(
+            name=name,
+            x=float(x),
+            y=float(y),
+            angle=float(angle),
+            priority=POSITION_PRIORITY.index(name) + 1,
+            effectiveness=POSITION_EFFECTIVENESS[name],
+            height_m=float(profile["height_m"]),
+            field_of_view=float(profile["field_of_view"]),
+            coverage_radius=float(profile["coverage_radius"]),
+            description=profile["description"],
+            coverage_area=profile["coverage_area"],
+            height_recommendation=profile["height_recommendation"],
+            setup_instructions=tuple(profile["setup_instructions"]),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "position": self.name,
+            "priority": self.priority,
+            "effectiveness_weight": self.effectiveness,
+            "coordinates": {"x": self.x, "y": self.y},
+            "angle": self.angle,
+            "field_of_view": self.field_of_view,
+            "coverage_radius_ft": self.coverage_radius,
+            "height_recommendation": self.height_recommendation,
+            "description": self.description,
+            "coverage_area": self.coverage_area,
+            "setup_instructions": list(self.setup_instructions),
+        }
+
+
+class ArenaConfig(_Frozen):
+    """Validated rink template with positions in priority order."""
+
+    __slots__ = (
+        "name",
+        "display_name",
+        "description",
+        "length",
+        "width",
+        "goal_line_distance",
+        "faceoff_circle_diameter",
+        "neutral_zone_width",
+        "corner_radius",
+        "positions",
+        "position_map",
+    )
+
+    def __init__(self, name: str, template: Mapping[str, Any]):
+        length = float(template["length"])
+        width = float(template["width"])
+        corner_radius = float(template["corner_radius"])
+        if length <= 0 or width <= 0:
+            raise ValueError(f"Arena '{name}' has non-positive dimensions")
+        if not 0 <= corner_radius <= min(length, width) / 2:
+            raise ValueError(f"Arena '{name}' has invalid corner radius {corner_radius}")
+
+        coordinates = template["positions"]
+        missing = set(POSITION_PRIORITY) - set(coordinates)
+        unknown = set(coordinates) - set(POSITION_PRIORITY)
+        if missing or unknown:
+            raise ValueError(
+                f"Arena '{name}' positions mismatch: missing {sorted(missing)}, unknown {sorted(unknown)}"
+            )
+
+        positions = []
+        for position in POSITION_PRIORITY:
+            x, y, angle = coordinates[position]
+            if not (0 <= x <= length and 0 <= y <= width):
+                raise ValueError(f"Arena '{name}' position '{position}' is off the rink: ({x}, {y})")
+            if not 0 <= angle < 360:
+                raise ValueError(f"Arena '{name}' position '{position}' has invalid angle {angle}")
+            positions.append(CameraPosition(position, x, y, angle, POSITION_PROFILES[position]))
+
+        self._set(
+            name=name,
+            display_name=template["display_name"],
+            description=template["description"],
+            length=length,
+            width=width,
+            goal_line_distance=float(template["goal_line_distance"]),
+            faceoff_circle_diameter=float(template["faceoff_circle_diameter"]),
+            neutral_zone_width=float(template["neutral_zone_width"]),
+            corner_radius=corner_radius,
+            positions=tuple(positions),
+            position_map=MappingProxyType({p.name: p for p in positions}),
+        )
+
+    def positions_for(self, camera_count: int) -> Tuple[CameraPosition, ...]:
+        """Recommended positions for a number of cameras, best first."""
+        count = max(1, min(camera_count, settings.MAX_CAMERAS_PER_GAME, len(self.positions)))
+        return self.positions[:count]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "display_name": self.display_name,
+            "description": self.description,
+            "dimensions": {"length_ft": self.length, "width_ft": self.width},
+            "goal_line_distance_ft": self.goal_line_distance,
+            "faceoff_circle_diameter_ft": self.faceoff_circle_diameter,
+            "neutral_zone_width_ft": self.neutral_zone_width,
+            "corner_radius_ft": self.corner_radius,
+        }
+
+
+class EncodedResponse(_Frozen):
+    """Pre-serialized JSON body and its strong ETag."""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, payload: Any):
+        body = json.dumps(payload, separators=(",", ":"), sort_keys=True).encode()
+        self._set(body=body, etag='"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"')
+
+
+class ArenaRegistry:
+    """
+    Every arena template, validated and pre-encoded.
+
+    Raises:
+        ValueError: At construction, for any malformed template
+    """
+
+    def __init__(self, templates: Mapping[str, Mapping[str, Any]]):
+        if settings.DEFAULT_ARENA_TYPE not in templates:
+            raise ValueError(f"Default arena type '{settings.DEFAULT_ARENA_TYPE}' has no template")
+
+        self.arenas: Mapping[str, ArenaConfig] = MappingProxyType(
+            {name: ArenaConfig(name, template) for name, template in templates.items()}
+        )
+        self.types_response = EncodedResponse({
+            "arena_types": [arena.summary() for arena in self.arenas.values()],
+            "default": settings.DEFAULT_ARENA_TYPE,
+        })
+
+        positions: Dict[Tuple[str, int], EncodedResponse] = {}
+        for arena in self.arenas.values():
+            for count in range(1, min(settings.MAX_CAMERAS_PER_GAME, len(arena.positions)) + 1):
+                positions[(arena.name, count)] = EncodedResponse({
+                    "arena_type": arena.name,
+                    "camera_count": count,
+                    "dimensions": {"length_ft": arena.length, "width_ft": arena.width},
+                    "positions": [p.to_dict() for p in arena.positions_for(count)],
+                })
+        self._positions = MappingProxyType(positions)
+        logger.info(f"Loaded {len(self.arenas)} arena configurations")
+
+    def get(self, arena_type: str) -> ArenaConfig:
+        """
+        Raises:
+            ArenaNotFoundException: Unknown arena type
+        """
+        arena = self.arenas.get(arena_type)
+        if arena is None:
+            raise ArenaNotFoundException(arena_type)
+        return arena
+
+    def positions_response(self, arena_type: str, camera_count: int) -> EncodedResponse:
+        """Encoded position recommendations; ``camera_count`` is clamped to the valid range."""
+        arena = self.get(arena_type)
+        count = len(arena.positions_for(camera_count))
+        return self._positions[(arena_type, count)]
+
+
+# Built once per process at import
+arena_registry = ArenaRegistry(ARENA_TEMPLATES)
@@ -0,0 +1,483 @@
+"""
+Content-addressed chunk store for uploads.
+
+Chunk bodies are hashed with BLAKE2b-256 while they stream in and stored
+once per digest under ``{TEMP_UPLOAD_DIR}/chunks/{digest[:2]}/{digest}``.
+Each upload session (one camera's recording) has a manifest mapping byte
+offsets to digests. A client that already sent a chunk, or whose retry
+races an earlier attempt, can check the digest with ``HEAD`` and link the
+stored chunk into its session without resending the body.
+
+Each reference is an empty file ``refs/{digest[:2]}/{digest}/{manifest}.{offset}``,
+so storing, linking or releasing a chunk touches only that chunk's files.
+Releasing a manifest (session finished or expired) removes its references,
+and ``gc`` deletes chunks that stayed unreferenced for
+``CHUNK_GC_GRACE_SECONDS`` since their mtime was last touched. The grace
+period covers the gap between a ``HEAD`` hit and the link that follows it.
+Linking holds a shared ``flock`` on the chunk file and ``gc`` an exclusive
+one, and each manifest has its own lock, so several workers on one host
+can share the store and uploads of different chunks never wait on each
+other.
+
+Dedupe is scoped by owner: a chunk can be found with ``HEAD`` or linked
+without its body only by an owner who has uploaded that body before
+(``owners/{digest[:2]}/{digest}/{owner}``). Knowing a digest alone does not
+give access to someone else's footage.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, AsyncIterable, Dict, Iterator, List, Optional, Tuple
+
+import aiofiles
+import aiofiles.os
+
+from app.core.config import settings
+from app.core.exceptions import (
+    ChunkDigestMismatchException,
+    ChunkNotFoundException,
+    InvalidUploadRangeException,
+    StorageException,
+)
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+DIGEST_SIZE = 32
+_DIGEST = re.compile(r"^[0-9a-f]{64}$")
+# Manifest (upload session) and owner ids
+_ID = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+
+_fdatasync = aiofiles.os.wrap(os.fdatasync)
+
+
+def new_hash() -> Any:
+    return hashlib.blake2b(digest_size=DIGEST_SIZE)
+
+
+class FixedBufferWriter:
+    """Writes streamed pieces to an async file through one reusable buffer."""
+
+    __slots__ = ("file", "buffer", "filled", "written")
+
+    def __init__(self, file: Any, buffer_size: int):
+        self.file = file
+        self.buffer = bytearray(buffer_size)
+        self.filled = 0
+        self.written = 0
+
+    @property
+    def received(self) -> int:
+        return self.written + self.filled
+
+    async def write(self, piece: bytes) -> None:
+        view = memoryview(piece)
+        size = len(self.buffer)
+        while view:
+            take = min(len(view), size - self.filled)
+            self.buffer[self.filled:self.filled + take] = view[:take]
+            self.filled += take
+            view = view[take:]
+            if self.filled == size:
+                await self.flush()
+
+    async def flush(self) -> None:
+        view = memoryview(self.buffer)[:self.filled]
+        try:
+            while view:
+                view = view[await self.file.write(view):]
+        except OSError as e:
+            raise StorageException("write_chunk", str(e))
+        self.written += self.filled
+        self.filled = 0
+
+
+class ChunkStore:
+    """Deduplicating chunk storage with per-session manifests and per-digest references."""
+
+    def __init__(
+        self,
+        directory: str = os.path.join(settings.TEMP_UPLOAD_DIR, "chunks"),
+        buffer_size: int = settings.UPLOAD_CHUNK_SIZE_KB * 1024,
+        max_chunk: int = settings.MAX_UPLOAD_SIZE_MB * MB,
+        grace: int = settings.CHUNK_GC_GRACE_SECONDS
+    ):
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.max_chunk = max_chunk
+        self.grace = grace
+        self.deduplicated = 0
+
+    # Paths and locking
+
+    def chunk_path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def refs_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "refs", digest[:2], digest)
+
+    def owners_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "owners", digest[:2], digest)
+
+    def manifest_path(self, manifest_id: str) -> str:
+        if not _ID.match(manifest_id):
+            raise StorageException("manifest", f"invalid manifest id: {manifest_id}")
+        return os.path.join(self.directory, "manifests", manifest_id + ".json")
+
+    @contextmanager
+    def _locked(self, path: str) -> Iterator[None]:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".lock", "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    @contextmanager
+    def _pinned(self, digest: str) -> Iterator[int]:
+        """
+        Hold a shared lock on a stored chunk so ``gc`` cannot delete it meanwhile.
+
+        Raises:
+            ChunkNotFoundException: Digest is not stored (or was just collected)
+        """
+        if not _DIGEST.match(digest):
+            raise ChunkNotFoundException(digest)
+        try:
+            fd = os.open(self.chunk_path(digest), os.O_RDONLY)
+        except FileNotFoundError:
+            raise ChunkNotFoundException(digest)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            if os.fstat(fd).st_nlink == 0:
+                raise ChunkNotFoundException(digest)
+            yield fd
+        finally:
+            os.close(fd)
+
+    def _load(self, path: str, default: Any) -> Any:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return default
+        except ValueError as e:
+            raise StorageException("read_chunk_index", str(e))
+
+    def _save(self, path: str, data: Any) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _unreference(self, digest: str, manifest_id: str, offset: str) -> None:
+        try:
+            os.remove(os.path.join(self.refs_path(digest), f"{manifest_id}.{offset}"))
+            os.utime(self.chunk_path(digest))
+        except FileNotFoundError:
+            pass
+
+    # Chunks
+
+    def owns(self, digest: str, owner: str) -> bool:
+        """Whether ``owner`` has uploaded this chunk's body."""
+        return _ID.match(owner) is not None and os.path.exists(os.path.join(self.owners_path(digest), owner))
+
+    def size(self, digest: str, owner: Optional[str] = None) -> Optional[int]:
+        """
+        Stored size of a chunk, or None when the digest is unknown.
+
+        With ``owner`` set, chunks that owner never uploaded count as unknown.
+        """
+        if not _DIGEST.match(digest):
+            return None
+        if owner is not None and not self.owns(digest, owner):
+            return None
+        try:
+            return os.stat(self.chunk_path(digest)).st_size
+        except FileNotFoundError:
+            return None
+
+    async def put_stream(
+        self,
+        stream: AsyncIterable[bytes],
+        expected: Optional[str] = None,
+        limit: Optional[int] = None,
+        owner: Optional[str] = None
+    ) -> Tuple[str, int]:
+        """
+        Store a streamed chunk, hashing it on the way in.
+
+        An identical chunk that is already stored is kept and the new copy
+        dropped, so retransmits cost no extra disk space. ``owner`` is
+        recorded as holding the body, which lets them link it again later.
+
+        Returns:
+            ``(digest, size)``
+
+        Raises:
+            ChunkDigestMismatchException: Content does not hash to ``expected``
+            InvalidUploadRangeException: Body is empty or larger than ``limit``
+        """
+        limit = min(limit or self.max_chunk, self.max_chunk)
+        tmp_dir = os.path.join(self.directory, "tmp")
+        await aiofiles.os.makedirs(tmp_dir, exist_ok=True)
+        tmp = os.path.join(tmp_dir, uuid.uuid4().hex)
+        digest = new_hash()
+        try:
+            async with aiofiles.open(tmp, "wb", buffering=0) as f:
+                writer = FixedBufferWriter(f, self.buffer_size)
+                async for piece in stream:
+                    if writer.received + len(piece) > limit:
+                        raise InvalidUploadRangeException(
+                            expected or "", 0, writer.received + len(piece), f"chunk exceeds {limit} bytes"
+                        )
+                    digest.update(piece)
+                    await writer.write(piece)
+                await writer.flush()
+                if writer.written:
+                    await _fdatasync(f.fileno())
+            size = writer.written
+            if not size:
+                raise InvalidUploadRangeException(expected or "", 0, 0, "empty chunk")
+
+            actual = digest.hexdigest()
+            if expected is not None and actual != expected:
+                raise ChunkDigestMismatchException(expected, actual)
+            await aiofiles.os.wrap(self._commit)(tmp, actual, owner)
+            return actual, size
+        finally:
+            try:
+                os.remove(tmp)
+            except FileNotFoundError:
+                pass
+
+    def _commit(self, tmp: str, digest: str, owner: Optional[str]) -> None:
+        path = self.chunk_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        while True:
+            try:
+                # Creates the chunk only if no copy exists yet
+                os.link(tmp, path)
+                break
+            except FileExistsError:
+                pass
+            try:
+                with self._pinned(digest):
+                    os.utime(path)
+                self.deduplicated += 1
+                break
+            except ChunkNotFoundException:
+                continue  # Collected in between; store this copy
+        if owner is not None:
+            if not _ID.match(owner):
+                raise StorageException("write_chunk", f"invalid owner: {owner}")
+            owners = self.owners_path(digest)
+            os.makedirs(owners, exist_ok=True)
+            open(os.path.join(owners, owner), "a").close()
+
+    def copy_into(self, digest: str, fd: int, offset: int) -> int:
+        """
+        Copy a stored chunk into an open file at ``offset`` (in-kernel where possible).
+
+        Returns:
+            Bytes copied
+
+        Raises:
+            ChunkNotFoundException: Digest is not stored
+        """
+        try:
+            src = os.open(self.chunk_path(digest), os.O_RDONLY)
+        except FileNotFoundError:
+            raise ChunkNotFoundException(digest)
+        try:
+            size = os.fstat(src).st_size
+            copied = 0
+            if hasattr(os, "copy_file_range"):
+                try:
+                    while copied < size:
+                        n = os.copy_file_range(src, fd, size - copied, copied, offset + copied)
+                        if n == 0:
+                            break
+                        copied += n
+                except OSError:
+                    pass
+            while copied < size:
+                data = os.pread(src, min(self.buffer_size, size - copied), copied)
+                if not data:
+                    break
+                view = memoryview(data)
+                while view:
+                    n = os.pwrite(fd, view, offset + copied)
+                    copied += n
+                    view = view[n:]
+            return copied
+        finally:
+            os.close(src)
+
+    # Manifests and references
+
+    def reference(
+        self,
+        manifest_id: str,
+        offset: int,
+        digest: str,
+        metadata: Optional[Dict[str, Any]] = None,
+        owner: Optional[str] = None
+    ) -> bool:
+        """
+        Point ``offset`` of a manifest at a chunk.
+
+        Returns:
+            False when the manifest already held this chunk at this offset
+
+        Raises:
+            ChunkNotFoundException: Digest is not stored, or ``owner`` never
+                uploaded it
+        """
+        if owner is not None and not self.owns(digest, owner):
+            raise ChunkNotFoundException(digest)
+        path = self.manifest_path(manifest_id)
+        with self._locked(path), self._pinned(digest):
+            manifest = self._load(path, None) or {
+                "manifest_id": manifest_id,
+                "metadata": metadata or {},
+                "chunks": {},
+            }
+            key = str(offset)
+            previous = manifest["chunks"].get(key)
+            if previous == digest:
+                return False
+
+            refs = self.refs_path(digest)
+            os.makedirs(refs, exist_ok=True)
+            open(os.path.join(refs, f"{manifest_id}.{key}"), "a").close()
+            os.utime(self.chunk_path(digest))
+            manifest["chunks"][key] = digest
+            self._save(path, manifest)
+            if previous is not None:
+                self._unreference(previous, manifest_id, key)
+            return True
+
+    def manifest(self, manifest_id: str) -> Optional[Dict[str, Any]]:
+        """Manifest with its chunks as sorted ``[offset, size, digest]`` entries."""
+        manifest = self._load(self.manifest_path(manifest_id), None)
+        if manifest is None:
+            return None
+        chunks: List[List[Any]] = []
+        for key, digest in sorted(manifest["chunks"].items(), key=lambda item: int(item[0])):
+            chunks.append([int(key), self.size(digest), digest])
+        return {**manifest, "chunks": chunks}
+
+    def release(self, manifest_id: str) -> int:
+        """Drop a manifest and its references; returns how many were dropped."""
+        path = self.manifest_path(manifest_id)
+        with self._locked(path):
+            manifest = self._load(path, None)
+            if manifest is None:
+                return 0
+            for key, digest in manifest["chunks"].items():
+                self._unreference(digest, manifest_id, key)
+            os.remove(path)
+        try:
+            os.remove(path + ".lock")
+        except FileNotFoundError:
+            pass
+        return len(manifest["chunks"])
+
+    def _collect(self, digest: str, now: float) -> bool:
+        """Delete one chunk if it is unreferenced and past the grace period."""
+        path = self.chunk_path(digest)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False  # Being linked right now
+            if now - os.fstat(fd).st_mtime <= self.grace:
+                return False
+            try:
+                os.rmdir(self.refs_path(digest))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                return False  # Still referenced
+            os.remove(path)
+            shutil.rmtree(self.owners_path(digest), ignore_errors=True)
+            return True
+        finally:
+            os.close(fd)
+
+    def _digests(self) -> Iterator[str]:
+        try:
+            prefixes = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for prefix in prefixes:
+            if len(prefix) != 2:
+                continue
+            try:
+                names = os.listdir(os.path.join(self.directory, prefix))
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            yield from (name for name in names if _DIGEST.match(name))
+
+    def gc(self, now: Optional[float] = None) -> int:
+        """Delete chunks unreferenced for longer than the grace period; returns how many."""
+        now = now or time.time()
+        removed = sum(1 for digest in list(self._digests()) if self._collect(digest, now))
+
+        # Bodies abandoned mid-stream by a crashed worker
+        tmp_dir = os.path.join(self.directory, "tmp")
+        try:
+            for name in os.listdir(tmp_dir):
+                path = os.path.join(tmp_dir, name)
+                try:
+                    if now - os.stat(path).st_mtime > self.grace:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+        except FileNotFoundError:
+            pass
+
+        if removed:
+            logger.info(f"Chunk store GC removed {removed} chunks")
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        chunks = size = unreferenced = 0
+        for digest in self._digests():
+            try:
+                size += os.stat(self.chunk_path(digest)).st_size
+            except FileNotFoundError:
+                continue
+            chunks += 1
+            try:
+                referenced = bool(os.listdir(self.refs_path(digest)))
+            except FileNotFoundError:
+                referenced = False
+            unreferenced += not referenced
+        return {
+            "chunks": chunks,
+            "bytes": size,
+            "unreferenced": unreferenced,
+            "deduplicated": self.deduplicated,
+        }
+
+
+# Shared chunk store under TEMP_UPLOAD_DIR
+chunk_store = ChunkStore()
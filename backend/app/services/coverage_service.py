@@ -0,0 +1,242 @@
+"""
+Camera setup validation and ice coverage scoring.
+
+Each rink is rasterized once into a grid of on-ice cells (rounded corners
+included). A camera's view is a 2D frustum: a wedge of half-angle
+``field_of_view / 2`` around its heading, out to its coverage radius. All
+cameras of a game are evaluated together as one ``(cameras, cells)`` boolean
+mask, so a full validation is a handful of NumPy array operations and cheap
+enough to rerun every ``QUALITY_ASSESSMENT_INTERVAL`` for every active game.
+
+Reported positions are in feet like the arena templates;
+``POSITION_VALIDATION_TOLERANCE`` is in meters.
+"""
+
+import logging
+from typing import Any, Dict, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.exceptions import InvalidPositionException
+from app.services.arena_service import ArenaConfig, ArenaRegistry, arena_registry
+
+logger = logging.getLogger(__name__)
+
+FEET_PER_METER = 3.28084
+
+# Grid resolution; 2 ft gives ~4,000 cells on a standard rink
+GRID_CELL_FT = 2.0
+# Heading error accepted alongside the position tolerance
+ANGLE_TOLERANCE_DEG = 15.0
+# A zone with less of its area in view than this is reported as uncovered
+ZONE_COVERAGE_THRESHOLD = 0.8
+# Goal-mouth zones: crease and slot in front of each net
+GOAL_AREA_OFFSET_FT = 15.0
+GOAL_AREA_RADIUS_FT = 15.0
+
+
+class RinkGrid:
+    """On-ice cell centers and zone membership for one arena."""
+
+    __slots__ = ("arena_type", "cell_size", "xs", "ys", "zone_names", "zones", "zone_sizes")
+
+    def __init__(self, arena: ArenaConfig, cell_size: float = GRID_CELL_FT):
+        self.arena_type = arena.name
+        self.cell_size = cell_size
+
+        xs = np.arange(cell_size / 2, arena.length, cell_size)
+        ys = np.arange(cell_size / 2, arena.width, cell_size)
+        gx, gy = np.meshgrid(xs, ys)
+        gx, gy = gx.ravel(), gy.ravel()
+
+        # Inside the boards: distance to the rink shrunk by the corner radius
+        r = arena.corner_radius
+        nearest_x = np.clip(gx, r, arena.length - r)
+        nearest_y = np.clip(gy, r, arena.width - r)
+        on_ice = (gx - nearest_x) ** 2 + (gy - nearest_y) ** 2 <= r * r
+        self.xs = gx[on_ice]
+        self.ys = gy[on_ice]
+
+        blue_1 = (arena.length - arena.neutral_zone_width) / 2
+        blue_2 = (arena.length + arena.neutral_zone_width) / 2
+        goal_y = arena.width / 2
+        goal_1 = arena.goal_line_distance + GOAL_AREA_OFFSET_FT
+        goal_2 = arena.length - arena.goal_line_distance - GOAL_AREA_OFFSET_FT
+        zones = {
+            "defensive_zone_1": self.xs < blue_1,
+            "neutral_zone": (self.xs >= blue_1) & (self.xs <= blue_2),
+            "defensive_zone_2": self.xs > blue_2,
+            "goal_area_1": (self.xs - goal_1) ** 2 + (self.ys - goal_y) ** 2 <= GOAL_AREA_RADIUS_FT ** 2,
+            "goal_area_2": (self.xs - goal_2) ** 2 + (self.ys - goal_y) ** 2 <= GOAL_AREA_RADIUS_FT ** 2,
+        }
+        self.zone_names: Tuple[str, ...] = tuple(zones)
+        self.zones = np.stack(list(zones.values()))
+        self.zone_sizes = self.zones.sum(axis=1)
+
+    @property
+    def cells(self) -> int:
+        return self.xs.size
+
+    def frustum_masks(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        heading: np.ndarray,
+        field_of_view: np.ndarray,
+        radius: np.ndarray
+    ) -> np.ndarray:
+        """
+        Cells inside each camera's view.
+
+        Args:
+            x, y: Camera positions in feet, shape ``(C,)``
+            heading: Camera headings in degrees
+            field_of_view: Horizontal field of view in degrees
+            radius: Usable range in feet
+
+        Returns:
+            Boolean array of shape ``(C, cells)``
+        """
+        dx = self.xs[None, :] - x[:, None]
+        dy = self.ys[None, :] - y[:, None]
+        in_range = dx * dx + dy * dy <= (radius * radius)[:, None]
+        bearing = np.arctan2(dy, dx)
+        offset = np.abs((bearing - np.radians(heading)[:, None] + np.pi) % (2 * np.pi) - np.pi)
+        return in_range & (offset <= np.radians(field_of_view / 2)[:, None])
+
+
+class CoverageValidator:
+    """Validates reported camera setups against an arena's target positions."""
+
+    def __init__(
+        self,
+        registry: ArenaRegistry = arena_registry,
+        cell_size: float = GRID_CELL_FT,
+        tolerance_m: float = settings.POSITION_VALIDATION_TOLERANCE
+    ):
+        self.registry = registry
+        self.cell_size = cell_size
+        self.tolerance_m = tolerance_m
+        self._grids: Dict[str, RinkGrid] = {}
+        self._targets: Dict[str, np.ndarray] = {}
+
+    def grid(self, arena_type: str) -> RinkGrid:
+        """Rasterized rink, built on first use and reused for every game."""
+        grid = self._grids.get(arena_type)
+        if grid is None:
+            arena = self.registry.get(arena_type)
+            grid = self._grids[arena_type] = RinkGrid(arena, self.cell_size)
+            positions = arena.positions
+            self._targets[arena_type] = grid.frustum_masks(
+                np.array([p.x for p in positions]),
+                np.array([p.y for p in positions]),
+                np.array([p.angle for p in positions]),
+                np.array([p.field_of_view for p in positions]),
+                np.array([p.coverage_radius for p in positions]),
+            )
+        return grid
+
+    def validate(self, arena_type: str, cameras: Sequence[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Score every camera of a game in one pass.
+
+        Args:
+            arena_type: Arena the game is played in
+            cameras: Reports with ``position`` (assigned position name), ``x``
+                and ``y`` in feet, ``angle`` in degrees and optionally
+                ``camera_id`` and ``field_of_view``
+
+        Returns:
+            Per-camera deltas against the target positions, per-zone coverage,
+            uncovered zones and the overall covered share of the ice
+
+        Raises:
+            ArenaNotFoundException: Unknown arena type
+            InvalidPositionException: A report names an unknown position
+        """
+        arena = self.registry.get(arena_type)
+        grid = self.grid(arena_type)
+        targets = []
+        for camera in cameras:
+            target = arena.position_map.get(camera.get("position"))
+            if target is None:
+                raise InvalidPositionException(str(camera.get("position")), arena_type)
+            targets.append(target)
+
+        result: Dict[str, Any] = {
+            "arena_type": arena_type,
+            "tolerance_m": self.tolerance_m,
+            "cameras": [],
+        }
+        if not cameras:
+            result.update(
+                valid=False,
+                coverage_percentage=0.0,
+                redundant_percentage=0.0,
+                zones={name: 0.0 for name in grid.zone_names},
+                uncovered_zones=list(grid.zone_names),
+            )
+            return result
+
+        x = np.array([float(c["x"]) for c in cameras])
+        y = np.array([float(c["y"]) for c in cameras])
+        angle = np.array([float(c["angle"]) for c in cameras]) % 360
+        fov = np.array([float(c.get("field_of_view") or t.field_of_view) for c, t in zip(cameras, targets)])
+        target_x = np.array([t.x for t in targets])
+        target_y = np.array([t.y for t in targets])
+        target_angle = np.array([t.angle for t in targets])
+        radius = np.array([t.coverage_radius for t in targets])
+        target_index = np.array([t.priority - 1 for t in targets])
+
+        masks = grid.frustum_masks(x, y, angle, fov, radius)
+        target_masks = self._targets[arena_type][target_index]
+
+        # Per-camera deltas
+        dx_m = (x - target_x) / FEET_PER_METER
+        dy_m = (y - target_y) / FEET_PER_METER
+        error_m = np.hypot(dx_m, dy_m)
+        angle_error = (angle - target_angle + 180) % 360 - 180
+        within = (error_m <= self.tolerance_m) & (np.abs(angle_error) <= ANGLE_TOLERANCE_DEG)
+
+        # Coverage: per camera, unique to a camera, overlap with the target view
+        counts = masks.sum(axis=0)
+        covered = counts > 0
+        own = masks.sum(axis=1)
+        unique = (masks & (counts == 1)[None, :]).sum(axis=1)
+        union = (masks | target_masks).sum(axis=1)
+        match = np.where(union > 0, (masks & target_masks).sum(axis=1) / np.maximum(union, 1), 0.0)
+
+        zone_coverage = (grid.zones & covered[None, :]).sum(axis=1) / np.maximum(grid.zone_sizes, 1)
+        cells = grid.cells
+
+        for i, (camera, target) in enumerate(zip(cameras, targets)):
+            result["cameras"].append({
+                "camera_id": camera.get("camera_id"),
+                "position": target.name,
+                "within_tolerance": bool(within[i]),
+                "dx_m": round(float(dx_m[i]), 2),
+                "dy_m": round(float(dy_m[i]), 2),
+                "position_error_m": round(float(error_m[i]), 2),
+                "angle_error_deg": round(float(angle_error[i]), 1),
+                "coverage_percentage": round(100.0 * int(own[i]) / cells, 1),
+                "unique_coverage_percentage": round(100.0 * int(unique[i]) / cells, 1),
+                "target_view_match": round(float(match[i]), 3),
+            })
+
+        zones = {name: round(100.0 * float(share), 1) for name, share in zip(grid.zone_names, zone_coverage)}
+        result.update(
+            valid=bool(within.all()),
+            coverage_percentage=round(100.0 * int(covered.sum()) / cells, 1),
+            redundant_percentage=round(100.0 * int((counts > 1).sum()) / cells, 1),
+            zones=zones,
+            uncovered_zones=[
+                name for name, share in zip(grid.zone_names, zone_coverage)
+                if share < ZONE_COVERAGE_THRESHOLD
+            ],
+        )
+        return result
+
+
+# Shared validator; grids are cached per arena type
+coverage_validator = CoverageValidator()
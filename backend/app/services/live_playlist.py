@@ -0,0 +1,537 @@
+"""
+Live HLS playlists built from uploaded chunks.
+
+Each camera of a live upload session is a stream with an in-memory media
+playlist. When a chunk extends an upload's contiguous prefix, the new bytes
+become the stream's next segments and the playlist grows by one entry per
+segment. Nothing rescans the segment directory.
+
+MPEG-TS and fragmented MP4 uploads are cut at keyframes into segments of
+about the target duration as they arrive (``segmenter``). Bytes that do not
+yet complete a segment wait for the next chunk, so a partial slice is never
+published. When an ffmpeg binary is available:
+
+- each cut segment is remuxed to MPEG-TS, and
+- other uploads (a phone's ordinary MP4/MOV, whose ``moov`` comes last) are
+  split into MPEG-TS segments by ffmpeg's segment muxer once complete.
+
+Without ffmpeg only MPEG-TS and fragmented MP4 are accepted, and their
+segments are the uploaded bytes. A fragmented MP4 stream's ``ftyp``/``moov``
+is then written once as ``init.mp4`` and named by ``EXT-X-MAP``.
+
+Playlists are ``EVENT`` playlists with ``CAN-BLOCK-RELOAD``. A request with
+``_HLS_msn=N`` waits until segment N exists, so players long-poll instead of
+re-fetching. Finalizing a game turns its playlists into ``VOD`` playlists
+with ``EXT-X-ENDLIST``, written next to the segments.
+
+Every append also updates ``{stream}.json`` on disk and is published on the
+broadcast bus. Other workers on the host pick the stream up from the index
+and wake their long-polls when the event arrives, or on their next poll.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import shutil
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.exceptions import InvalidVideoFormatException, VideoNotFoundException
+from app.utils import segmenter
+from app.utils.media_probe import HEADER_BYTES, media_probe
+from app.websocket.broadcast import BroadcastBus, broadcast_bus
+
+logger = logging.getLogger(__name__)
+
+# How often a long-poll rechecks the on-disk index for appends made by other workers
+POLL_INTERVAL = 0.5
+# Blocking reloads wait at most this many target durations (RFC 8216bis)
+BLOCKING_RELOAD_TARGETS = 3
+# Init segment of a fragmented MP4 stream, next to its media segments
+INIT_SEGMENT = "init.mp4"
+
+_STREAM_ID = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+
+
+class Segment:
+    """One media segment of a playlist."""
+
+    __slots__ = ("sequence", "uri", "duration")
+
+    def __init__(self, sequence: int, uri: str, duration: float):
+        self.sequence = sequence
+        self.uri = uri
+        self.duration = duration
+
+    def to_list(self) -> List[Any]:
+        return [self.sequence, self.uri, self.duration]
+
+
+class LivePlaylist:
+    """Append-only media playlist for one stream."""
+
+    def __init__(self, game_id: str, stream: str, directory: str, target_duration: int):
+        self.game_id = game_id
+        self.stream = stream
+        self.directory = directory
+        self.target_duration = target_duration
+        self.segments: List[Segment] = []
+        self.map_uri: Optional[str] = None
+        self.ended = False
+        self.published_offset = 0
+        self.index_mtime = 0.0
+        self._changed = asyncio.Event()
+        self._rendered: Optional[Tuple[int, bool, str, bytes]] = None
+
+    @property
+    def next_sequence(self) -> int:
+        return len(self.segments)
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.directory, f"{self.stream}.json")
+
+    @property
+    def playlist_path(self) -> str:
+        return os.path.join(self.directory, f"{self.stream}.m3u8")
+
+    def segment_path(self, uri: str) -> str:
+        return os.path.join(self.directory, self.stream, uri)
+
+    def append(self, uri: str, duration: float) -> Segment:
+        segment = Segment(self.next_sequence, uri, duration)
+        self.segments.append(segment)
+        self.target_duration = max(self.target_duration, math.ceil(duration))
+        self._notify()
+        return segment
+
+    def finalize(self) -> None:
+        self.ended = True
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_for(self, sequence: int, timeout: float, refresh: Any = None) -> bool:
+        """
+        Wait until segment ``sequence`` exists or the playlist ends.
+
+        Args:
+            sequence: Media sequence number to wait for
+            timeout: Seconds to wait at most
+            refresh: Callable that reloads appends made by other workers
+
+        Returns:
+            False on timeout
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while sequence >= self.next_sequence and not self.ended:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(self._changed.wait(), min(remaining, POLL_INTERVAL))
+            except asyncio.TimeoutError:
+                if refresh is not None:
+                    refresh()
+        return True
+
+    def render(self, query: str = "") -> bytes:
+        """
+        Playlist text; segment URIs are relative to the playlist URL.
+
+        The last rendering is cached per (length, ended, query), so concurrent
+        viewers with the same signed query share one rendering.
+        """
+        key = (len(self.segments), self.ended, query)
+        if self._rendered is not None and self._rendered[:3] == key:
+            return self._rendered[3]
+
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:6",
+            f"#EXT-X-TARGETDURATION:{self.target_duration}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+            f"#EXT-X-PLAYLIST-TYPE:{'VOD' if self.ended else 'EVENT'}",
+        ]
+        if not self.ended:
+            lines.append(f"#EXT-X-SERVER-CONTROL:CAN-BLOCK-RELOAD=YES,HOLD-BACK={3 * self.target_duration}")
+        if self.map_uri is not None:
+            lines.append(f'#EXT-X-MAP:URI="{self.stream}/{self.map_uri}{query}"')
+        for segment in self.segments:
+            lines.append(f"#EXTINF:{segment.duration:.3f},")
+            lines.append(f"{self.stream}/{segment.uri}{query}")
+        if self.ended:
+            lines.append("#EXT-X-ENDLIST")
+        body = ("\n".join(lines) + "\n").encode()
+        self._rendered = (*key, body)
+        return body
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "game_id": self.game_id,
+            "stream": self.stream,
+            "target_duration": self.target_duration,
+            "ended": self.ended,
+            "published_offset": self.published_offset,
+            "map": self.map_uri,
+            "segments": [segment.to_list() for segment in self.segments],
+        }
+
+    def load(self, data: Dict[str, Any]) -> None:
+        """Catch up with an index written by another worker."""
+        known = len(self.segments)
+        for sequence, uri, duration in data["segments"][known:]:
+            self.segments.append(Segment(sequence, uri, duration))
+        self.target_duration = max(self.target_duration, data["target_duration"])
+        self.published_offset = max(self.published_offset, data.get("published_offset", 0))
+        self.map_uri = self.map_uri or data.get("map")
+        if data["ended"]:
+            self.ended = True
+        if len(self.segments) > known or self.ended:
+            self._notify()
+
+
+class LivePlaylistService:
+    """Registry of live playlists, segment publisher and VOD finalizer."""
+
+    def __init__(
+        self,
+        directory: str = settings.HLS_DIR,
+        target_duration: int = settings.HLS_TARGET_DURATION,
+        ffmpeg: Optional[str] = settings.FFMPEG_BINARY,
+        bus: BroadcastBus = broadcast_bus
+    ):
+        self.directory = directory
+        self.target_duration = target_duration
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+        self.bus = bus
+        self.playlists: Dict[Tuple[str, str], LivePlaylist] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        bus.add_handler("live_segment", self._apply_remote)
+
+    # Lookup
+
+    def get(self, game_id: str, stream: str, create: bool = False) -> LivePlaylist:
+        """
+        Raises:
+            VideoNotFoundException: Unknown stream (and ``create`` is False)
+        """
+        if not (_STREAM_ID.match(game_id) and _STREAM_ID.match(stream)):
+            raise VideoNotFoundException(f"{game_id}/{stream}")
+        key = (game_id, stream)
+        playlist = self.playlists.get(key)
+        if playlist is None:
+            playlist = LivePlaylist(
+                game_id, stream, os.path.join(self.directory, game_id), self.target_duration
+            )
+            if not self.refresh(playlist) and not create:
+                raise VideoNotFoundException(f"{game_id}/{stream}")
+            self.playlists[key] = playlist
+        return playlist
+
+    def refresh(self, playlist: LivePlaylist) -> bool:
+        """Reload the on-disk index if another worker changed it; False when there is none."""
+        try:
+            mtime = os.stat(playlist.index_path).st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime != playlist.index_mtime:
+            with open(playlist.index_path) as f:
+                playlist.load(json.load(f))
+            playlist.index_mtime = mtime
+        return True
+
+    def streams(self, game_id: str) -> List[str]:
+        """Streams of a game, including ones only other workers have appended to."""
+        try:
+            names = os.listdir(os.path.join(self.directory, game_id))
+        except FileNotFoundError:
+            names = []
+        found = {name[:-5] for name in names if name.endswith(".json")}
+        found.update(stream for game, stream in self.playlists if game == game_id)
+        return sorted(found)
+
+    async def wait(self, playlist: LivePlaylist, sequence: int) -> bool:
+        """Blocking reload: wait for segment ``sequence`` up to three target durations."""
+        self.refresh(playlist)
+        timeout = BLOCKING_RELOAD_TARGETS * playlist.target_duration
+        return await playlist.wait_for(sequence, timeout, lambda: self.refresh(playlist))
+
+    # Appending
+
+    async def publish_upload(
+        self,
+        game_id: str,
+        stream: str,
+        source: str,
+        contiguous: int,
+        complete: bool = False
+    ) -> List[Segment]:
+        """
+        Cut newly contiguous upload bytes into the stream's next segments.
+
+        Args:
+            game_id: Game the upload belongs to
+            stream: Camera stream name
+            source: Upload file being written
+            contiguous: Contiguous prefix received so far
+            complete: The prefix is the whole upload, so its last keyframe run is whole
+
+        Returns:
+            The new segments; empty until the bytes complete one
+        """
+        key = (game_id, stream)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            playlist = self.get(game_id, stream, create=True)
+            self.refresh(playlist)
+            if contiguous <= playlist.published_offset or playlist.ended:
+                return []
+            segments, playlist.published_offset = await self._add_segments(
+                playlist, source, playlist.published_offset, contiguous, complete
+            )
+            if segments:
+                await asyncio.to_thread(self._write_index, playlist)
+        for segment in segments:
+            self._announce(playlist, segment)
+        return segments
+
+    def check_upload(self, header: bytes, format_type: Optional[str]) -> None:
+        """
+        Reject a live upload that could never be cut into segments.
+
+        Args:
+            header: First bytes of the upload
+            format_type: Its format from ``media_probe.check_header`` (with ``live``)
+
+        Raises:
+            InvalidVideoFormatException: Neither MPEG-TS nor fragmented MP4,
+                and there is no ffmpeg to segment it
+        """
+        if self.ffmpeg or format_type in (None, "ts"):
+            return
+        if format_type in ("mp4", "mov") and media_probe.fragmented(header) is not False:
+            return
+        raise InvalidVideoFormatException(
+            f"live {format_type} upload (only MPEG-TS or fragmented MP4 without ffmpeg)",
+            settings.SUPPORTED_VIDEO_FORMATS,
+        )
+
+    async def _add_segments(
+        self,
+        playlist: LivePlaylist,
+        source: str,
+        start: int,
+        end: int,
+        complete: bool
+    ) -> Tuple[List[Segment], int]:
+        """Segments cut from ``source[start:end]``, and the offset the next cut starts from."""
+        header = await asyncio.to_thread(_read_range, source, 0, min(end, HEADER_BYTES))
+        format_type = media_probe.check_header(header, live=True)
+        if format_type is None:
+            return [], start
+        fragmented = format_type == "ts" or (format_type in ("mp4", "mov") and media_probe.fragmented(header))
+        if fragmented is None:
+            return [], start
+        os.makedirs(os.path.join(playlist.directory, playlist.stream), exist_ok=True)
+        if not fragmented:
+            if not (self.ffmpeg and complete):
+                return [], start
+            return await self._segment_file(playlist, source), end
+
+        init = None
+        if format_type != "ts":
+            init = await asyncio.to_thread(segmenter.init_segment, source, end)
+            if init is None:
+                return [], start
+            if not self.ffmpeg and playlist.map_uri is None:
+                await asyncio.to_thread(_write_atomic, playlist.segment_path(INIT_SEGMENT), init)
+                playlist.map_uri = INIT_SEGMENT
+            start = max(start, len(init))
+
+        spans = await asyncio.to_thread(
+            segmenter.cut, source, start, end, self.target_duration, complete, init
+        )
+        segments = []
+        for span in spans:
+            if self.ffmpeg:
+                segment = await self._remux(playlist, source, span, init)
+                if segment is not None:
+                    segments.append(segment)
+                continue
+            uri = f"{playlist.next_sequence}.{'ts' if init is None else 'm4s'}"
+            await asyncio.to_thread(
+                _copy_range, source, playlist.segment_path(uri), span.offset, span.end - span.offset, span.prefix
+            )
+            segments.append(playlist.append(uri, span.duration))
+        return segments, spans[-1].end if spans else start
+
+    async def _remux(
+        self,
+        playlist: LivePlaylist,
+        source: str,
+        span: segmenter.Span,
+        init: Optional[bytes]
+    ) -> Optional[Segment]:
+        """Remux one cut segment to MPEG-TS; a segment ffmpeg cannot read is skipped, never published raw."""
+        uri = f"{playlist.next_sequence}.ts"
+        staged = playlist.segment_path(f"{playlist.next_sequence}.in")
+        target = playlist.segment_path(uri)
+        await asyncio.to_thread(
+            _copy_range, source, staged, span.offset, span.end - span.offset, (init or b"") + span.prefix
+        )
+        try:
+            # -copyts keeps the upload's timestamps, so consecutive segments join
+            remuxed = await self._ffmpeg(
+                "-copyts", "-i", staged, "-map", "0:v", "-map", "0:a?", "-c", "copy", "-f", "mpegts", target + ".part"
+            )
+        finally:
+            os.remove(staged)
+        if not remuxed:
+            logger.warning(f"Skipped live segment of {playlist.game_id}/{playlist.stream} at byte {span.offset}")
+            return None
+        os.replace(target + ".part", target)
+        return playlist.append(uri, span.duration)
+
+    async def _segment_file(self, playlist: LivePlaylist, source: str) -> List[Segment]:
+        """Split a whole upload into MPEG-TS segments with ffmpeg's segment muxer."""
+        staging = playlist.segment_path(f".{playlist.next_sequence}")
+        os.makedirs(staging, exist_ok=True)
+        listing = os.path.join(staging, "segments.csv")
+        try:
+            if not await self._ffmpeg(
+                "-i", source, "-map", "0:v:0", "-map", "0:a:0?", "-c", "copy",
+                "-f", "segment", "-segment_time", str(self.target_duration), "-segment_format", "mpegts",
+                "-segment_list", listing, "-segment_list_type", "csv", "-reset_timestamps", "0",
+                os.path.join(staging, "%d.ts"),
+            ):
+                logger.warning(f"Skipped live upload {source} of {playlist.game_id}/{playlist.stream}")
+                return []
+            segments = []
+            with open(listing) as f:
+                for line in f:
+                    name, begin, finish = line.strip().rsplit(",", 2)
+                    uri = f"{playlist.next_sequence}.ts"
+                    os.replace(os.path.join(staging, name), playlist.segment_path(uri))
+                    segments.append(playlist.append(uri, float(finish) - float(begin)))
+            return segments
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    async def _ffmpeg(self, *args: str) -> bool:
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg, "-nostdin", "-v", "error", "-y", *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            logger.warning(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+            return False
+        return True
+
+    def _write_index(self, playlist: LivePlaylist) -> None:
+        os.makedirs(playlist.directory, exist_ok=True)
+        tmp = playlist.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(playlist.to_dict(), f)
+        os.replace(tmp, playlist.index_path)
+        playlist.index_mtime = os.stat(playlist.index_path).st_mtime
+
+    def _announce(self, playlist: LivePlaylist, segment: Segment) -> None:
+        try:
+            self.bus.publish(playlist.game_id, {
+                "type": "live_segment",
+                "game_id": playlist.game_id,
+                "stream": playlist.stream,
+                "sequence": segment.sequence,
+                "duration": segment.duration,
+                "ended": playlist.ended,
+            })
+        except RuntimeError:
+            # No running loop (sync callers); other workers catch up from the index
+            pass
+
+    def _apply_remote(self, game_id: str, event: Dict[str, Any]) -> None:
+        playlist = self.playlists.get((game_id, event.get("stream")))
+        if playlist is not None:
+            self.refresh(playlist)
+
+    # Ending
+
+    async def finalize_game(self, game_id: str) -> List[str]:
+        """
+        End every stream of a game and write its VOD playlist to disk.
+
+        Returns:
+            Names of the finalized streams
+        """
+        finalized = []
+        for stream in self.streams(game_id):
+            playlist = self.get(game_id, stream)
+            async with self._locks.setdefault((game_id, stream), asyncio.Lock()):
+                self.refresh(playlist)
+                if not playlist.ended:
+                    playlist.finalize()
+                    await asyncio.to_thread(self._write_index, playlist)
+                    await asyncio.to_thread(_write_atomic, playlist.playlist_path, playlist.render())
+                    if playlist.segments:
+                        self._announce(playlist, playlist.segments[-1])
+            finalized.append(stream)
+        logger.info(f"Finalized {len(finalized)} live playlists for game {game_id}")
+        return finalized
+
+
+def _read_range(source: str, offset: int, length: int) -> bytes:
+    with open(source, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def _copy_range(source: str, target: str, offset: int, length: int, prefix: bytes = b"") -> None:
+    """
+    Write ``prefix`` and ``length`` bytes at ``offset`` of ``source`` to ``target``.
+
+    The bytes are copied in-kernel where possible, into a temporary file that
+    replaces ``target`` once complete, so a segment is never served half-written.
+    """
+    tmp = target + ".part"
+    with open(source, "rb") as src, open(tmp, "wb") as dst:
+        dst.write(prefix)
+        dst.flush()
+        copied = 0
+        if hasattr(os, "copy_file_range"):
+            try:
+                while copied < length:
+                    n = os.copy_file_range(src.fileno(), dst.fileno(), length - copied, offset + copied)
+                    if n == 0:
+                        break
+                    copied += n
+            except OSError:
+                pass
+        src.seek(offset + copied)
+        dst.seek(len(prefix) + copied)
+        while copied < length:
+            data = src.read(min(1024 * 1024, length - copied))
+            if not data:
+                break
+            dst.write(data)
+            copied += len(data)
+    os.replace(tmp, target)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# Shared live playlist registry
+live_playlists = LivePlaylistService()
@@ -0,0 +1,286 @@
+"""
+Camera placement optimizer.
+
+Chooses camera positions by greedy maximum coverage over the rink grid from
+``coverage_service``. Candidates are the arena's named positions plus points
+sampled along the boards, each with a few headings around the inward
+normal. Covered ice (goal mouths weighted higher) is a monotone submodular
+function of the chosen set, so adding the candidate with the largest
+marginal gain at each step is within (1 - 1/e) of the optimal placement.
+
+Plans start from whatever is already occupied, so "where should the next
+camera go" is the first step of a plan. Plans are memoized per
+``(arena type, occupied set, candidate pool)``.
+"""
+
+import logging
+import math
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.exceptions import InvalidPositionException
+from app.services.arena_service import ArenaConfig, ArenaRegistry, EncodedResponse, arena_registry
+from app.services.coverage_service import CoverageValidator, coverage_validator
+
+logger = logging.getLogger(__name__)
+
+# Spacing of candidate mounting points along the boards
+CANDIDATE_SPACING_FT = 10.0
+# Headings tried at each mounting point, relative to the inward normal
+CANDIDATE_HEADING_OFFSETS = (-40.0, 0.0, 40.0)
+# Phone in the stands, roughly a corner-diagonal setup
+CANDIDATE_FIELD_OF_VIEW = 90.0
+CANDIDATE_RADIUS_FT = 140.0
+# Extra weight of goal-mouth cells over ordinary ice
+GOAL_AREA_WEIGHT = 1.0
+# Memoized plans kept per process
+MAX_CACHED_PLANS = 1024
+
+
+class PlacementCandidate:
+    """A possible camera placement."""
+
+    __slots__ = ("candidate_id", "position", "x", "y", "angle", "field_of_view", "radius")
+
+    def __init__(
+        self,
+        candidate_id: str,
+        x: float,
+        y: float,
+        angle: float,
+        field_of_view: float,
+        radius: float,
+        position: Optional[str] = None
+    ):
+        self.candidate_id = candidate_id
+        self.position = position
+        self.x = x
+        self.y = y
+        self.angle = angle
+        self.field_of_view = field_of_view
+        self.radius = radius
+
+
+class ArenaCandidates:
+    """Candidate set, coverage masks and cell weights for one arena."""
+
+    __slots__ = ("arena", "candidates", "index", "masks", "weights", "total_weight", "named")
+
+    def __init__(self, arena: ArenaConfig, validator: CoverageValidator):
+        grid = validator.grid(arena.name)
+        candidates = [
+            PlacementCandidate(p.name, p.x, p.y, p.angle, p.field_of_view, p.coverage_radius, p.name)
+            for p in arena.positions
+        ]
+        for i, (x, y, normal) in enumerate(_board_points(arena)):
+            for offset in CANDIDATE_HEADING_OFFSETS:
+                candidates.append(PlacementCandidate(
+                    f"board_{i}_{int(offset):+d}",
+                    round(x, 1),
+                    round(y, 1),
+                    (normal + offset) % 360,
+                    CANDIDATE_FIELD_OF_VIEW,
+                    CANDIDATE_RADIUS_FT,
+                ))
+
+        self.arena = arena
+        self.candidates = tuple(candidates)
+        self.index = {c.candidate_id: i for i, c in enumerate(candidates)}
+        self.named = len(arena.positions)
+        self.masks = grid.frustum_masks(
+            np.array([c.x for c in candidates]),
+            np.array([c.y for c in candidates]),
+            np.array([c.angle for c in candidates]),
+            np.array([c.field_of_view for c in candidates]),
+            np.array([c.radius for c in candidates]),
+        ).astype(np.float32)
+
+        goal_areas = np.array(["goal_area" in name for name in grid.zone_names])
+        self.weights = (1.0 + GOAL_AREA_WEIGHT * grid.zones[goal_areas].any(axis=0)).astype(np.float32)
+        self.total_weight = float(self.weights.sum())
+
+
+def _board_points(arena: ArenaConfig) -> List[Tuple[float, float, float]]:
+    """
+    Points every ``CANDIDATE_SPACING_FT`` along the rounded boards.
+
+    Returns:
+        ``(x, y, inward_heading_degrees)`` tuples
+    """
+    length, width, r = arena.length, arena.width, arena.corner_radius
+    perimeter = 2 * (length + width)
+    points = []
+    for step in range(int(perimeter // CANDIDATE_SPACING_FT)):
+        d = step * CANDIDATE_SPACING_FT
+        if d < length:
+            x, y = d, 0.0
+        elif d < length + width:
+            x, y = length, d - length
+        elif d < 2 * length + width:
+            x, y = 2 * length + width - d, width
+        else:
+            x, y = 0.0, perimeter - d
+
+        # Snap corner points onto the arc and face the arc's center
+        cx = min(max(x, r), length - r)
+        cy = min(max(y, r), width - r)
+        dx, dy = x - cx, y - cy
+        distance = math.hypot(dx, dy)
+        if distance > r and r > 0:
+            x, y = cx + dx * r / distance, cy + dy * r / distance
+            dx, dy = x - cx, y - cy
+        heading = math.degrees(math.atan2(-dy, -dx)) % 360
+        points.append((x, y, heading))
+    return points
+
+
+class PlacementOptimizer:
+    """Greedy max-coverage placement with per-occupancy memoization."""
+
+    def __init__(
+        self,
+        registry: ArenaRegistry = arena_registry,
+        validator: CoverageValidator = coverage_validator,
+        max_cameras: int = settings.MAX_CAMERAS_PER_GAME
+    ):
+        self.registry = registry
+        self.validator = validator
+        self.max_cameras = max_cameras
+        self._arenas: Dict[str, ArenaCandidates] = {}
+        self._plans: "OrderedDict[Tuple[str, frozenset, bool], Dict[str, Any]]" = OrderedDict()
+        self._responses: "OrderedDict[Tuple[str, frozenset, bool, int], EncodedResponse]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def candidates(self, arena_type: str) -> ArenaCandidates:
+        data = self._arenas.get(arena_type)
+        if data is None:
+            data = self._arenas[arena_type] = ArenaCandidates(self.registry.get(arena_type), self.validator)
+        return data
+
+    def plan(self, arena_type: str, occupied: Iterable[str] = (), named_only: bool = False) -> Dict[str, Any]:
+        """
+        Recommend placements for every remaining camera slot, best first.
+
+        Args:
+            arena_type: Arena to plan for
+            occupied: Position names or candidate ids already in use
+            named_only: Only recommend the arena's named positions (what
+                ``position_service`` can assign)
+
+        Returns:
+            Plan with the occupied coverage and the ordered recommendations
+
+        Raises:
+            ArenaNotFoundException: Unknown arena type
+            InvalidPositionException: Unknown occupied position or candidate
+        """
+        occupied_set = frozenset(occupied)
+        key = (arena_type, occupied_set, named_only)
+        plan = self._plans.get(key)
+        if plan is not None:
+            self._plans.move_to_end(key)
+            self.hits += 1
+            return plan
+        self.misses += 1
+
+        data = self.candidates(arena_type)
+        chosen = []
+        for item in occupied_set:
+            index = data.index.get(item)
+            if index is None:
+                raise InvalidPositionException(item, arena_type)
+            chosen.append(index)
+
+        pool = data.masks[:data.named] if named_only else data.masks
+        uncovered = data.weights.copy()
+        if chosen:
+            uncovered[data.masks[chosen].any(axis=0)] = 0.0
+        available = np.ones(len(pool), dtype=bool)
+        for index in chosen:
+            if index < len(pool):
+                available[index] = False
+
+        initial = 100.0 * (1.0 - float(uncovered.sum()) / data.total_weight)
+        recommendations = []
+        for rank in range(1, max(0, self.max_cameras - len(chosen)) + 1):
+            gains = pool @ uncovered
+            gains[~available] = -1.0
+            best = int(np.argmax(gains))
+            if gains[best] <= 0:
+                break
+            available[best] = False
+            uncovered[data.masks[best] > 0] = 0.0
+            candidate = data.candidates[best]
+            recommendations.append({
+                "rank": rank,
+                "candidate_id": candidate.candidate_id,
+                "position": candidate.position,
+                "nearest_position": self._nearest_position(data.arena, candidate),
+                "coordinates": {"x": candidate.x, "y": candidate.y},
+                "angle": round(candidate.angle, 1),
+                "field_of_view": candidate.field_of_view,
+                "coverage_radius_ft": candidate.radius,
+                "marginal_gain_percentage": round(100.0 * float(gains[best]) / data.total_weight, 1),
+                "cumulative_coverage_percentage": round(
+                    100.0 * (1.0 - float(uncovered.sum()) / data.total_weight), 1
+                ),
+            })
+
+        plan = {
+            "arena_type": arena_type,
+            "strategy": "coverage",
+            "occupied": sorted(occupied_set),
+            "occupied_coverage_percentage": round(initial, 1),
+            "recommendations": recommendations,
+        }
+        self._plans[key] = plan
+        if len(self._plans) > MAX_CACHED_PLANS:
+            self._plans.popitem(last=False)
+        return plan
+
+    def next_position(self, arena_type: str, occupied: Iterable[str] = ()) -> Optional[str]:
+        """Best free named position given the occupied ones, or None when full."""
+        recommendations = self.plan(arena_type, occupied, named_only=True)["recommendations"]
+        return recommendations[0]["position"] if recommendations else None
+
+    def plan_response(
+        self,
+        arena_type: str,
+        occupied: Iterable[str] = (),
+        camera_count: int = settings.MAX_CAMERAS_PER_GAME,
+        named_only: bool = False
+    ) -> EncodedResponse:
+        """Encoded plan truncated to ``camera_count`` total cameras, memoized like ``plan``."""
+        occupied_set = frozenset(occupied)
+        key = (arena_type, occupied_set, named_only, camera_count)
+        encoded = self._responses.get(key)
+        if encoded is None:
+            plan = self.plan(arena_type, occupied_set, named_only)
+            remaining = max(0, camera_count - len(occupied_set))
+            encoded = self._responses[key] = EncodedResponse({
+                **plan,
+                "camera_count": camera_count,
+                "recommendations": plan["recommendations"][:remaining],
+            })
+            if len(self._responses) > MAX_CACHED_PLANS:
+                self._responses.popitem(last=False)
+        else:
+            self._responses.move_to_end(key)
+        return encoded
+
+    @staticmethod
+    def _nearest_position(arena: ArenaConfig, candidate: PlacementCandidate) -> str:
+        if candidate.position is not None:
+            return candidate.position
+        return min(arena.positions, key=lambda p: (p.x - candidate.x) ** 2 + (p.y - candidate.y) ** 2).name
+
+    def stats(self) -> Dict[str, int]:
+        return {"cached_plans": len(self._plans), "hits": self.hits, "misses": self.misses}
+
+
+# Shared optimizer; candidate masks are built per arena on first use
+placement_optimizer = PlacementOptimizer()
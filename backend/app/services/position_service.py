@@ -0,0 +1,328 @@
+"""
+Camera position assignment for game sessions.
+
+Occupancy of a game's camera positions is a single integer bitmask (bit i
+set = position i taken). Claims read the mask, pick the first free
+position in priority order and publish the new mask with compare-and-set;
+a lost race simply re-reads and retries. No claim ever takes a table lock.
+
+Stores:
+    InMemoryPositionStore - per-worker dict, CAS is atomic on the event loop
+    RedisPositionStore    - shared hash per game, CAS runs as a Lua script
+"""
+
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.exceptions import (
+    GameFullException,
+    InvalidPositionException,
+    PositionTakenException,
+)
+
+logger = logging.getLogger(__name__)
+
+# NHL research-informed priority order (docs/phase1/arena_positioning_system.md).
+# The recommended set for N cameras is always the first N entries.
+POSITION_PRIORITY = (
+    "center_ice_elevated",
+    "corner_diagonal_1",
+    "corner_diagonal_2",
+    "bench_side",
+    "goal_line_1",
+    "goal_line_2",
+)
+
+POSITION_EFFECTIVENESS = {
+    "center_ice_elevated": 1.0,
+    "corner_diagonal_1": 0.85,
+    "corner_diagonal_2": 0.85,
+    "bench_side": 0.75,
+    "goal_line_1": 0.65,
+    "goal_line_2": 0.65,
+}
+
+POSITION_BITS = {position: 1 << index for index, position in enumerate(POSITION_PRIORITY)}
+
+# Optimistic retries before giving up under extreme contention
+MAX_CLAIM_ATTEMPTS = 16
+
+# (position, owner) taken or given up by a compare-and-set
+Claim = Optional[Tuple[str, str]]
+
+
+def positions_for_camera_count(camera_count: int) -> Tuple[str, ...]:
+    """Recommended positions for a number of cameras, best first."""
+    count = max(1, min(camera_count, settings.MAX_CAMERAS_PER_GAME, len(POSITION_PRIORITY)))
+    return POSITION_PRIORITY[:count]
+
+
+class PositionAssignment:
+    """Result of a successful claim."""
+
+    __slots__ = ("game_id", "user_id", "position", "requested", "priority", "effectiveness")
+
+    def __init__(self, game_id: str, user_id: str, position: str, requested: Optional[str]):
+        self.game_id = game_id
+        self.user_id = user_id
+        self.position = position
+        self.requested = requested
+        self.priority = POSITION_PRIORITY.index(position) + 1
+        self.effectiveness = POSITION_EFFECTIVENESS[position]
+
+    @property
+    def fallback(self) -> bool:
+        """True when the requested position was taken and another was assigned."""
+        return self.requested is not None and self.requested != self.position
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "game_id": self.game_id,
+            "user_id": self.user_id,
+            "position": self.position,
+            "requested_position": self.requested,
+            "fallback": self.fallback,
+            "priority": self.priority,
+            "effectiveness_weight": self.effectiveness,
+        }
+
+
+class InMemoryPositionStore:
+    """
+    Single-worker occupancy store.
+
+    ``compare_and_set`` contains no ``await``, so on the event loop it runs
+    as one atomic step and concurrent claims never interleave inside it.
+    """
+
+    def __init__(self):
+        self._games: Dict[str, Tuple[int, Dict[str, str]]] = {}
+
+    async def load(self, game_id: str) -> Tuple[int, Dict[str, str]]:
+        mask, owners = self._games.get(game_id, (0, {}))
+        return mask, dict(owners)
+
+    async def compare_and_set(
+        self,
+        game_id: str,
+        expected: int,
+        new: int,
+        claim: Claim = None,
+        release: Claim = None
+    ) -> bool:
+        mask, owners = self._games.get(game_id, (0, {}))
+        if mask != expected:
+            return False
+        if release is not None and owners.get(release[0]) != release[1]:
+            return False
+        owners = dict(owners)
+        if release is not None:
+            owners.pop(release[0], None)
+        if claim is not None:
+            owners[claim[0]] = claim[1]
+        if new:
+            self._games[game_id] = (new, owners)
+        else:
+            self._games.pop(game_id, None)
+        return True
+
+    async def clear(self, game_id: str) -> None:
+        self._games.pop(game_id, None)
+
+
+# KEYS[1] = hash key; ARGV = expected, new, claim position, claim owner,
+# release position, release owner, ttl
+_CAS_SCRIPT = """
+local current = tonumber(redis.call('HGET', KEYS[1], 'mask') or '0')
+if current ~= tonumber(ARGV[1]) then
+    return 0
+end
+if ARGV[5] ~= '' then
+    if redis.call('HGET', KEYS[1], ARGV[5]) ~= ARGV[6] then
+        return 0
+    end
+    redis.call('HDEL', KEYS[1], ARGV[5])
+end
+if ARGV[3] ~= '' then
+    redis.call('HSET', KEYS[1], ARGV[3], ARGV[4])
+end
+redis.call('HSET', KEYS[1], 'mask', ARGV[2])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[7]))
+return 1
+"""
+
+
+class RedisPositionStore:
+    """
+    Occupancy store shared by every worker.
+
+    Each game is a hash ``game:{id}:positions`` holding ``mask`` plus one
+    field per taken position. The compare-and-set is a Lua script, so it is
+    atomic on the Redis server without WATCH round trips.
+
+    Args:
+        url: Redis URL, defaults to ``settings.REDIS_URL``
+        client: Pre-built ``redis.asyncio`` compatible client (e.g. fakeredis)
+    """
+
+    def __init__(self, url: Optional[str] = None, client: Any = None):
+        self.url = url or settings.REDIS_URL
+        self._client = client
+        self._cas = None
+        self.ttl = settings.GAME_SESSION_TIMEOUT_HOURS * 3600
+
+    def _key(self, game_id: str) -> str:
+        return f"game:{game_id}:positions"
+
+    def _redis(self):
+        if self._client is None:
+            import redis.asyncio as aioredis
+
+            self._client = aioredis.from_url(self.url, decode_responses=True)
+        if self._cas is None:
+            self._cas = self._client.register_script(_CAS_SCRIPT)
+        return self._client
+
+    async def load(self, game_id: str) -> Tuple[int, Dict[str, str]]:
+        data = await self._redis().hgetall(self._key(game_id))
+        data = {_text(k): _text(v) for k, v in data.items()}
+        mask = int(data.pop("mask", 0))
+        return mask, data
+
+    async def compare_and_set(
+        self,
+        game_id: str,
+        expected: int,
+        new: int,
+        claim: Claim = None,
+        release: Claim = None
+    ) -> bool:
+        self._redis()
+        position, owner = claim if claim is not None else ("", "")
+        released, holder = release if release is not None else ("", "")
+        result = await self._cas(
+            keys=[self._key(game_id)],
+            args=[expected, new, position, owner, released, holder, self.ttl]
+        )
+        return bool(int(result))
+
+    async def clear(self, game_id: str) -> None:
+        await self._redis().delete(self._key(game_id))
+
+
+def _text(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class PositionAssignmentService:
+    """Assigns camera positions to parents joining a game."""
+
+    def __init__(self, store: Any = None, arena_type: str = settings.DEFAULT_ARENA_TYPE):
+        self.store = store or InMemoryPositionStore()
+        self.arena_type = arena_type
+        self.contended_claims = 0
+
+    async def claim(
+        self,
+        game_id: str,
+        user_id: str,
+        preferred: Optional[str] = None,
+        camera_count: int = settings.MAX_CAMERAS_PER_GAME,
+        allow_fallback: bool = True
+    ) -> PositionAssignment:
+        """
+        Claim a position for a user, falling back through the priority order.
+
+        A user holds at most one position; claiming another moves them
+        atomically (old bit cleared and new bit set in the same CAS).
+
+        Args:
+            game_id: Game session
+            user_id: Parent claiming the position
+            preferred: Requested position, or None for the best free one
+            camera_count: Number of positions in play for this game
+            allow_fallback: When False, a taken preferred position is an error
+
+        Raises:
+            InvalidPositionException: Unknown or out-of-range position
+            PositionTakenException: Preferred position taken and no fallback
+            GameFullException: Every position in play is taken
+        """
+        positions = positions_for_camera_count(camera_count)
+        if preferred is not None and preferred not in positions:
+            raise InvalidPositionException(preferred, self.arena_type)
+
+        candidates = positions
+        if preferred is not None:
+            candidates = (preferred,) + tuple(p for p in positions if p != preferred)
+            if not allow_fallback:
+                candidates = (preferred,)
+
+        for attempt in range(MAX_CLAIM_ATTEMPTS):
+            mask, owners = await self.store.load(game_id)
+            held = next((p for p, owner in owners.items() if owner == user_id), None)
+            if held is not None and (preferred is None or held == preferred):
+                return PositionAssignment(game_id, user_id, held, preferred)
+
+            free_mask = mask & ~POSITION_BITS[held] if held is not None else mask
+            position = next((p for p in candidates if not free_mask & POSITION_BITS[p]), None)
+            if position is None:
+                if preferred is not None and not allow_fallback:
+                    raise PositionTakenException(preferred, game_id)
+                raise GameFullException(game_id, len(positions))
+
+            new_mask = free_mask | POSITION_BITS[position]
+            if await self.store.compare_and_set(
+                game_id,
+                mask,
+                new_mask,
+                claim=(position, user_id),
+                release=(held, user_id) if held is not None else None
+            ):
+                if attempt:
+                    self.contended_claims += 1
+                return PositionAssignment(game_id, user_id, position, preferred)
+
+        logger.warning(f"Position claim for game {game_id} lost {MAX_CLAIM_ATTEMPTS} races")
+        raise PositionTakenException(preferred or candidates[0], game_id)
+
+    async def release(self, game_id: str, user_id: str) -> Optional[str]:
+        """
+        Release whatever position the user holds.
+
+        Returns:
+            The released position, or None if the user held none
+        """
+        for _ in range(MAX_CLAIM_ATTEMPTS):
+            mask, owners = await self.store.load(game_id)
+            held = next((p for p, owner in owners.items() if owner == user_id), None)
+            if held is None:
+                return None
+            if await self.store.compare_and_set(
+                game_id, mask, mask & ~POSITION_BITS[held], release=(held, user_id)
+            ):
+                return held
+        return None
+
+    async def occupancy(self, game_id: str) -> Dict[str, Optional[str]]:
+        """Every position in priority order mapped to its owner (or None)."""
+        _, owners = await self.store.load(game_id)
+        return {position: owners.get(position) for position in POSITION_PRIORITY}
+
+    async def available(self, game_id: str, camera_count: int = settings.MAX_CAMERAS_PER_GAME) -> List[str]:
+        """Free positions in priority order."""
+        mask, _ = await self.store.load(game_id)
+        return [p for p in positions_for_camera_count(camera_count) if not mask & POSITION_BITS[p]]
+
+
+def create_position_store(name: Optional[str] = None) -> Any:
+    """Occupancy store matching the broadcast backend: shared state needs Redis."""
+    name = name or settings.BROADCAST_BACKEND
+    if name == "redis":
+        return RedisPositionStore()
+    return InMemoryPositionStore()
+
+
+# Per-worker service instance
+position_service = PositionAssignmentService(create_position_store())
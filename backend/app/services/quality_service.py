@@ -0,0 +1,304 @@
+"""
+Frame quality metrics for camera weighting.
+
+Implements the measurable parts of ``docs/research/camera_quality_assessment.md``
+over batches of downsampled frames, one NumPy pass per metric for the whole
+batch:
+
+- sharpness: variance of the 4-neighbour Laplacian of the luma plane
+- exposure: 256-bin luma histograms, mean/contrast and the share of
+  clipped highlights (> 240) and crushed shadows (< 15)
+- stability and activity: frame differences averaged per tile. Camera
+  shake moves every tile, so the median tile energy measures it; play on
+  the ice moves some tiles, so the excess of the busiest tile over the
+  median measures activity (the "game action" part of content relevance).
+
+Results are cached per ``(camera, chunk)``. Live scoring feeds each
+camera's chunk every ``QUALITY_ASSESSMENT_INTERVAL`` (the previous chunk's
+last frame carries the motion across the boundary); offline compilation
+reads the cached per-frame scores back as a ``(cameras, samples)`` matrix
+for ``camera_switching``.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Laplacian variance scored 1.0 (the research doc's full-resolution threshold)
+SHARPNESS_REFERENCE = 200.0
+# Luma thresholds for clipped highlights and crushed shadows
+CLIP_HIGH = 240
+CLIP_LOW = 15
+# Target mean luma and the standard deviation scored as full contrast
+TARGET_BRIGHTNESS = 125.0
+CONTRAST_REFERENCE = 50.0
+# Median tile difference (luma levels) scored 0.0 for stability
+SHAKE_REFERENCE = 20.0
+# Busiest-tile excess (luma levels) scored 1.0 for activity
+ACTIVITY_REFERENCE = 30.0
+# Tiles per side for the motion grid
+MOTION_TILES = 4
+
+# Share of the overall score; positional effectiveness comes from coverage_service
+QUALITY_WEIGHTS = {
+    "sharpness": 0.3,
+    "exposure": 0.3,
+    "stability": 0.25,
+    "activity": 0.15,
+}
+
+# Cached (camera, chunk) results
+QUALITY_CACHE_SIZE = 4096
+
+# ITU-R BT.601 luma weights in RGB order
+_LUMA_RGB = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def to_luma(frames: np.ndarray, channel_order: str = "bgr") -> np.ndarray:
+    """
+    Luma plane of a batch as uint8.
+
+    Args:
+        frames: ``(N, H, W)`` grayscale or ``(N, H, W, 3)`` color frames
+        channel_order: ``"bgr"`` (OpenCV) or ``"rgb"`` for color input
+    """
+    frames = np.asarray(frames)
+    if frames.ndim == 3:
+        luma = frames
+    elif frames.ndim == 4 and frames.shape[-1] == 3:
+        weights = _LUMA_RGB[::-1] if channel_order == "bgr" else _LUMA_RGB
+        luma = frames.astype(np.float32) @ weights
+    else:
+        raise ValueError("frames must be (N, H, W) or (N, H, W, 3)")
+    if luma.dtype != np.uint8:
+        luma = np.clip(np.rint(luma), 0, 255).astype(np.uint8)
+    return luma
+
+
+def laplacian_variance(luma: np.ndarray) -> np.ndarray:
+    """Per-frame variance of the 4-neighbour Laplacian, shape ``(N,)``."""
+    g = luma.astype(np.float32)
+    laplacian = (
+        g[:, :-2, 1:-1] + g[:, 2:, 1:-1] + g[:, 1:-1, :-2] + g[:, 1:-1, 2:]
+        - 4 * g[:, 1:-1, 1:-1]
+    )
+    return laplacian.reshape(len(g), -1).var(axis=1)
+
+
+def luma_histograms(luma: np.ndarray) -> np.ndarray:
+    """256-bin histogram of every frame with one ``bincount``, shape ``(N, 256)``."""
+    frames = len(luma)
+    offsets = (np.arange(frames, dtype=np.int64) * 256)[:, None]
+    flat = luma.reshape(frames, -1).astype(np.int64) + offsets
+    return np.bincount(flat.ravel(), minlength=frames * 256).reshape(frames, 256)
+
+
+def tile_motion(luma: np.ndarray, previous: Optional[np.ndarray] = None, tiles: int = MOTION_TILES) -> np.ndarray:
+    """
+    Mean absolute frame difference per tile, shape ``(N, tiles, tiles)``.
+
+    The first frame is compared with ``previous`` (last frame of the prior
+    chunk) when given, and scores no motion otherwise.
+    """
+    frames, height, width = luma.shape
+    g = luma.astype(np.int16)
+    if previous is not None:
+        g = np.concatenate((np.asarray(previous, dtype=np.int16)[None], g))
+    difference = np.abs(np.diff(g, axis=0)).astype(np.float32)
+    if previous is None:
+        difference = np.concatenate((np.zeros((1, height, width), dtype=np.float32), difference))
+
+    th, tw = height // tiles, width // tiles
+    difference = difference[:, :th * tiles, :tw * tiles]
+    return difference.reshape(frames, tiles, th, tiles, tw).mean(axis=(2, 4))
+
+
+class ChunkQuality:
+    """Per-frame metrics and scores of one camera chunk."""
+
+    __slots__ = (
+        "camera_id", "chunk", "sharpness", "brightness", "contrast", "clipped_high", "clipped_low",
+        "shake", "activity", "scores", "first_frame", "last_frame",
+    )
+
+    def __init__(self, camera_id: str, chunk: int, luma: np.ndarray, previous: Optional[np.ndarray] = None):
+        self.camera_id = camera_id
+        self.chunk = chunk
+        pixels = luma.shape[1] * luma.shape[2]
+
+        self.sharpness = laplacian_variance(luma)
+        histograms = luma_histograms(luma).astype(np.float64)
+        levels = np.arange(256, dtype=np.float64)
+        self.brightness = histograms @ levels / pixels
+        self.contrast = np.sqrt(np.maximum(histograms @ levels ** 2 / pixels - self.brightness ** 2, 0))
+        self.clipped_high = histograms[:, CLIP_HIGH + 1:].sum(axis=1) / pixels
+        self.clipped_low = histograms[:, :CLIP_LOW].sum(axis=1) / pixels
+
+        motion = tile_motion(luma, previous).reshape(len(luma), -1)
+        self.shake = np.median(motion, axis=1)
+        self.activity = motion.max(axis=1) - self.shake
+
+        self._score()
+        # Kept until the prior chunk's last frame is linked in
+        self.first_frame = luma[0].copy() if previous is None else None
+        self.last_frame = luma[-1].copy()
+
+    def _score(self) -> None:
+        components = self.components()
+        self.scores = sum(QUALITY_WEIGHTS[name] * components[name] for name in QUALITY_WEIGHTS)
+
+    @property
+    def linked(self) -> bool:
+        """Whether the first frame's motion was measured against the prior chunk."""
+        return self.first_frame is None
+
+    def link(self, previous: np.ndarray) -> None:
+        """Measure the first frame's motion against ``previous`` (last frame of the prior chunk)."""
+        if self.first_frame is None or previous.shape != self.first_frame.shape:
+            return
+        motion = tile_motion(self.first_frame[None], previous).reshape(-1)
+        self.shake[0] = np.median(motion)
+        self.activity[0] = motion.max() - self.shake[0]
+        self._score()
+        self.first_frame = None
+
+    def components(self) -> Dict[str, np.ndarray]:
+        """Per-frame 0-1 scores of each weighted dimension."""
+        brightness_score = 1.0 - np.abs(self.brightness - TARGET_BRIGHTNESS) / TARGET_BRIGHTNESS
+        contrast_score = np.minimum(1.0, self.contrast / CONTRAST_REFERENCE)
+        exposure_penalty = 2 * (self.clipped_high + self.clipped_low)
+        return {
+            "sharpness": np.minimum(1.0, self.sharpness / SHARPNESS_REFERENCE),
+            "exposure": np.clip((brightness_score + contrast_score) / 2 - exposure_penalty, 0.0, 1.0),
+            "stability": np.clip(1.0 - self.shake / SHAKE_REFERENCE, 0.0, 1.0),
+            "activity": np.minimum(1.0, self.activity / ACTIVITY_REFERENCE),
+        }
+
+    @property
+    def frames(self) -> int:
+        return len(self.scores)
+
+    def summary(self) -> Dict[str, Any]:
+        components = self.components()
+        return {
+            "camera_id": self.camera_id,
+            "chunk": self.chunk,
+            "frames": self.frames,
+            "overall_score": round(float(self.scores.mean()), 4),
+            **{name: round(float(values.mean()), 4) for name, values in components.items()},
+            "brightness": round(float(self.brightness.mean()), 2),
+            "clipped_high": round(float(self.clipped_high.mean()), 4),
+            "clipped_low": round(float(self.clipped_low.mean()), 4),
+            "laplacian_variance": round(float(self.sharpness.mean()), 2),
+        }
+
+
+class QualityEngine:
+    """Scores frame batches and caches the results per (camera, chunk)."""
+
+    def __init__(self, cache_size: int = QUALITY_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, int], ChunkQuality]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, camera_id: str, chunk: int) -> Optional[ChunkQuality]:
+        with self._lock:
+            result = self._cache.get((camera_id, chunk))
+            if result is not None:
+                self._cache.move_to_end((camera_id, chunk))
+            return result
+
+    def assess(
+        self,
+        camera_id: str,
+        chunk: int,
+        frames: np.ndarray,
+        channel_order: str = "bgr",
+        previous: Optional[np.ndarray] = None
+    ) -> ChunkQuality:
+        """
+        Score a chunk's frames, or return the cached result.
+
+        Args:
+            camera_id: Camera the frames come from
+            chunk: Chunk index within the camera's recording
+            frames: Downsampled ``(N, H, W)`` or ``(N, H, W, 3)`` frames
+            channel_order: Channel order of color frames
+            previous: Last luma frame before the chunk; defaults to the
+                cached chunk ``chunk - 1`` of the same camera
+        """
+        cached = self.get(camera_id, chunk)
+        if cached is not None:
+            return cached
+
+        luma = to_luma(frames, channel_order)
+        if not len(luma):
+            raise ValueError("frames must hold at least one frame")
+        if previous is None:
+            prior = self.get(camera_id, chunk - 1)
+            if prior is not None and prior.last_frame.shape == luma.shape[1:]:
+                previous = prior.last_frame
+
+        return self.store(ChunkQuality(camera_id, chunk, luma, previous))
+
+    def store(self, result: ChunkQuality) -> ChunkQuality:
+        """
+        Cache a result computed elsewhere (e.g. in a frame pool worker).
+
+        Chunks scored independently have no motion for their first frame;
+        it is measured here once the neighbouring chunk is cached, in
+        whichever order the two arrive.
+        """
+        with self._lock:
+            prior = self._cache.get((result.camera_id, result.chunk - 1))
+            if prior is not None:
+                result.link(prior.last_frame)
+            following = self._cache.get((result.camera_id, result.chunk + 1))
+            if following is not None:
+                following.link(result.last_frame)
+            self._cache[(result.camera_id, result.chunk)] = result
+            self._cache.move_to_end((result.camera_id, result.chunk))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def score_matrix(
+        self,
+        camera_ids: Sequence[str],
+        chunks: Sequence[int],
+        samples_per_chunk: int
+    ) -> np.ndarray:
+        """
+        Cached per-frame scores as a ``(cameras, len(chunks) * samples_per_chunk)`` matrix.
+
+        Each chunk is resampled to ``samples_per_chunk`` values; chunks
+        that were never scored are NaN (no footage for camera switching).
+        """
+        matrix = np.full((len(camera_ids), len(chunks) * samples_per_chunk), np.nan)
+        positions = np.linspace(0, 1, samples_per_chunk)
+        for row, camera_id in enumerate(camera_ids):
+            for column, chunk in enumerate(chunks):
+                result = self.get(camera_id, chunk)
+                if result is None:
+                    continue
+                source = np.linspace(0, 1, result.frames) if result.frames > 1 else np.zeros(1)
+                start = column * samples_per_chunk
+                matrix[row, start:start + samples_per_chunk] = np.interp(positions, source, result.scores)
+        return matrix
+
+    def invalidate(self, camera_id: str) -> int:
+        """Drop a camera's cached chunks; returns how many."""
+        with self._lock:
+            keys = [key for key in self._cache if key[0] == camera_id]
+            for key in keys:
+                del self._cache[key]
+            return len(keys)
+
+
+# Shared engine for live scoring and compilation jobs
+quality_engine = QualityEngine()
@@ -0,0 +1,521 @@
+"""
+Resumable, offset-addressed video uploads (tus-style).
+
+A phone starts a session with the total ``upload_length``; the server
+preallocates ``{TEMP_UPLOAD_DIR}/{session}.part`` at full size. Every chunk
+names its byte offset and is written in place with ``pwrite``, so chunks may
+arrive in any order, retries simply rewrite the same bytes, and a dropped
+connection costs only the ranges that never landed. Received ranges are
+recorded in a ``{session}.json`` sidecar only after the data is flushed
+to disk, so a status query never reports bytes that could still be lost.
+
+Sidecar updates are serialized with ``flock`` on ``{session}.lock``, so
+several workers on one host may receive chunks of the same session.
+
+Chunk bodies are streamed to disk through a fixed ``UPLOAD_CHUNK_SIZE_KB``
+buffer as they arrive, so memory per upload does not grow with the chunk
+size. ``VIDEO_CHUNK_SIZE_MB`` is only the chunk size advertised to clients;
+a single request body may be up to ``MAX_UPLOAD_SIZE_MB``.
+
+Chunks sent with a digest go through ``chunk_store`` instead: they are
+verified, stored once per content and can be linked into another of the
+same owner's sessions (after a reconnect) without resending the body.
+"""
+
+import asyncio
+import fcntl
+import json
+import logging
+import math
+import os
+import re
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, AsyncIterable, Callable, Dict, Iterator, List, Optional
+
+import aiofiles
+import aiofiles.os
+
+from app.core.config import settings
+from app.core.exceptions import (
+    AuthorizationException,
+    ChunkNotFoundException,
+    InvalidUploadRangeException,
+    StorageException,
+    UploadIncompleteException,
+    UploadSessionNotFoundException,
+    VideoTooLargeException,
+)
+from app.services.chunk_store import ChunkStore, FixedBufferWriter, chunk_store
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+_SESSION_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_fdatasync = aiofiles.os.wrap(os.fdatasync)
+
+
+async def _in_thread(func: Callable[..., Any], *args: Any) -> Any:
+    """Run blocking sidecar I/O off the event loop."""
+    return await aiofiles.os.wrap(func)(*args)
+
+
+def merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """
+    Add ``[start, end)`` to sorted, disjoint ranges, merging overlaps and neighbours.
+
+    Returns:
+        New sorted, disjoint range list
+    """
+    starts = [r[0] for r in ranges]
+    i = bisect_left(starts, start)
+    # Step back if the previous range touches the new one
+    if i > 0 and ranges[i - 1][1] >= start:
+        i -= 1
+    j = i
+    while j < len(ranges) and ranges[j][0] <= end:
+        start = min(start, ranges[j][0])
+        end = max(end, ranges[j][1])
+        j += 1
+    return ranges[:i] + [[start, end]] + ranges[j:]
+
+
+class UploadSession:
+    """State of one resumable upload as stored in its sidecar."""
+
+    __slots__ = ("session_id", "owner", "length", "ranges", "created_at", "updated_at", "completed", "metadata")
+
+    def __init__(
+        self,
+        session_id: str,
+        owner: str,
+        length: int,
+        ranges: Optional[List[List[int]]] = None,
+        created_at: Optional[float] = None,
+        updated_at: Optional[float] = None,
+        completed: bool = False,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        self.session_id = session_id
+        self.owner = owner
+        self.length = length
+        self.ranges = ranges or []
+        self.created_at = created_at or time.time()
+        self.updated_at = updated_at or self.created_at
+        self.completed = completed
+        self.metadata = metadata or {}
+
+    @property
+    def received(self) -> int:
+        return sum(end - start for start, end in self.ranges)
+
+    @property
+    def offset(self) -> int:
+        """End of the contiguous prefix received from byte 0 (the tus ``Upload-Offset``)."""
+        if self.ranges and self.ranges[0][0] == 0:
+            return self.ranges[0][1]
+        return 0
+
+    def missing(self) -> List[List[int]]:
+        """Byte ranges ``[start, end)`` not yet received."""
+        gaps = []
+        cursor = 0
+        for start, end in self.ranges:
+            if start > cursor:
+                gaps.append([cursor, start])
+            cursor = end
+        if cursor < self.length:
+            gaps.append([cursor, self.length])
+        return gaps
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "owner": self.owner,
+            "length": self.length,
+            "ranges": self.ranges,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "completed": self.completed,
+            "metadata": self.metadata,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "UploadSession":
+        return cls(**data)
+
+    def status(self) -> Dict[str, Any]:
+        """Client-facing view of the upload."""
+        return {
+            "session_id": self.session_id,
+            "upload_length": self.length,
+            "upload_offset": self.offset,
+            "received": self.received,
+            "missing": self.missing(),
+            "complete": self.completed,
+            "metadata": self.metadata,
+        }
+
+
+class UploadService:
+    """Creates, fills and finishes resumable upload sessions on local disk."""
+
+    def __init__(
+        self,
+        directory: str = settings.TEMP_UPLOAD_DIR,
+        max_size: int = settings.MAX_VIDEO_SIZE_MB * MB,
+        chunk_size: int = settings.VIDEO_CHUNK_SIZE_MB * MB,
+        max_chunk: int = settings.MAX_UPLOAD_SIZE_MB * MB,
+        buffer_size: int = settings.UPLOAD_CHUNK_SIZE_KB * 1024,
+        ttl: int = settings.GAME_SESSION_TIMEOUT_HOURS * 3600,
+        cleanup_interval: int = settings.UPLOAD_CLEANUP_INTERVAL,
+        chunks: ChunkStore = chunk_store
+    ):
+        self.directory = directory
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.max_chunk = max_chunk
+        self.buffer_size = buffer_size
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self.chunks = chunks
+        self._cleanup_task: Optional[asyncio.Task] = None
+
+    # Paths and sidecar access
+
+    def _path(self, session_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, session_id + suffix)
+
+    def data_path(self, session_id: str) -> str:
+        """Partial file while uploading; the finished file keeps the same path."""
+        return self._path(session_id, ".part")
+
+    @contextmanager
+    def _locked(self, session_id: str) -> Iterator[None]:
+        with open(self._path(session_id, ".lock"), "a") as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def _read(self, session_id: str) -> UploadSession:
+        if not _SESSION_ID.match(session_id):
+            raise UploadSessionNotFoundException(session_id)
+        try:
+            with open(self._path(session_id, ".json")) as f:
+                return UploadSession.from_dict(json.load(f))
+        except FileNotFoundError:
+            raise UploadSessionNotFoundException(session_id)
+        except (ValueError, TypeError) as e:
+            raise StorageException("read_upload_session", str(e))
+
+    def _write(self, session: UploadSession) -> None:
+        path = self._path(session.session_id, ".json")
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(session.to_dict(), f)
+        os.replace(tmp, path)
+
+    def _update(self, session_id: str, change: Callable[[UploadSession], None]) -> UploadSession:
+        with self._locked(session_id):
+            session = self._read(session_id)
+            change(session)
+            session.updated_at = time.time()
+            self._write(session)
+        return session
+
+    # Session lifecycle
+
+    def create(self, owner: str, length: int, metadata: Optional[Dict[str, Any]] = None) -> UploadSession:
+        """
+        Start an upload and preallocate its file.
+
+        Raises:
+            VideoTooLargeException: ``length`` exceeds ``MAX_VIDEO_SIZE_MB``
+            StorageException: The file could not be allocated
+        """
+        if length > self.max_size:
+            # The exception reports megabytes
+            raise VideoTooLargeException(math.ceil(length / MB), self.max_size // MB)
+        if length <= 0:
+            raise InvalidUploadRangeException("", 0, length, "upload length must be positive")
+
+        os.makedirs(self.directory, exist_ok=True)
+        session = UploadSession(uuid.uuid4().hex, owner, length, metadata=metadata)
+        try:
+            fd = os.open(self.data_path(session.session_id), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            try:
+                if hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(fd, 0, length)
+                else:
+                    os.ftruncate(fd, length)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            raise StorageException("allocate_upload", str(e))
+
+        self._write(session)
+        logger.info(f"Upload {session.session_id} started by {owner}: {length} bytes")
+        return session
+
+    def get(self, session_id: str, owner: Optional[str] = None) -> UploadSession:
+        """
+        Raises:
+            UploadSessionNotFoundException: Unknown or expired session
+            AuthorizationException: Session belongs to another user
+        """
+        session = self._read(session_id)
+        if owner is not None and session.owner != owner:
+            raise AuthorizationException("Upload session belongs to another user")
+        return session
+
+    def check_range(self, session: UploadSession, offset: int, length: int) -> None:
+        """
+        Raises:
+            InvalidUploadRangeException: Chunk is empty, too large or outside the upload
+        """
+        if offset < 0 or length <= 0:
+            raise InvalidUploadRangeException(session.session_id, offset, length, "empty chunk or negative offset")
+        if length > self.max_chunk:
+            raise InvalidUploadRangeException(
+                session.session_id, offset, length, f"chunk exceeds {self.max_chunk} bytes"
+            )
+        if offset + length > session.length:
+            raise InvalidUploadRangeException(
+                session.session_id, offset, length, f"chunk ends past upload length {session.length}"
+            )
+
+    def write_chunk(self, session_id: str, offset: int, data: bytes, owner: Optional[str] = None) -> UploadSession:
+        """
+        Write a chunk at its offset and record the range.
+
+        Rewriting a range that was already received is harmless, which is
+        what makes client retries idempotent.
+        """
+        session = self.get(session_id, owner)
+        self.check_range(session, offset, len(data))
+        if session.completed:
+            return session
+
+        try:
+            fd = os.open(self.data_path(session_id), os.O_WRONLY)
+            try:
+                view = memoryview(data)
+                written = 0
+                while written < len(view):
+                    written += os.pwrite(fd, view[written:], offset + written)
+                os.fdatasync(fd)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            raise StorageException("write_chunk", str(e))
+
+        return self.record_range(session_id, offset, offset + len(data))
+
+    async def write_chunk_stream(
+        self,
+        session_id: str,
+        offset: int,
+        stream: AsyncIterable[bytes],
+        digest: str,
+        owner: Optional[str] = None
+    ) -> UploadSession:
+        """
+        Store a streamed chunk by content, then link it at its offset.
+
+        Unlike ``write_stream`` the chunk is all-or-nothing: it is verified
+        against ``digest`` before anything lands in the session file.
+
+        Raises:
+            ChunkDigestMismatchException: Body does not hash to ``digest``
+        """
+        session = await _in_thread(self.get, session_id, owner)
+        if offset < 0 or offset >= session.length:
+            raise InvalidUploadRangeException(session_id, offset, 0, "offset outside the upload")
+        if session.completed:
+            return session
+        await self.chunks.put_stream(stream, expected=digest, limit=session.length - offset, owner=session.owner)
+        return await _in_thread(self.link_chunk, session_id, offset, digest, owner)
+
+    def link_chunk(self, session_id: str, offset: int, digest: str, owner: Optional[str] = None) -> UploadSession:
+        """
+        Place an already stored chunk at ``offset`` without transferring it again.
+
+        Raises:
+            ChunkNotFoundException: Digest is not in the chunk store, or the
+                session's owner never uploaded it
+        """
+        session = self.get(session_id, owner)
+        size = self.chunks.size(digest, session.owner)
+        if size is None:
+            raise ChunkNotFoundException(digest)
+        self.check_range(session, offset, size)
+        if session.completed:
+            return session
+
+        metadata = {"owner": session.owner, **session.metadata}
+        if self.chunks.reference(session_id, offset, digest, metadata, session.owner) or not self._has_range(session, offset, size):
+            try:
+                fd = os.open(self.data_path(session_id), os.O_WRONLY)
+                try:
+                    self.chunks.copy_into(digest, fd, offset)
+                    os.fdatasync(fd)
+                finally:
+                    os.close(fd)
+            except OSError as e:
+                raise StorageException("link_chunk", str(e))
+        return self.record_range(session_id, offset, offset + size)
+
+    @staticmethod
+    def _has_range(session: UploadSession, start: int, length: int) -> bool:
+        end = start + length
+        return any(r_start <= start and end <= r_end for r_start, r_end in session.ranges)
+
+    async def write_stream(
+        self,
+        session_id: str,
+        offset: int,
+        stream: AsyncIterable[bytes],
+        owner: Optional[str] = None
+    ) -> UploadSession:
+        """
+        Stream a chunk body to its offset through a fixed-size buffer.
+
+        The size limit is enforced as bytes arrive, before they are written.
+        If the body is cut off (client disconnect, limit exceeded) the bytes
+        already written are synced and recorded before the error propagates,
+        so a retry only needs to resend the tail.
+
+        Raises:
+            InvalidUploadRangeException: Body is empty, exceeds
+                ``MAX_UPLOAD_SIZE_MB`` or runs past the upload length
+        """
+        session = await _in_thread(self.get, session_id, owner)
+        if offset < 0 or offset >= session.length:
+            raise InvalidUploadRangeException(session_id, offset, 0, "offset outside the upload")
+        if session.completed:
+            return session
+
+        limit = min(self.max_chunk, session.length - offset)
+        try:
+            f = await aiofiles.open(self.data_path(session_id), "r+b", buffering=0)
+            await f.seek(offset)
+        except OSError as e:
+            raise StorageException("write_chunk", str(e))
+
+        writer = FixedBufferWriter(f, self.buffer_size)
+        try:
+            async for piece in stream:
+                received = writer.received + len(piece)
+                if received > limit:
+                    raise InvalidUploadRangeException(
+                        session_id, offset, received, f"chunk exceeds {limit} bytes"
+                    )
+                await writer.write(piece)
+            await writer.flush()
+        finally:
+            written = writer.written
+            try:
+                if written:
+                    await _fdatasync(f.fileno())
+            finally:
+                await f.close()
+            if written:
+                session = await _in_thread(self.record_range, session_id, offset, offset + written)
+
+        if not written:
+            raise InvalidUploadRangeException(session_id, offset, 0, "empty chunk")
+        return session
+
+    def record_range(self, session_id: str, start: int, end: int) -> UploadSession:
+        """Mark ``[start, end)`` as durably received."""
+        def change(session: UploadSession) -> None:
+            session.ranges = merge_range(session.ranges, start, end)
+
+        return self._update(session_id, change)
+
+    def finish(self, session_id: str, owner: Optional[str] = None) -> UploadSession:
+        """
+        Mark a fully received upload complete; finishing twice is a no-op.
+
+        Raises:
+            UploadIncompleteException: Byte ranges are still missing
+        """
+        session = self.get(session_id, owner)
+        if session.completed:
+            return session
+        missing = session.missing()
+        if missing:
+            raise UploadIncompleteException(session_id, missing)
+
+        def change(session: UploadSession) -> None:
+            session.completed = True
+
+        session = self._update(session_id, change)
+        # The assembled file supersedes the stored chunks
+        self.chunks.release(session_id)
+        logger.info(f"Upload {session_id} complete: {session.length} bytes")
+        return session
+
+    def discard(self, session_id: str) -> None:
+        self.chunks.release(session_id)
+        for suffix in (".part", ".json", ".lock"):
+            try:
+                os.remove(self._path(session_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def cleanup_expired(self, now: Optional[float] = None) -> int:
+        """Delete unfinished sessions idle for longer than the TTL; returns how many."""
+        now = now or time.time()
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        for name in names:
+            session_id, suffix = os.path.splitext(name)
+            if suffix != ".json" or not _SESSION_ID.match(session_id):
+                continue
+            try:
+                session = self._read(session_id)
+            except (UploadSessionNotFoundException, StorageException):
+                continue
+            if not session.completed and now - session.updated_at > self.ttl:
+                self.discard(session_id)
+                removed += 1
+        self.chunks.gc(now)
+        return removed
+
+    async def start(self) -> None:
+        """Start sweeping expired sessions and unreferenced chunks."""
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.get_running_loop().create_task(self._cleanup_loop())
+
+    async def stop(self) -> None:
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            try:
+                await self._cleanup_task
+            except asyncio.CancelledError:
+                pass
+            self._cleanup_task = None
+
+    async def _cleanup_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            try:
+                removed = await _in_thread(self.cleanup_expired)
+                if removed:
+                    logger.info(f"Removed {removed} expired upload sessions")
+            except Exception as e:
+                logger.warning(f"Upload cleanup failed: {e}")
+
+
+# Shared upload service
+upload_service = UploadService()
@@ -0,0 +1,351 @@
+"""
+Byte-range delivery of processed videos.
+
+Serves files from ``VIDEO_STORAGE_DIR`` with ``Range``/``If-Range`` support:
+single ranges come back as ``206`` with ``Content-Range``, several ranges
+(seek probes) as one ``multipart/byteranges`` body. Validators are derived
+from ``stat`` alone (size and mtime), so a conditional or repeated seek
+costs a ``stat`` and reads exactly the requested bytes.
+
+Bodies go out as bounded slices read with ``os.pread`` in a worker thread,
+so memory per response stays at one slice however large the range, and
+disk reads of a cold file never stall the event loop.
+
+A video missing from the directory is looked up in ``file_storage`` when
+that backend is remote; its ranges are then streamed from the object store
+(one ranged GET per part, read in a worker thread).
+"""
+
+import logging
+import os
+import re
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.exceptions import VideoNotFoundException
+from app.utils.file_storage import StorageBackend, StoredObject, file_storage
+
+logger = logging.getLogger(__name__)
+
+# Slice read and sent per ASGI message for local files
+SEND_CHUNK_BYTES = 256 * 1024
+# More ranges than this in one request are served as a full response
+MAX_RANGES = 16
+
+CONTENT_TYPES = {
+    "mp4": "video/mp4",
+    "mov": "video/quicktime",
+    "avi": "video/x-msvideo",
+    "mkv": "video/x-matroska",
+    "m4s": "video/iso.segment",
+    "ts": "video/mp2t",
+}
+
+_VIDEO_ID = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+_RANGE_SPEC = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+class VideoAsset:
+    """A servable file and its validators."""
+
+    __slots__ = (
+        "video_id", "path", "filename", "size", "mtime", "etag", "last_modified", "content_type", "storage",
+    )
+
+    def __init__(self, video_id: str, path: str):
+        st = os.stat(path)
+        self.video_id = video_id
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.size = st.st_size
+        self.mtime = int(st.st_mtime)
+        self.etag = f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        extension = os.path.splitext(path)[1].lstrip(".").lower()
+        self.content_type = CONTENT_TYPES.get(extension, "application/octet-stream")
+        # Backend holding the bytes when they are not a local file (``path`` is then the key)
+        self.storage: Optional[StorageBackend] = None
+
+    @classmethod
+    def stored(cls, video_id: str, storage: StorageBackend, stored: StoredObject) -> "VideoAsset":
+        """Asset for an object in a storage backend."""
+        asset = cls.__new__(cls)
+        asset.video_id = video_id
+        asset.path = stored.key
+        asset.filename = os.path.basename(stored.key)
+        asset.size = stored.size
+        asset.mtime = int(stored.last_modified)
+        asset.etag = f'"{stored.etag}"'
+        asset.last_modified = formatdate(asset.mtime, usegmt=True)
+        extension = os.path.splitext(stored.key)[1].lstrip(".").lower()
+        asset.content_type = CONTENT_TYPES.get(extension, stored.content_type or "application/octet-stream")
+        asset.storage = storage
+        return asset
+
+
+class VideoLibrary:
+    """
+    Resolves video ids to files in the video storage directory, then to
+    objects in ``storage`` when one is given.
+    """
+
+    def __init__(
+        self,
+        directory: str = settings.VIDEO_STORAGE_DIR,
+        formats: Sequence[str] = tuple(settings.SUPPORTED_VIDEO_FORMATS),
+        storage: Optional[StorageBackend] = None
+    ):
+        self.directory = directory
+        self.formats = tuple(formats)
+        self.storage = storage
+
+    def local(self, video_id: str) -> Optional[VideoAsset]:
+        if _VIDEO_ID.match(video_id):
+            for extension in self.formats:
+                try:
+                    return VideoAsset(video_id, os.path.join(self.directory, f"{video_id}.{extension}"))
+                except FileNotFoundError:
+                    continue
+        return None
+
+    def remote(self, video_id: str) -> Optional[VideoAsset]:
+        if self.storage is not None and _VIDEO_ID.match(video_id):
+            for extension in self.formats:
+                stored = self.storage.stat(f"{video_id}.{extension}")
+                if stored is not None:
+                    return VideoAsset.stored(video_id, self.storage, stored)
+        return None
+
+    def get(self, video_id: str) -> VideoAsset:
+        """
+        Raises:
+            VideoNotFoundException: No stored file for the id
+        """
+        asset = self.local(video_id) or self.remote(video_id)
+        if asset is None:
+            raise VideoNotFoundException(video_id)
+        return asset
+
+    async def resolve(self, video_id: str) -> VideoAsset:
+        """``get`` for request handlers: remote lookups run in a worker thread."""
+        asset = self.local(video_id)
+        if asset is None and self.storage is not None:
+            asset = await run_in_threadpool(self.remote, video_id)
+        if asset is None:
+            raise VideoNotFoundException(video_id)
+        return asset
+
+
+def parse_range(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a ``Range`` header into inclusive byte ranges.
+
+    Overlapping and adjacent ranges are merged, so a multipart response
+    never sends the same byte twice.
+
+    Returns:
+        Sorted ``(first, last)`` ranges; ``[]`` when none is satisfiable; None
+        when the header is malformed or asks for too many ranges (serve the
+        full file)
+    """
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs:
+        return None
+    parts = specs.split(",")
+    if len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        match = _RANGE_SPEC.match(part)
+        if match is None:
+            return None
+        first, last = match.groups()
+        if first == "":
+            if last == "":
+                return None
+            # Suffix range: the final N bytes
+            length = int(last)
+            if length == 0:
+                continue
+            ranges.append((max(0, size - length), size - 1))
+        else:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None
+            if start >= size:
+                continue
+            ranges.append((start, min(end, size - 1)))
+
+    ranges.sort()
+    merged: List[Tuple[int, int]] = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _etag_matches(header: str, etag: str, weak: bool) -> bool:
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, mtime: int) -> bool:
+    try:
+        return mtime <= int(parsedate_to_datetime(header).timestamp())
+    except (TypeError, ValueError):
+        return False
+
+
+class RangeFileResponse(Response):
+    """Full, single-range or multipart response over a file."""
+
+    def __init__(
+        self,
+        asset: VideoAsset,
+        ranges: Optional[List[Tuple[int, int]]] = None,
+        headers: Optional[Dict[str, str]] = None,
+        head: bool = False
+    ):
+        self.asset = asset
+        self.head = head
+        self.background = None
+        self.parts: List[Tuple[bytes, int, int]] = []
+        self.trailer = b""
+        size = asset.size
+
+        all_headers = dict(headers or {})
+        if not ranges:
+            self.status_code = 200
+            self.parts = [(b"", 0, size)]
+            all_headers["Content-Type"] = asset.content_type
+            length = size
+        elif len(ranges) == 1:
+            first, last = ranges[0]
+            self.status_code = 206
+            self.parts = [(b"", first, last - first + 1)]
+            all_headers["Content-Type"] = asset.content_type
+            all_headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+            length = last - first + 1
+        else:
+            boundary = secrets.token_hex(12)
+            self.status_code = 206
+            all_headers["Content-Type"] = f"multipart/byteranges; boundary={boundary}"
+            length = 0
+            for i, (first, last) in enumerate(ranges):
+                separator = b"\r\n" if i else b""
+                prefix = separator + (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: {asset.content_type}\r\n"
+                    f"Content-Range: bytes {first}-{last}/{size}\r\n\r\n"
+                ).encode("latin-1")
+                self.parts.append((prefix, first, last - first + 1))
+                length += len(prefix) + last - first + 1
+            self.trailer = f"\r\n--{boundary}--\r\n".encode("latin-1")
+            length += len(self.trailer)
+
+        all_headers["Content-Length"] = str(length)
+        self.init_headers(all_headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if self.head or self.asset.size == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        if self.asset.storage is not None:
+            await self._send_stored(send)
+            return
+
+        fd = await run_in_threadpool(os.open, self.asset.path, os.O_RDONLY)
+        try:
+            for prefix, offset, count in self.parts:
+                if prefix:
+                    await send({"type": "http.response.body", "body": prefix, "more_body": True})
+                end = offset + count
+                while offset < end:
+                    body = await run_in_threadpool(os.pread, fd, min(SEND_CHUNK_BYTES, end - offset), offset)
+                    if not body:
+                        raise OSError(f"{self.asset.path} shrank while it was being sent")
+                    await send({"type": "http.response.body", "body": body, "more_body": True})
+                    offset += len(body)
+        finally:
+            os.close(fd)
+        await send({"type": "http.response.body", "body": self.trailer, "more_body": False})
+
+    async def _send_stored(self, send: Send) -> None:
+        storage = self.asset.storage
+        for prefix, offset, count in self.parts:
+            if prefix:
+                await send({"type": "http.response.body", "body": prefix, "more_body": True})
+            async for chunk in iterate_in_threadpool(storage.iter_range(self.asset.path, offset, count)):
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        await send({"type": "http.response.body", "body": self.trailer, "more_body": False})
+
+
+def range_response(request: Request, asset: VideoAsset, filename: Optional[str] = None) -> Response:
+    """
+    Answer a GET/HEAD for ``asset`` honouring conditional and range headers.
+
+    Args:
+        request: Incoming request
+        asset: File to serve
+        filename: Send as an attachment with this name (downloads)
+    """
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": asset.etag,
+        "Last-Modified": asset.last_modified,
+    }
+    if filename is not None:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, asset.etag, weak=True):
+            return Response(status_code=304, headers=headers)
+    elif _not_modified_since(request.headers.get("if-modified-since", ""), asset.mtime):
+        return Response(status_code=304, headers=headers)
+
+    head = request.method == "HEAD"
+    range_header = request.headers.get("range")
+    if range_header is None:
+        return RangeFileResponse(asset, headers=headers, head=head)
+
+    # A stale If-Range validator means the client's partial copy is outdated
+    if_range = request.headers.get("if-range")
+    if if_range is not None:
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            fresh = if_range == asset.etag
+        else:
+            fresh = if_range.strip() == asset.last_modified
+        if not fresh:
+            return RangeFileResponse(asset, headers=headers, head=head)
+
+    ranges = parse_range(range_header, asset.size)
+    if ranges is None:
+        return RangeFileResponse(asset, headers=headers, head=head)
+    if not ranges:
+        headers["Content-Range"] = f"bytes */{asset.size}"
+        return Response(status_code=416, headers=headers)
+    return RangeFileResponse(asset, ranges, headers=headers, head=head)
+
+
+# Shared library over VIDEO_STORAGE_DIR, backed by a remote STORAGE_BACKEND
+video_library = VideoLibrary(storage=file_storage if file_storage.remote else None)
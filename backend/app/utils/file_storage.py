@@ -0,0 +1,391 @@
+"""
+Video file storage.
+
+Compiled videos are written to ``VIDEO_STORAGE_DIR`` and may be offloaded
+to an object store. Both sides implement ``StorageBackend``, keyed by
+relative names such as ``{video_id}.mp4``.
+
+Backends:
+    local - files under a root directory (``VIDEO_STORAGE_DIR``)
+    s3    - Amazon S3 or an S3-compatible store (MinIO, moto server) at
+            ``AWS_S3_ENDPOINT_URL``
+
+The S3 backend shares one boto3 client, whose connection pool is sized for
+``S3_UPLOAD_CONCURRENCY`` parallel requests. Files larger than one part go
+up as multipart uploads: parts of ``S3_MULTIPART_PART_MB`` are read with
+``pread`` and sent by a bounded thread pool, so memory stays at
+``concurrency * part size`` whatever the file size. Every request body
+carries its ``Content-MD5``, which the store verifies before accepting it
+(``BadDigest`` otherwise). ETags are not compared with local digests: with
+SSE-KMS or SSE-C encryption they are not MD5s. A failed upload is aborted
+before it is completed, so no orphaned parts are billed.
+
+Range reads stream a byte range of an object in chunks, which is what
+``video_delivery`` needs to serve seeks on videos that only exist remotely.
+Calls block; request handlers run them in a thread, and compilation jobs
+offload their output from the job worker.
+"""
+
+import base64
+import hashlib
+import logging
+import math
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.core.config import settings
+from app.core.exceptions import StorageException
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Bytes per chunk yielded by range reads and used for local copies
+READ_CHUNK_BYTES = 256 * 1024
+# S3 multipart limits
+MIN_PART_SIZE = 5 * MB
+MAX_PARTS = 10000
+# Lifetime of presigned URLs when no CloudFront domain is configured
+PRESIGNED_URL_EXPIRES = 3600
+
+_KEY = re.compile(r"^[0-9A-Za-z_.-]+(/[0-9A-Za-z_.-]+)*$")
+
+
+def validate_key(key: str) -> str:
+    """
+    Raises:
+        StorageException: ``key`` is not a relative name without ``..`` parts
+    """
+    if not _KEY.match(key) or any(part in (".", "..") for part in key.split("/")):
+        raise StorageException("key", f"invalid storage key {key!r}")
+    return key
+
+
+def _content_md5(body: bytes) -> str:
+    """``Content-MD5`` header value; the store rejects a body that does not match."""
+    return base64.b64encode(hashlib.md5(body, usedforsecurity=False).digest()).decode("ascii")
+
+
+@contextmanager
+def _storage_errors(operation: str) -> Iterator[None]:
+    """Report I/O and client failures as ``StorageException``."""
+    try:
+        yield
+    except StorageException:
+        raise
+    except Exception as e:
+        raise StorageException(operation, f"{type(e).__name__}: {e}") from e
+
+
+def _copy(source: str, target: str) -> None:
+    """Copy through a ``.part`` file so readers never see a partial target."""
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    partial = f"{target}.part"
+    with open(source, "rb") as src, open(partial, "wb") as f:
+        while True:
+            chunk = src.read(READ_CHUNK_BYTES)
+            if not chunk:
+                break
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, target)
+
+
+class StoredObject:
+    """Size and validators of a stored file."""
+
+    __slots__ = ("key", "size", "etag", "last_modified", "content_type")
+
+    def __init__(
+        self,
+        key: str,
+        size: int,
+        etag: str,
+        last_modified: float,
+        content_type: Optional[str] = None
+    ):
+        self.key = key
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_type = content_type
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "size": self.size,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "content_type": self.content_type,
+        }
+
+
+class StorageBackend(ABC):
+    """Interface of the storage backends."""
+
+    # Whether objects live outside the local video directory
+    remote = False
+
+    @abstractmethod
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> StoredObject:
+        """Store a local file under ``key``, replacing any previous object."""
+
+    @abstractmethod
+    def get_file(self, key: str, path: str) -> StoredObject:
+        """Download an object to a local path."""
+
+    @abstractmethod
+    def stat(self, key: str) -> Optional[StoredObject]:
+        """Object metadata, or None when the key does not exist."""
+
+    @abstractmethod
+    def iter_range(self, key: str, offset: int, count: int) -> Iterator[bytes]:
+        """Yield ``count`` bytes of an object from ``offset`` in chunks."""
+
+    def read_range(self, key: str, offset: int, count: int) -> bytes:
+        return b"".join(self.iter_range(key, offset, count))
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        """Remove an object; returns whether it existed."""
+
+    def url(self, key: str, expires: int = PRESIGNED_URL_EXPIRES) -> Optional[str]:
+        """Direct download URL, when the backend has one."""
+        return None
+
+
+class LocalStorage(StorageBackend):
+    """Files under a root directory, written atomically."""
+
+    def __init__(self, root: str = settings.VIDEO_STORAGE_DIR):
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, validate_key(key))
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> StoredObject:
+        target = self.path(key)
+        with _storage_errors("put"):
+            if os.path.abspath(path) != os.path.abspath(target):
+                _copy(path, target)
+        return self.stat(key)
+
+    def get_file(self, key: str, path: str) -> StoredObject:
+        stored = self.stat(key)
+        if stored is None:
+            raise StorageException("get", f"no object {key!r}")
+        with _storage_errors("get"):
+            _copy(self.path(key), path)
+        return stored
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        try:
+            st = os.stat(self.path(key))
+        except FileNotFoundError:
+            return None
+        return StoredObject(key, st.st_size, f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}", st.st_mtime)
+
+    def iter_range(self, key: str, offset: int, count: int) -> Iterator[bytes]:
+        with _storage_errors("read"), open(self.path(key), "rb") as f:
+            f.seek(offset)
+            while count > 0:
+                chunk = f.read(min(READ_CHUNK_BYTES, count))
+                if not chunk:
+                    break
+                count -= len(chunk)
+                yield chunk
+
+    def delete(self, key: str) -> bool:
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+
+class S3Storage(StorageBackend):
+    """
+    Amazon S3 or an S3-compatible store.
+
+    Args:
+        bucket: Bucket name, defaults to ``settings.AWS_S3_BUCKET``
+        endpoint_url: S3-compatible endpoint; path-style addressing is used
+            when set
+        part_size: Multipart part size in bytes
+        concurrency: Parallel part uploads (and pooled connections)
+        client: Pre-built boto3 S3 client, e.g. one pointed at a moto
+            server in tests
+    """
+
+    remote = True
+
+    def __init__(
+        self,
+        bucket: str = settings.AWS_S3_BUCKET,
+        region: str = settings.AWS_REGION,
+        endpoint_url: Optional[str] = settings.AWS_S3_ENDPOINT_URL,
+        part_size: int = settings.S3_MULTIPART_PART_MB * MB,
+        concurrency: int = settings.S3_UPLOAD_CONCURRENCY,
+        cloudfront_domain: Optional[str] = settings.AWS_CLOUDFRONT_DOMAIN,
+        client: Any = None
+    ):
+        self.bucket = bucket
+        self.region = region
+        self.endpoint_url = endpoint_url or None
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.concurrency = max(1, concurrency)
+        self.cloudfront_domain = cloudfront_domain or None
+        self._client = client
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import boto3
+                    from botocore.config import Config
+
+                    self._client = boto3.session.Session().client(
+                        "s3",
+                        region_name=self.region,
+                        endpoint_url=self.endpoint_url,
+                        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                        config=Config(
+                            max_pool_connections=self.concurrency * 2,
+                            retries={"mode": "standard", "max_attempts": 5},
+                            s3={"addressing_style": "path"} if self.endpoint_url else None,
+                        ),
+                    )
+        return self._client
+
+    def put_file(self, key: str, path: str, content_type: Optional[str] = None) -> StoredObject:
+        validate_key(key)
+        extra = {"ContentType": content_type} if content_type else {}
+        with _storage_errors("put"):
+            size = os.path.getsize(path)
+            if size <= self.part_size:
+                with open(path, "rb") as f:
+                    body = f.read()
+                self.client.put_object(Bucket=self.bucket, Key=key, Body=body, ContentMD5=_content_md5(body), **extra)
+            else:
+                self._put_multipart(key, path, size, extra)
+        stored = self.stat(key)
+        logger.info(f"Stored {key} in s3://{self.bucket} ({size} bytes)")
+        return stored
+
+    def _put_multipart(self, key: str, path: str, size: int, extra: Dict[str, str]) -> None:
+        part_size = max(self.part_size, math.ceil(size / MAX_PARTS))
+        parts = math.ceil(size / part_size)
+        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key, **extra)["UploadId"]
+        fd = os.open(path, os.O_RDONLY)
+
+        def upload_part(index: int) -> Dict[str, Any]:
+            # pread keeps the parts independent of a shared file position
+            body = os.pread(fd, part_size, index * part_size)
+            if len(body) != min(part_size, size - index * part_size):
+                raise StorageException("put", f"{path} changed during upload")
+            response = self.client.upload_part(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=index + 1, Body=body,
+                ContentMD5=_content_md5(body),
+            )
+            return {"ETag": response["ETag"], "PartNumber": index + 1}
+
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, parts)) as executor:
+                uploaded: List[Dict[str, Any]] = list(executor.map(upload_part, range(parts)))
+            # Nothing may fail after this call: the object then exists and abort is a no-op
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": uploaded}
+            )
+        except BaseException:
+            try:
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            except Exception as e:
+                logger.warning(f"Could not abort multipart upload of {key}: {e}")
+            raise
+        finally:
+            os.close(fd)
+
+    def get_file(self, key: str, path: str) -> StoredObject:
+        validate_key(key)
+        partial = f"{path}.part"
+        with _storage_errors("get"):
+            response = self.client.get_object(Bucket=self.bucket, Key=key)
+            with open(partial, "wb") as f:
+                for chunk in response["Body"].iter_chunks(READ_CHUNK_BYTES):
+                    f.write(chunk)
+            os.replace(partial, path)
+        return self._stored(key, response)
+
+    def stat(self, key: str) -> Optional[StoredObject]:
+        validate_key(key)
+        with _storage_errors("stat"):
+            try:
+                response = self.client.head_object(Bucket=self.bucket, Key=key)
+            except Exception as e:
+                if getattr(e, "response", {}).get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                    return None
+                raise
+        return self._stored(key, response)
+
+    @staticmethod
+    def _stored(key: str, response: Dict[str, Any]) -> StoredObject:
+        modified = response.get("LastModified")
+        return StoredObject(
+            key,
+            response["ContentLength"],
+            response["ETag"].strip('"'),
+            modified.timestamp() if modified is not None else time.time(),
+            response.get("ContentType"),
+        )
+
+    def iter_range(self, key: str, offset: int, count: int) -> Iterator[bytes]:
+        validate_key(key)
+        if count <= 0:
+            return
+        with _storage_errors("read"):
+            response = self.client.get_object(Bucket=self.bucket, Key=key, Range=f"bytes={offset}-{offset + count - 1}")
+            body = response["Body"]
+            try:
+                yield from body.iter_chunks(READ_CHUNK_BYTES)
+            finally:
+                body.close()
+
+    def delete(self, key: str) -> bool:
+        if self.stat(key) is None:
+            return False
+        with _storage_errors("delete"):
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+        return True
+
+    def url(self, key: str, expires: int = PRESIGNED_URL_EXPIRES) -> Optional[str]:
+        validate_key(key)
+        if self.cloudfront_domain:
+            return f"https://{self.cloudfront_domain}/{key}"
+        with _storage_errors("url"):
+            return self.client.generate_presigned_url(
+                "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=expires
+            )
+
+
+def create_storage(name: Optional[str] = None) -> StorageBackend:
+    """Build the configured storage backend (``STORAGE_BACKEND``)."""
+    name = name or settings.STORAGE_BACKEND
+    if name == "s3":
+        return S3Storage()
+    if name == "local":
+        return LocalStorage()
+    raise ValueError(f"Unknown storage backend: {name}")
+
+
+# Process-wide storage backend
+file_storage = create_storage()
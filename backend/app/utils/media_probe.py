@@ -0,0 +1,626 @@
+"""
+MP4/MOV container probe.
+
+Reads what upload validation, indexing and compilation need (duration,
+resolution, codecs, frame rate, creation time and the keyframe index)
+straight from the ISO base media boxes, without decoding or starting
+ffprobe:
+
+- The file is memory-mapped and only box headers are read while walking
+  the top level, so an ``mdat`` of several gigabytes is skipped by its size
+  and never paged in. A ``moov`` after the media data (phones write it when
+  recording stops) is found the same way.
+- Sample tables (``stts``, ``ctts``, ``stss``) are decoded with NumPy in one
+  pass each; keyframe times are presentation times with the track's edit
+  list applied.
+- Results are cached by a hash of the file size, ``ftyp`` and ``moov``,
+  which identify the content without reading the media data, so probing a
+  file again (or a copy of it) costs one walk and one hash.
+
+``check_header`` validates the first bytes of an upload so a wrong format
+is rejected before the rest of the file is sent (Matroska and AVI, also in
+``SUPPORTED_VIDEO_FORMATS``, are recognized by signature only). Live
+uploads may also be MPEG-TS; ``fragmented`` tells whether an MP4/MOV can be
+cut into HLS segments while it grows (``segmenter``).
+"""
+
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.exceptions import InvalidVideoFormatException, VideoTooLargeException
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Probe results kept in memory
+MEDIA_CACHE_SIZE = 256
+# Bytes of an upload's start handed to check_header
+HEADER_BYTES = 64 * 1024
+# Keyframe times kept per track; longer lists are thinned evenly (every
+# kept entry is still a sync sample)
+MAX_KEYFRAMES = 65536
+# Video samples per second of track duration beyond which the tables are corrupt
+MAX_FRAME_RATE = 1000
+
+# ftyp brands per container format; QuickTime files may lack ftyp entirely
+QUICKTIME_BRANDS = frozenset({b"qt  "})
+MP4_BRANDS = frozenset({
+    b"isom", b"iso2", b"iso4", b"iso5", b"iso6", b"mp41", b"mp42", b"avc1", b"M4V ", b"M4VH", b"M4VP",
+    b"3gp4", b"3gp5", b"3gp6", b"3g2a", b"dash", b"MSNV", b"XAVC",
+})
+# Top-level boxes a brandless QuickTime file may start with
+QUICKTIME_LEADING_BOXES = frozenset({b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot"})
+# Other accepted containers, recognized by signature only (no metadata)
+MATROSKA_MAGIC = b"\x1a\x45\xdf\xa3"
+# MPEG-TS packets, accepted for live uploads only
+TS_PACKET = 188
+TS_SYNC = 0x47
+
+CODECS = {
+    b"avc1": "h264", b"avc3": "h264", b"hvc1": "hevc", b"hev1": "hevc", b"av01": "av1", b"vp09": "vp9",
+    b"mp4v": "mpeg4", b"jpeg": "mjpeg", b"mp4a": "aac", b"ac-3": "ac3", b"ec-3": "eac3", b"Opus": "opus",
+    b"alac": "alac", b"lpcm": "pcm", b"sowt": "pcm", b"twos": "pcm",
+}
+TRACK_KINDS = {b"vide": "video", b"soun": "audio", b"text": "text", b"sbtl": "text", b"meta": "data", b"tmcd": "data"}
+H264_PROFILES = {66: "Baseline", 77: "Main", 88: "Extended", 100: "High", 110: "High 10", 122: "High 4:2:2", 244: "High 4:4:4"}
+HEVC_PROFILES = {1: "Main", 2: "Main 10", 3: "Main Still Picture", 4: "Rext"}
+
+# mvhd/tkhd times count seconds from 1904-01-01
+_EPOCH_1904 = datetime(1904, 1, 1, tzinfo=timezone.utc)
+
+
+def _invalid(reason: str) -> InvalidVideoFormatException:
+    return InvalidVideoFormatException(reason, settings.SUPPORTED_VIDEO_FORMATS)
+
+
+# What box parsing raises on truncated or corrupt metadata
+_PARSE_ERRORS = (struct.error, IndexError, KeyError, ValueError, OverflowError, ZeroDivisionError, TypeError)
+
+
+def _boxes(buf: Any, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """
+    Walk the boxes in ``buf[start:end]``, yielding ``(type, payload start, box end)``.
+
+    Only headers are read. The last box may end past ``end`` when the data
+    is truncated; callers decide whether they need its payload.
+    """
+    offset = start
+    while offset + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", buf, offset)
+        header = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack_from(">Q", buf, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            raise _invalid(f"corrupt {kind.decode('latin-1')!r} box")
+        yield kind, offset + header, offset + size
+        offset += size
+
+
+def _child(buf: Any, start: int, end: int, kind: bytes) -> Optional[Tuple[int, int]]:
+    for child, payload, box_end in _boxes(buf, start, end):
+        if child == kind:
+            return payload, box_end
+    return None
+
+
+def _path(buf: Any, start: int, end: int, *kinds: bytes) -> Optional[Tuple[int, int]]:
+    span: Optional[Tuple[int, int]] = (start, end)
+    for kind in kinds:
+        span = _child(buf, *span, kind)
+        if span is None:
+            return None
+    return span
+
+
+def _table(buf: Any, span: Optional[Tuple[int, int]], columns: int, dtype: str = ">u4") -> np.ndarray:
+    """Entries of a full box holding ``entry_count`` rows of ``columns`` 32-bit fields."""
+    if span is None:
+        return np.zeros((0, columns), dtype=np.int64)
+    start, end = span
+    count = struct.unpack_from(">I", buf, start + 4)[0]
+    count = min(count, (end - start - 8) // (4 * columns))
+    return np.frombuffer(buf, dtype=dtype, count=count * columns, offset=start + 8).astype(np.int64).reshape(-1, columns)
+
+
+def _media_bytes(buf: Any, size: int) -> int:
+    """Payload bytes of the top-level ``mdat`` boxes, which hold every sample."""
+    return sum(min(box_end, size) - payload for kind, payload, box_end in _boxes(buf, 0, size) if kind == b"mdat")
+
+
+def _sample_limit(buf: Any, stbl: Tuple[int, int], media_bytes: int) -> int:
+    """Most samples the ``stsz``/``stz2`` box and the media data can hold (bounds corrupt ``stts`` counts)."""
+    stsz = _child(buf, *stbl, b"stsz")
+    if stsz is not None:
+        sample_size, count = struct.unpack_from(">II", buf, stsz[0] + 4)
+        if sample_size:
+            return min(count, media_bytes // sample_size)
+        return min(count, (stsz[1] - stsz[0] - 12) // 4)
+    stz2 = _child(buf, *stbl, b"stz2")
+    if stz2 is not None:
+        field_size = buf[stz2[0] + 7]
+        count = struct.unpack_from(">I", buf, stz2[0] + 8)[0]
+        return min(count, (stz2[1] - stz2[0] - 12) * 8 // max(field_size, 1))
+    return 0
+
+
+def _format_of(brands: List[bytes]) -> Optional[str]:
+    if brands and brands[0] in QUICKTIME_BRANDS:
+        return "mov"
+    if any(brand in MP4_BRANDS for brand in brands):
+        return "mp4"
+    if any(brand in QUICKTIME_BRANDS for brand in brands):
+        return "mov"
+    return None
+
+
+class TrackInfo:
+    """One track of a container; ``keyframes`` are presentation times in seconds (video only)."""
+
+    __slots__ = (
+        "track_id", "kind", "codec", "fourcc", "profile", "duration", "sample_count", "width", "height",
+        "rotation", "frame_rate", "sample_rate", "channels", "keyframes", "reorder_delay",
+    )
+
+    def __init__(self, track_id: int, kind: str):
+        self.track_id = track_id
+        self.kind = kind
+        self.codec: Optional[str] = None
+        self.fourcc: Optional[str] = None
+        self.profile: Optional[str] = None
+        self.duration = 0.0
+        self.sample_count = 0
+        self.width: Optional[int] = None
+        self.height: Optional[int] = None
+        self.rotation = 0
+        self.frame_rate: Optional[float] = None
+        self.sample_rate: Optional[int] = None
+        self.channels: Optional[int] = None
+        self.keyframes: List[float] = []
+        # How far a keyframe's presentation trails its decoding (B-frames), seconds
+        self.reorder_delay = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "track_id": self.track_id,
+            "kind": self.kind,
+            "codec": self.codec,
+            "fourcc": self.fourcc,
+            "duration": round(self.duration, 3),
+            "samples": self.sample_count,
+        }
+        if self.kind == "video":
+            data.update({
+                "profile": self.profile,
+                "width": self.width,
+                "height": self.height,
+                "rotation": self.rotation,
+                "frame_rate": round(self.frame_rate, 3) if self.frame_rate else None,
+                "keyframes": len(self.keyframes),
+            })
+        elif self.kind == "audio":
+            data.update({"sample_rate": self.sample_rate, "channels": self.channels})
+        return data
+
+
+class MediaInfo:
+    """Container-level metadata of one file."""
+
+    __slots__ = ("format", "brand", "size", "duration", "creation_time", "tracks", "digest")
+
+    def __init__(
+        self,
+        format: str,
+        brand: Optional[str],
+        size: int,
+        duration: float,
+        creation_time: Optional[datetime],
+        tracks: List[TrackInfo],
+        digest: str
+    ):
+        self.format = format
+        self.brand = brand
+        self.size = size
+        self.duration = duration
+        self.creation_time = creation_time
+        self.tracks = tracks
+        self.digest = digest
+
+    @property
+    def video(self) -> Optional[TrackInfo]:
+        return next((track for track in self.tracks if track.kind == "video"), None)
+
+    @property
+    def audio(self) -> Optional[TrackInfo]:
+        return next((track for track in self.tracks if track.kind == "audio"), None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        video = self.video
+        return {
+            "format": self.format,
+            "brand": self.brand,
+            "size": self.size,
+            "duration": round(self.duration, 3),
+            "creation_time": self.creation_time.isoformat() if self.creation_time else None,
+            "width": video.width if video else None,
+            "height": video.height if video else None,
+            "frame_rate": round(video.frame_rate, 3) if video and video.frame_rate else None,
+            "video_codec": video.codec if video else None,
+            "audio_codec": self.audio.codec if self.audio else None,
+            "tracks": [track.to_dict() for track in self.tracks],
+            "digest": self.digest,
+        }
+
+
+class MediaProbe:
+    """Validates and parses MP4/MOV files, caching results by content hash."""
+
+    def __init__(
+        self,
+        max_size: int = settings.MAX_VIDEO_SIZE_MB * MB,
+        supported_formats: Optional[List[str]] = None,
+        cache_size: int = MEDIA_CACHE_SIZE
+    ):
+        self.max_size = max_size
+        self.supported_formats = supported_formats or settings.SUPPORTED_VIDEO_FORMATS
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, MediaInfo]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _check_size(self, size: int) -> None:
+        if size > self.max_size:
+            raise VideoTooLargeException(math.ceil(size / MB), self.max_size // MB)
+
+    def _check_format(self, format_type: Optional[str], description: str) -> str:
+        if format_type is None:
+            raise InvalidVideoFormatException(description, self.supported_formats)
+        if format_type not in self.supported_formats:
+            raise InvalidVideoFormatException(format_type, self.supported_formats)
+        return format_type
+
+    def _identify(self, buf: Any, end: int) -> Tuple[str, Optional[bytes], List[bytes]]:
+        """Container format, major brand and compatible brands from the first box."""
+        if end < 12:
+            raise _invalid("file too short")
+        if buf[0:4] == MATROSKA_MAGIC:
+            return self._check_format("mkv", ""), None, []
+        if buf[0:4] == b"RIFF" and buf[8:12] == b"AVI ":
+            return self._check_format("avi", ""), None, []
+        first = next(_boxes(buf, 0, end), None)
+        if first is None:
+            raise _invalid("file too short")
+        kind, payload, box_end = first
+        if kind == b"ftyp":
+            if min(box_end, end) < payload + 8:
+                raise _invalid("truncated 'ftyp' box")
+            stop = min(box_end, end)
+            brands = [bytes(buf[payload:payload + 4])] + [
+                bytes(buf[i:i + 4]) for i in range(payload + 8, stop - 3, 4)
+            ]
+            format_type = _format_of(brands)
+            return self._check_format(format_type, f"unknown brand {brands[0].decode('latin-1')!r}"), brands[0], brands
+        if kind in QUICKTIME_LEADING_BOXES:
+            return self._check_format("mov", ""), None, []
+        raise _invalid("not an MP4/MOV file")
+
+    def check_header(self, data: bytes, total_size: Optional[int] = None, live: bool = False) -> Optional[str]:
+        """
+        Validate the first bytes of a file (e.g. an upload's first chunk).
+
+        Args:
+            data: First bytes of the file
+            total_size: Size of the whole file, if known
+            live: A live upload, which may also be MPEG-TS
+
+        Returns:
+            The container format: ``"mp4"`` or ``"mov"``, or ``"mkv"``/``"avi"``
+            recognized by signature, or ``"ts"`` for a live upload; None when
+            ``data`` is too short to tell
+
+        Raises:
+            VideoTooLargeException: ``total_size`` exceeds the size limit
+            InvalidVideoFormatException: Not an MP4/MOV file, or a format
+                that is not in ``SUPPORTED_VIDEO_FORMATS``
+        """
+        if total_size is not None:
+            self._check_size(total_size)
+        if live and data[:1] == bytes([TS_SYNC]):
+            if len(data) <= TS_PACKET:
+                return None
+            if data[TS_PACKET] == TS_SYNC:
+                return "ts"
+        try:
+            first = next(_boxes(data, 0, len(data)), None) if len(data) >= 12 else None
+            if first is None or (first[0] == b"ftyp" and first[2] > len(data)):
+                return None
+            format_type, _, _ = self._identify(data, len(data))
+            if format_type in ("mp4", "mov"):
+                # The boxes that did arrive must chain up to the end of the data
+                for _ in _boxes(data, 0, len(data)):
+                    pass
+        except _PARSE_ERRORS as e:
+            raise _invalid(f"corrupt header ({type(e).__name__}: {e})") from e
+        return format_type
+
+    @staticmethod
+    def fragmented(data: bytes) -> Optional[bool]:
+        """
+        Whether the first bytes of an MP4/MOV declare movie fragments (``mvex``).
+
+        Returns:
+            None until the ``moov`` box has arrived; False when the media data
+            comes first
+        """
+        try:
+            for kind, payload, box_end in _boxes(data, 0, len(data)):
+                if kind in (b"mdat", b"moof"):
+                    return False
+                if kind == b"moov":
+                    return None if box_end > len(data) else _child(data, payload, box_end, b"mvex") is not None
+        except _PARSE_ERRORS as e:
+            raise _invalid(f"corrupt header ({type(e).__name__}: {e})") from e
+        return None
+
+    def probe(self, path: str, limit_size: bool = True) -> MediaInfo:
+        """
+        Parse a file's container metadata.
+
+        Args:
+            path: MP4/MOV file
+            limit_size: Enforce the upload size limit (off for recordings
+                read by compilation)
+
+        Raises:
+            VideoTooLargeException: The file exceeds the size limit
+            InvalidVideoFormatException: Not a supported MP4/MOV file, no
+                ``moov`` box, corrupt metadata, or no video track
+        """
+        size = os.path.getsize(path)
+        if limit_size:
+            self._check_size(size)
+        if size < 8:
+            raise _invalid("file too short")
+
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            try:
+                return self._probe(buf, size)
+            except _PARSE_ERRORS as e:
+                raise _invalid(f"corrupt container metadata ({type(e).__name__}: {e})") from e
+
+    def _probe(self, buf: Any, size: int) -> MediaInfo:
+        format_type, brand, brands = self._identify(buf, size)
+        if format_type not in ("mp4", "mov"):
+            raise _invalid(f"{format_type} files cannot be probed")
+        moov = None
+        for kind, payload, box_end in _boxes(buf, 0, size):
+            if kind == b"moov":
+                if box_end > size:
+                    raise _invalid("truncated 'moov' box")
+                moov = (payload, box_end)
+                break
+        if moov is None:
+            raise _invalid("no 'moov' box (incomplete recording?)")
+
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(size.to_bytes(8, "big"))
+        digest.update(b"".join(brands))
+        digest.update(buf[moov[0]:moov[1]])
+        key = digest.hexdigest()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return cached
+
+        info = self._parse_moov(buf, moov, format_type, brand, size, key)
+        if info.video is None:
+            raise _invalid("no video track")
+        with self._lock:
+            self._cache[key] = info
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return info
+
+    def _parse_moov(
+        self,
+        buf: Any,
+        moov: Tuple[int, int],
+        format_type: str,
+        brand: Optional[bytes],
+        size: int,
+        digest: str
+    ) -> MediaInfo:
+        mvhd = _child(buf, *moov, b"mvhd")
+        if mvhd is None:
+            raise _invalid("no 'mvhd' box")
+        version = buf[mvhd[0]]
+        if version == 1:
+            created, _, timescale, duration = struct.unpack_from(">QQIQ", buf, mvhd[0] + 4)
+        else:
+            created, _, timescale, duration = struct.unpack_from(">IIII", buf, mvhd[0] + 4)
+        movie_timescale = timescale or 1
+        creation_time = _EPOCH_1904 + timedelta(seconds=created) if created else None
+
+        tracks = []
+        media_bytes = _media_bytes(buf, size)
+        for kind, payload, box_end in _boxes(buf, *moov):
+            if kind == b"trak":
+                track = self._parse_trak(buf, payload, box_end, movie_timescale, media_bytes)
+                if track is not None:
+                    tracks.append(track)
+
+        movie_duration = duration / movie_timescale if duration not in (0, 0xFFFFFFFF) else 0.0
+        if not movie_duration and tracks:
+            movie_duration = max(track.duration for track in tracks)
+        return MediaInfo(
+            format_type,
+            brand.decode("latin-1").strip() if brand else None,
+            size,
+            movie_duration,
+            creation_time,
+            tracks,
+            digest,
+        )
+
+    def _parse_trak(
+        self,
+        buf: Any,
+        start: int,
+        end: int,
+        movie_timescale: int,
+        media_bytes: int
+    ) -> Optional[TrackInfo]:
+        tkhd = _child(buf, start, end, b"tkhd")
+        mdhd = _path(buf, start, end, b"mdia", b"mdhd")
+        hdlr = _path(buf, start, end, b"mdia", b"hdlr")
+        stbl = _path(buf, start, end, b"mdia", b"minf", b"stbl")
+        if tkhd is None or mdhd is None or hdlr is None or stbl is None:
+            return None
+
+        version = buf[tkhd[0]]
+        track_id = struct.unpack_from(">I", buf, tkhd[0] + (20 if version == 1 else 12))[0]
+        track = TrackInfo(track_id, TRACK_KINDS.get(bytes(buf[hdlr[0] + 8:hdlr[0] + 12]), "data"))
+
+        version = buf[mdhd[0]]
+        if version == 1:
+            timescale, duration = struct.unpack_from(">IQ", buf, mdhd[0] + 20)
+        else:
+            timescale, duration = struct.unpack_from(">II", buf, mdhd[0] + 12)
+        timescale = timescale or 1
+        track.duration = duration / timescale
+
+        self._parse_sample_entry(buf, _child(buf, *stbl, b"stsd"), track)
+        stts = _table(buf, _child(buf, *stbl, b"stts"), 2)
+        track.sample_count = int(stts[:, 0].sum())
+        if track.sample_count > _sample_limit(buf, stbl, media_bytes):
+            raise _invalid(f"track {track_id} sample tables disagree")
+        if track.kind != "video":
+            return track
+        if track.duration and track.sample_count > MAX_FRAME_RATE * track.duration:
+            raise _invalid(f"track {track_id} declares {track.sample_count} frames in {track.duration:.3f}s")
+
+        # tkhd matrix (after the time/volume fields) gives the display rotation,
+        # clockwise as in the legacy "rotate" tag (90 for portrait phone video)
+        matrix = tkhd[0] + (52 if buf[tkhd[0]] == 1 else 40)
+        a, b = struct.unpack_from(">ii", buf, matrix)
+        track.rotation = int(round(math.degrees(math.atan2(b, a)))) % 360
+        if track.duration:
+            track.frame_rate = track.sample_count / track.duration
+        track.keyframes, track.reorder_delay = self._keyframes(buf, stbl, stts, timescale, start, end, movie_timescale)
+        return track
+
+    @staticmethod
+    def _parse_sample_entry(buf: Any, stsd: Optional[Tuple[int, int]], track: TrackInfo) -> None:
+        if stsd is None:
+            return
+        entries = _boxes(buf, stsd[0] + 8, stsd[1])
+        entry = next(entries, None)
+        if entry is None:
+            return
+        fourcc, payload, entry_end = entry
+        track.fourcc = fourcc.decode("latin-1")
+        track.codec = CODECS.get(fourcc, track.fourcc.strip())
+
+        if track.kind == "video" and payload + 78 <= entry_end:
+            # SampleEntry (8) + pre_defined/reserved (16), then width and height;
+            # codec configuration boxes follow the 78-byte visual sample entry
+            track.width, track.height = struct.unpack_from(">HH", buf, payload + 24)
+            for child, child_payload, _ in _boxes(buf, payload + 78, entry_end):
+                if child == b"avcC":
+                    profile = buf[child_payload + 1]
+                    constrained = profile == 66 and buf[child_payload + 2] & 0x40
+                    track.profile = "Constrained Baseline" if constrained else H264_PROFILES.get(profile)
+                elif child == b"hvcC":
+                    track.profile = HEVC_PROFILES.get(buf[child_payload + 1] & 0x1F)
+        elif track.kind == "audio" and payload + 28 <= entry_end:
+            version = struct.unpack_from(">H", buf, payload + 8)[0]
+            if version == 2 and payload + 44 <= entry_end:
+                # QuickTime sound description v2: float64 rate, 32-bit channel count
+                rate, channels = struct.unpack_from(">dI", buf, payload + 32)
+                track.sample_rate, track.channels = int(rate), channels
+            else:
+                track.channels = struct.unpack_from(">H", buf, payload + 16)[0]
+                track.sample_rate = struct.unpack_from(">I", buf, payload + 24)[0] >> 16
+
+    @staticmethod
+    def _keyframes(
+        buf: Any,
+        stbl: Tuple[int, int],
+        stts: np.ndarray,
+        timescale: int,
+        trak_start: int,
+        trak_end: int,
+        movie_timescale: int
+    ) -> Tuple[List[float], float]:
+        """Presentation times (seconds) of the sync samples, edit list applied, and their reorder delay."""
+        if not len(stts):
+            return [], 0.0
+        # Decode times are looked up per sync sample in the stts runs, never
+        # expanded per sample (a sample count is only bounded by the file size)
+        counts, deltas = stts[:, 0], stts[:, 1]
+        run_ends = np.cumsum(counts)
+        run_starts = run_ends - counts
+        run_times = np.cumsum(counts * deltas) - counts * deltas
+        total = int(run_ends[-1])
+
+        stss_span = _child(buf, *stbl, b"stss")
+        if stss_span is None:
+            # No stss: every sample is a sync sample
+            sync = np.arange(0, total, max(1, -(-total // MAX_KEYFRAMES)), dtype=np.int64)
+        else:
+            sync = _table(buf, stss_span, 1)[:, 0] - 1
+            sync = sync[(sync >= 0) & (sync < total)]
+            if len(sync) > MAX_KEYFRAMES:
+                sync = sync[::-(-len(sync) // MAX_KEYFRAMES)]
+        run = np.searchsorted(run_ends, sync, side="right")
+        times = run_times[run] + (sync - run_starts[run]) * deltas[run]
+
+        delay = 0
+        ctts_span = _child(buf, *stbl, b"ctts")
+        ctts = _table(buf, ctts_span, 2, ">i4" if ctts_span and buf[ctts_span[0]] == 1 else ">u4")
+        if len(ctts) and len(sync):
+            # Version 1 offsets are signed; samples past the last run have none
+            run = np.searchsorted(np.cumsum(ctts[:, 0]), sync, side="right")
+            offsets = np.where(run < len(ctts), ctts[np.minimum(run, len(ctts) - 1), 1], 0)
+            times = times + offsets
+            delay = max(0, int(offsets.max()))
+
+        # First edit: empty edits delay the track, media_time is where it starts
+        shift = 0.0
+        elst = _path(buf, trak_start, trak_end, b"edts", b"elst")
+        if elst is not None:
+            version = buf[elst[0]]
+            count = struct.unpack_from(">I", buf, elst[0] + 4)[0]
+            entry_format, entry_size = (">qq", 20) if version == 1 else (">ii", 12)
+            for index in range(count):
+                offset = elst[0] + 8 + index * entry_size
+                if offset + entry_size > elst[1]:
+                    break
+                segment_duration, media_time = struct.unpack_from(entry_format, buf, offset)
+                if media_time == -1:
+                    shift += segment_duration / movie_timescale
+                    continue
+                shift -= media_time / timescale
+                break
+
+        return [round(float(t), 6) for t in np.sort(times) / timescale + shift], delay / timescale
+
+
+# Shared probe with the configured upload limits
+media_probe = MediaProbe()
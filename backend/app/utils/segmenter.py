@@ -0,0 +1,309 @@
+"""
+Keyframe-aligned HLS segments cut from a growing live upload.
+
+MPEG-TS and fragmented MP4 uploads (``media_probe.check_header`` with
+``live``, ``media_probe.fragmented``) are cut as they grow. Segments are
+byte ranges of the upload that start at a keyframe and end at the next one,
+so each is a valid segment as it is, without remuxing:
+
+- MPEG-TS is cut at packet boundaries, before the PAT/PMT packets that precede
+  a video packet flagged ``random_access_indicator`` (a keyframe). A segment
+  that starts without a PAT gets a copy of the stream's first PAT and PMT,
+  so every segment can be demuxed on its own. Durations are the differences
+  between the keyframes' PTS.
+- Fragmented MP4 is cut between whole ``moof``/``mdat`` pairs, before a
+  fragment whose first video sample is a sync sample. The ``ftyp``/``moov``
+  in front of the first fragment is the init segment (``EXT-X-MAP``).
+  Durations are the ``trun`` sample durations.
+
+Keyframe runs are joined until a segment reaches the target duration, the
+way ffmpeg's HLS muxer cuts at the first keyframe after ``hls_time``. A TS
+run is only known to be whole once the next keyframe has arrived, or the
+upload is complete; a shorter last segment waits for the same.
+"""
+
+import struct
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.exceptions import InvalidVideoFormatException
+from app.utils.media_probe import HEADER_BYTES, TS_PACKET, TS_SYNC, _boxes, _child, _path
+
+# PTS are 33-bit counts of a 90 kHz clock
+PTS_CLOCK = 90000
+PTS_WRAP = 1 << 33
+# PMT stream types of video (MPEG-1/2, MPEG-4 Part 2, H.264, HEVC)
+VIDEO_STREAM_TYPES = frozenset({0x01, 0x02, 0x10, 0x1B, 0x24})
+# sample_is_non_sync_sample in ISO BMFF sample flags
+SAMPLE_NON_SYNC = 0x00010000
+
+
+class Span:
+    """Bytes ``[offset, end)`` of an upload that form one segment, after ``prefix``."""
+
+    __slots__ = ("offset", "end", "duration", "prefix")
+
+    def __init__(self, offset: int, end: int, duration: float, prefix: bytes = b""):
+        self.offset = offset
+        self.end = end
+        self.duration = duration
+        self.prefix = prefix
+
+
+def init_segment(path: str, end: int) -> Optional[bytes]:
+    """
+    The boxes of a fragmented MP4 before its first ``moof``.
+
+    Returns:
+        The init segment, or None until the first fragment has started
+        arriving within ``end`` bytes
+    """
+    with open(path, "rb") as f:
+        data = f.read(min(end, HEADER_BYTES))
+    offset = 0
+    for kind, _, box_end in _boxes(data, 0, len(data)):
+        if kind == b"moof":
+            return data[:offset]
+        if box_end > len(data):
+            break
+        offset = box_end
+    return None
+
+
+def cut(
+    path: str,
+    start: int,
+    end: int,
+    target_duration: float,
+    complete: bool,
+    init: Optional[bytes] = None
+) -> List[Span]:
+    """
+    Whole segments in ``path[start:end]``.
+
+    Args:
+        path: Upload file
+        start: Where the last segment ended (after the init segment for MP4)
+        end: End of the bytes received so far
+        target_duration: Seconds a segment reaches before it is cut
+        complete: ``end`` is the end of the upload, so the last run is whole
+        init: Init segment of a fragmented MP4; None for MPEG-TS
+
+    Returns:
+        The segments that are known to be whole, in order
+
+    Raises:
+        InvalidVideoFormatException: Corrupt packets or boxes
+    """
+    if end <= start:
+        return []
+    with open(path, "rb") as f:
+        if init is None:
+            tables = f.read(HEADER_BYTES)
+        f.seek(start)
+        data = f.read(end - start)
+    if init is None:
+        runs = _ts_runs(data, start, tables, complete)
+    else:
+        runs = _fragment_runs(data, start, _track_defaults(init))
+    return _group(runs, target_duration, complete)
+
+
+def _group(runs: List[Span], target_duration: float, complete: bool) -> List[Span]:
+    spans: List[Span] = []
+    current: Optional[Span] = None
+    for run in runs:
+        if current is not None and current.duration >= target_duration:
+            spans.append(current)
+            current = None
+        if current is None:
+            current = run
+        else:
+            current.end = run.end
+            current.duration += run.duration
+    if current is not None and (complete or current.duration >= target_duration):
+        spans.append(current)
+    return spans
+
+
+# MPEG-TS
+
+def _invalid(reason: str) -> InvalidVideoFormatException:
+    return InvalidVideoFormatException(reason, settings.SUPPORTED_VIDEO_FORMATS)
+
+
+def _payload(packet: bytes) -> int:
+    """Offset of a packet's payload, after its adaptation field."""
+    return 4 + (1 + packet[4] if packet[3] & 0x20 else 0)
+
+
+def _ts_tables(data: bytes) -> Tuple[Optional[int], Optional[int], bytes]:
+    """Video PID, PMT PID and the PAT and PMT packets from the start of a transport stream."""
+    pmt_pid = None
+    pat = b""
+    for offset in range(0, len(data) - TS_PACKET + 1, TS_PACKET):
+        packet = data[offset:offset + TS_PACKET]
+        pid = (packet[1] & 0x1F) << 8 | packet[2]
+        if not packet[1] & 0x40 or (pid != 0 and pid != pmt_pid):
+            continue
+        section = _payload(packet)
+        section += 1 + packet[section]  # pointer_field
+        # Section body up to its CRC; tables longer than one packet are not expected here
+        stop = min(section + 3 + ((packet[section + 1] & 0x0F) << 8 | packet[section + 2]) - 4, TS_PACKET)
+        if pid == 0:
+            for i in range(section + 8, stop - 3, 4):
+                if packet[i] << 8 | packet[i + 1]:  # program 0 is the network PID
+                    pmt_pid = (packet[i + 2] & 0x1F) << 8 | packet[i + 3]
+                    pat = packet
+                    break
+            continue
+        i = section + 12 + ((packet[section + 10] & 0x0F) << 8 | packet[section + 11])
+        while i + 5 <= stop:
+            if packet[i] in VIDEO_STREAM_TYPES:
+                return (packet[i + 1] & 0x1F) << 8 | packet[i + 2], pmt_pid, pat + packet
+            i += 5 + ((packet[i + 3] & 0x0F) << 8 | packet[i + 4])
+        break
+    return None, pmt_pid, b""
+
+
+def _pts(packet: bytes) -> Optional[int]:
+    """PTS of the PES packet starting in a TS packet."""
+    pes = _payload(packet)
+    if pes + 14 > TS_PACKET or packet[pes:pes + 3] != b"\0\0\1" or not packet[pes + 7] & 0x80:
+        return None
+    p = packet[pes + 9:pes + 14]
+    return (p[0] >> 1 & 7) << 30 | p[1] << 22 | (p[2] >> 1) << 15 | p[3] << 7 | p[4] >> 1
+
+
+def _ts_runs(data: bytes, start: int, header: bytes, complete: bool) -> List[Span]:
+    video_pid, pmt_pid, tables = _ts_tables(header)
+    count = len(data) // TS_PACKET
+    if video_pid is None or not count:
+        return []
+    packets = np.frombuffer(data, dtype=np.uint8, count=count * TS_PACKET).reshape(count, TS_PACKET)
+    if (packets[:, 0] != TS_SYNC).any():
+        raise _invalid("MPEG-TS packets out of sync")
+
+    pids = (packets[:, 1].astype(np.int32) & 0x1F) << 8 | packets[:, 2]
+    starts = np.flatnonzero((pids == video_pid) & ((packets[:, 1] & 0x40) != 0))
+    flagged = ((packets[starts, 3] & 0x20) != 0) & (packets[starts, 4] > 0) & ((packets[starts, 5] & 0x40) != 0)
+    tables_mask = (pids == 0) | (pids == pmt_pid)
+    boundaries = {0}
+    for index in starts[flagged]:
+        # Cut before the PAT/PMT written just ahead of the keyframe
+        while index > 0 and tables_mask[index - 1]:
+            index -= 1
+        boundaries.add(int(index))
+    boundaries = sorted(boundaries)
+    pts = [_pts(data[i * TS_PACKET:(i + 1) * TS_PACKET]) for i in starts]
+
+    runs = []
+    for first, last in zip(boundaries, boundaries[1:] + [count]):
+        if last == count and not complete:
+            break
+        position = int(np.searchsorted(starts, first))
+        begin = pts[position] if position < len(pts) else None
+        if begin is None:
+            duration = 0.0
+        elif last < count:
+            end = pts[int(np.searchsorted(starts, last))]
+            duration = (end - begin) % PTS_WRAP / PTS_CLOCK if end is not None else 0.0
+        else:
+            # Last run of the upload: the PTS span of its frames plus one frame
+            later = [(p - begin) % PTS_WRAP for p in pts[position:] if p is not None]
+            span = max(later)
+            duration = (span + span / (len(later) - 1) if len(later) > 1 else 0) / PTS_CLOCK
+        # The run at the stream's start has its own PAT ahead of the video
+        video = starts[position] if position < len(starts) else last
+        prefix = b"" if (pids[first:video] == 0).any() else tables
+        runs.append(Span(start + first * TS_PACKET, start + last * TS_PACKET, duration, prefix))
+    return runs
+
+
+# Fragmented MP4
+
+def _track_defaults(init: bytes) -> Tuple[int, int, int, int]:
+    """Track ID, timescale and ``trex`` default sample duration and flags of the video track."""
+    moov = next(((payload, end) for kind, payload, end in _boxes(init, 0, len(init)) if kind == b"moov"), None)
+    if moov is None:
+        raise _invalid("no 'moov' box in the init segment")
+    track_id, timescale = 0, 1
+    for kind, payload, box_end in _boxes(init, *moov):
+        if kind != b"trak":
+            continue
+        tkhd = _child(init, payload, box_end, b"tkhd")
+        mdhd = _path(init, payload, box_end, b"mdia", b"mdhd")
+        hdlr = _path(init, payload, box_end, b"mdia", b"hdlr")
+        if tkhd is None or mdhd is None:
+            continue
+        track_id = struct.unpack_from(">I", init, tkhd[0] + (20 if init[tkhd[0]] == 1 else 12))[0]
+        timescale = struct.unpack_from(">I", init, mdhd[0] + (20 if init[mdhd[0]] == 1 else 12))[0] or 1
+        if hdlr is not None and init[hdlr[0] + 8:hdlr[0] + 12] == b"vide":
+            break
+
+    duration = flags = 0
+    for kind, payload, _ in _boxes(init, *(_child(init, *moov, b"mvex") or (0, 0))):
+        if kind == b"trex" and struct.unpack_from(">I", init, payload + 4)[0] == track_id:
+            duration, _, flags = struct.unpack_from(">III", init, payload + 12)
+    return track_id, timescale, duration, flags
+
+
+def _fragment(data: bytes, moof: Tuple[int, int], defaults: Tuple[int, int, int, int]) -> Tuple[float, bool]:
+    """Duration of a fragment's video samples and whether the first one is a sync sample."""
+    track_id, timescale, default_duration, default_flags = defaults
+    for kind, payload, box_end in _boxes(data, *moof):
+        tfhd = _child(data, payload, box_end, b"tfhd") if kind == b"traf" else None
+        if tfhd is None or struct.unpack_from(">I", data, tfhd[0] + 4)[0] != track_id:
+            continue
+        tf_flags = struct.unpack_from(">I", data, tfhd[0])[0] & 0xFFFFFF
+        field = tfhd[0] + 8 + (8 if tf_flags & 0x01 else 0) + (4 if tf_flags & 0x02 else 0)
+        if tf_flags & 0x08:
+            default_duration = struct.unpack_from(">I", data, field)[0]
+            field += 4
+        if tf_flags & 0x10:
+            field += 4
+        if tf_flags & 0x20:
+            default_flags = struct.unpack_from(">I", data, field)[0]
+
+        total = 0
+        first_flags = None
+        for child, trun, trun_end in _boxes(data, payload, box_end):
+            if child != b"trun":
+                continue
+            flags, samples = struct.unpack_from(">II", data, trun)
+            field = trun + 8 + (4 if flags & 0x01 else 0)
+            if flags & 0x04:
+                first_flags = struct.unpack_from(">I", data, field)[0] if first_flags is None else first_flags
+                field += 4
+            columns = bin(flags & 0xF00).count("1")
+            samples = min(samples, (trun_end - field) // (4 * columns)) if columns else samples
+            table = np.frombuffer(data, dtype=">u4", count=samples * columns, offset=field).reshape(samples, columns)
+            total += int(table[:, 0].sum()) if flags & 0x100 else samples * default_duration
+            if first_flags is None and samples:
+                first_flags = int(table[0, bin(flags & 0x300).count("1")]) if flags & 0x400 else default_flags
+        sync = first_flags is None or not first_flags & SAMPLE_NON_SYNC
+        return total / timescale, sync
+    return 0.0, True
+
+
+def _fragment_runs(data: bytes, start: int, defaults: Tuple[int, int, int, int]) -> List[Span]:
+    runs: List[Span] = []
+    offset = 0
+    moof = None
+    for kind, payload, box_end in _boxes(data, 0, len(data)):
+        if box_end > len(data):
+            break
+        if kind == b"moof":
+            moof = _fragment(data, (payload, box_end), defaults)
+        elif kind == b"mdat" and moof is not None:
+            duration, sync = moof
+            if runs and not sync:
+                runs[-1].end = start + box_end
+                runs[-1].duration += duration
+            else:
+                runs.append(Span(start + offset, start + box_end, duration))
+            offset = box_end
+            moof = None
+    return runs
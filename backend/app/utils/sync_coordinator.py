@@ -0,0 +1,363 @@
+"""
+Multi-camera synchronization from arena audio.
+
+Every phone hears the same horn, whistles and crowd, so the recordings are
+aligned by cross-correlating their audio. Raw audio is never held in
+memory: each camera's track is decoded in windows and reduced on the fly to
+a 1 kHz onset envelope (rises in log energy per millisecond), about 14 MB
+per camera-hour.
+
+Alignment runs coarse to fine. The envelopes are halved repeatedly into a
+pyramid; the coarsest level (~32 ms per sample) is cross-correlated over the
+full lag range with one FFT, and every finer level only re-evaluates a few
+lags around the previous estimate. The final peak is interpolated to
+sub-millisecond precision.
+
+Offsets are relative to a reference camera (the longest track): adding a
+camera's offset to its own timestamps gives reference time. Sound travels
+about 2.9 ms per meter, so cameras at opposite ends of the rink can differ
+by tens of milliseconds from their video alignment.
+"""
+
+import logging
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.exceptions import VideoProcessingException
+
+logger = logging.getLogger(__name__)
+
+# Envelope samples per second (1 ms resolution)
+ENVELOPE_RATE = 1000
+# Halvings from the envelope rate to the level searched exhaustively
+PYRAMID_LEVELS = 5
+# Lags re-evaluated on each side of the estimate at every finer level
+REFINE_MARGIN = 3
+# Seconds around the peak ignored when looking for the runner-up peak
+PEAK_EXCLUSION_SECONDS = 1.0
+# Peak-to-runner-up ratio below which an alignment is not trusted
+MIN_PEAK_RATIO = 1.5
+# Seconds of audio per decoded window
+DECODE_WINDOW_SECONDS = 10
+
+_ENERGY_FLOOR = 1e-10
+
+
+class EnvelopeBuilder:
+    """Reduces streamed PCM windows to an onset envelope."""
+
+    __slots__ = ("sample_rate", "block", "carry", "last_level", "pieces", "samples")
+
+    def __init__(self, sample_rate: int = settings.AUDIO_SYNC_SAMPLE_RATE):
+        if sample_rate % ENVELOPE_RATE:
+            raise ValueError(f"sample rate must be a multiple of {ENVELOPE_RATE} Hz")
+        self.sample_rate = sample_rate
+        self.block = sample_rate // ENVELOPE_RATE
+        self.carry = np.zeros(0, dtype=np.float32)
+        self.last_level: Optional[float] = None
+        self.pieces: List[np.ndarray] = []
+        self.samples = 0
+
+    def feed(self, window: np.ndarray) -> None:
+        """Add the next mono window (any length, float samples)."""
+        window = np.asarray(window, dtype=np.float32)
+        self.samples += len(window)
+        if len(self.carry):
+            window = np.concatenate((self.carry, window))
+        usable = len(window) - len(window) % self.block
+        self.carry = window[usable:].copy()
+        if not usable:
+            return
+
+        blocks = window[:usable].reshape(-1, self.block)
+        level = np.log10(np.einsum("ij,ij->i", blocks, blocks) / self.block + _ENERGY_FLOOR)
+        previous = level[0] if self.last_level is None else self.last_level
+        onset = np.diff(level, prepend=previous)
+        np.maximum(onset, 0, out=onset)
+        self.last_level = float(level[-1])
+        self.pieces.append(onset.astype(np.float32))
+
+    def finish(self) -> np.ndarray:
+        """Zero-mean, unit-variance envelope of everything fed."""
+        envelope = np.concatenate(self.pieces) if self.pieces else np.zeros(0, dtype=np.float32)
+        if len(envelope):
+            envelope = envelope - envelope.mean()
+            std = envelope.std()
+            if std > 0:
+                envelope /= std
+        return envelope
+
+
+def build_envelope(windows: Iterable[np.ndarray], sample_rate: int = settings.AUDIO_SYNC_SAMPLE_RATE) -> np.ndarray:
+    builder = EnvelopeBuilder(sample_rate)
+    for window in windows:
+        builder.feed(window)
+    return builder.finish()
+
+
+def decode_audio(
+    path: str,
+    sample_rate: int = settings.AUDIO_SYNC_SAMPLE_RATE,
+    window_seconds: int = DECODE_WINDOW_SECONDS,
+    ffmpeg: Optional[str] = None
+) -> Iterator[np.ndarray]:
+    """
+    Decode a recording's audio as mono float32 windows with ffmpeg.
+
+    Raises:
+        VideoProcessingException: ffmpeg is missing or fails
+    """
+    ffmpeg = ffmpeg or settings.FFMPEG_BINARY or shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise VideoProcessingException(path, "ffmpeg is required to decode audio")
+
+    process = subprocess.Popen(
+        [ffmpeg, "-nostdin", "-v", "error", "-i", path, "-vn", "-ac", "1",
+         "-ar", str(sample_rate), "-f", "f32le", "-"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    window_bytes = sample_rate * window_seconds * 4
+    try:
+        while True:
+            data = process.stdout.read(window_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) - len(data) % 4], dtype=np.float32)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        if process.wait() != 0:
+            raise VideoProcessingException(path, f"audio decode failed: {stderr.decode(errors='replace').strip()}")
+
+
+def _halve(envelope: np.ndarray) -> np.ndarray:
+    usable = len(envelope) - len(envelope) % 2
+    return envelope[:usable].reshape(-1, 2).mean(axis=1)
+
+
+def _pyramid(envelope: np.ndarray, levels: int) -> List[np.ndarray]:
+    pyramid = [envelope]
+    for _ in range(levels):
+        pyramid.append(_halve(pyramid[-1]))
+    return pyramid
+
+
+def _overlap(reference: np.ndarray, camera: np.ndarray, lag: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Overlapping parts when camera sample 0 sits at reference sample ``lag``."""
+    if lag >= 0:
+        length = max(0, min(len(reference) - lag, len(camera)))
+        return reference[lag:lag + length], camera[:length]
+    length = max(0, min(len(reference), len(camera) + lag))
+    return reference[:length], camera[-lag:-lag + length]
+
+
+def _dot_at(reference: np.ndarray, camera: np.ndarray, lag: int) -> float:
+    a, b = _overlap(reference, camera, lag)
+    return float(np.dot(a, b)) if len(a) else -np.inf
+
+
+def _coarse_search(reference: np.ndarray, camera: np.ndarray, max_lag: int, exclusion: int) -> Tuple[int, float]:
+    """
+    Best lag by FFT cross-correlation over ``[-max_lag, max_lag]``.
+
+    Returns:
+        ``(lag, peak_ratio)``: peak over the best peak outside ``exclusion``
+    """
+    size = len(reference) + len(camera) - 1
+    n = 1 << (size - 1).bit_length()
+    spectrum = np.fft.rfft(reference, n) * np.conj(np.fft.rfft(camera, n))
+    correlation = np.fft.irfft(spectrum, n)
+    # Lags -len(camera)+1 .. len(reference)-1; negative lags wrap to the end
+    positive = correlation[:min(len(reference), max_lag + 1)]
+    negative = correlation[n - min(len(camera) - 1, max_lag):] if max_lag and len(camera) > 1 else correlation[:0]
+    lags = np.concatenate((np.arange(-len(negative), 0), np.arange(len(positive))))
+    values = np.concatenate((negative, positive))
+
+    best = int(np.argmax(values))
+    peak = values[best]
+    outside = np.abs(lags - lags[best]) > exclusion
+    runner_up = values[outside].max() if outside.any() else 0.0
+    ratio = float(peak / runner_up) if runner_up > 0 else float("inf")
+    return int(lags[best]), ratio
+
+
+def _refine(pyramid_ref: List[np.ndarray], pyramid_cam: List[np.ndarray], lag: int) -> Tuple[float, float]:
+    """
+    Follow a coarse lag down to the envelope rate.
+
+    Returns:
+        ``(lag, correlation)`` with a fractional lag in envelope samples and
+        the normalized correlation at the peak
+    """
+    for level in range(len(pyramid_ref) - 2, -1, -1):
+        reference, camera = pyramid_ref[level], pyramid_cam[level]
+        candidates = range(2 * lag - REFINE_MARGIN, 2 * lag + REFINE_MARGIN + 1)
+        lag = max(candidates, key=lambda k: _dot_at(reference, camera, k))
+
+    reference, camera = pyramid_ref[0], pyramid_cam[0]
+    left, peak, right = (_dot_at(reference, camera, k) for k in (lag - 1, lag, lag + 1))
+    fraction = 0.0
+    curvature = left - 2 * peak + right
+    if np.isfinite(left) and np.isfinite(right) and curvature < 0:
+        fraction = 0.5 * (left - right) / curvature
+
+    a, b = _overlap(reference, camera, lag)
+    norm = float(np.linalg.norm(a) * np.linalg.norm(b))
+    correlation = peak / norm if norm > 0 else 0.0
+    return lag + fraction, max(0.0, min(1.0, correlation))
+
+
+class SyncResult:
+    """
+    Offset of one camera relative to the reference camera.
+
+    ``peak_ratio`` compares the correlation peak with the best peak more than
+    ``PEAK_EXCLUSION_SECONDS`` away; ``correlation`` is the normalized
+    envelope correlation at the offset (low for noisy envelopes even when
+    the peak is unambiguous).
+    """
+
+    __slots__ = ("camera_id", "reference", "offset", "correlation", "peak_ratio", "via")
+
+    def __init__(
+        self,
+        camera_id: str,
+        reference: str,
+        offset: float,
+        correlation: float,
+        peak_ratio: float,
+        via: Optional[str] = None
+    ):
+        self.camera_id = camera_id
+        self.reference = reference
+        self.offset = offset
+        self.correlation = correlation
+        self.peak_ratio = peak_ratio
+        self.via = via
+
+    @property
+    def confidence(self) -> float:
+        """0 for an ambiguous peak, approaching 1 as it dominates the runner-up."""
+        if self.peak_ratio <= 1:
+            return 0.0
+        return 1.0 - 1.0 / self.peak_ratio
+
+    @property
+    def reliable(self) -> bool:
+        return self.peak_ratio >= MIN_PEAK_RATIO
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "camera_id": self.camera_id,
+            "reference": self.reference,
+            "offset_ms": round(self.offset * 1000, 3),
+            "confidence": round(self.confidence, 4),
+            "correlation": round(self.correlation, 4),
+            "peak_ratio": round(self.peak_ratio, 3) if np.isfinite(self.peak_ratio) else None,
+            "reliable": self.reliable,
+            "via": self.via,
+        }
+
+
+class SyncCoordinator:
+    """Aligns the cameras of a game by their audio."""
+
+    def __init__(
+        self,
+        sample_rate: int = settings.AUDIO_SYNC_SAMPLE_RATE,
+        max_offset: float = settings.AUDIO_SYNC_MAX_OFFSET_SECONDS,
+        levels: int = PYRAMID_LEVELS
+    ):
+        self.sample_rate = sample_rate
+        self.max_offset = max_offset
+        self.levels = levels
+
+    def pair(self, reference: np.ndarray, camera: np.ndarray) -> Tuple[float, float, float]:
+        """
+        Align two envelopes.
+
+        Returns:
+            ``(offset_seconds, correlation, peak_ratio)``
+        """
+        pyramid_ref = _pyramid(reference, self.levels)
+        pyramid_cam = _pyramid(camera, self.levels)
+        scale = 1 << self.levels
+        coarse_ref, coarse_cam = pyramid_ref[-1], pyramid_cam[-1]
+        if not len(coarse_ref) or not len(coarse_cam):
+            return 0.0, 0.0, 0.0
+
+        max_lag = int(self.max_offset * ENVELOPE_RATE / scale)
+        exclusion = max(1, int(PEAK_EXCLUSION_SECONDS * ENVELOPE_RATE / scale))
+        lag, peak_ratio = _coarse_search(coarse_ref, coarse_cam, max_lag, exclusion)
+        fine_lag, correlation = _refine(pyramid_ref, pyramid_cam, lag)
+        return fine_lag / ENVELOPE_RATE, correlation, peak_ratio
+
+    def align(self, envelopes: Dict[str, np.ndarray], reference: Optional[str] = None) -> Dict[str, SyncResult]:
+        """
+        Offsets of every camera relative to ``reference`` (default: longest envelope).
+
+        Cameras that do not align reliably with the reference are retried
+        through another reliably aligned camera and chained.
+        """
+        if not envelopes:
+            return {}
+        reference = reference or max(envelopes, key=lambda camera_id: len(envelopes[camera_id]))
+        results = {reference: SyncResult(reference, reference, 0.0, 1.0, float("inf"))}
+        for camera_id, envelope in envelopes.items():
+            if camera_id != reference:
+                offset, correlation, ratio = self.pair(envelopes[reference], envelope)
+                results[camera_id] = SyncResult(camera_id, reference, offset, correlation, ratio)
+
+        for camera_id, result in list(results.items()):
+            if result.reliable:
+                continue
+            for anchor_id, anchor in list(results.items()):
+                if anchor_id in (camera_id, reference) or not anchor.reliable:
+                    continue
+                offset, correlation, ratio = self.pair(envelopes[anchor_id], envelopes[camera_id])
+                ratio = min(ratio, anchor.peak_ratio)
+                if ratio > results[camera_id].peak_ratio:
+                    results[camera_id] = SyncResult(
+                        camera_id, reference, anchor.offset + offset,
+                        min(correlation, anchor.correlation), ratio, via=anchor_id
+                    )
+
+        for result in results.values():
+            if not result.reliable:
+                logger.warning(f"Audio sync of camera {result.camera_id} is unreliable (peak ratio {result.peak_ratio:.2f})")
+        return results
+
+    def align_streams(
+        self,
+        sources: Dict[str, Iterable[np.ndarray]],
+        reference: Optional[str] = None
+    ) -> Dict[str, SyncResult]:
+        """Align cameras given as iterables of PCM windows at ``sample_rate``."""
+        envelopes = {camera_id: build_envelope(windows, self.sample_rate) for camera_id, windows in sources.items()}
+        return self.align(envelopes, reference)
+
+    def align_files(self, paths: Dict[str, str], reference: Optional[str] = None) -> Dict[str, SyncResult]:
+        """
+        Decode and align recordings, one decoder per camera in parallel.
+
+        Raises:
+            VideoProcessingException: A recording's audio cannot be decoded
+        """
+        def envelope_of(path: str) -> np.ndarray:
+            return build_envelope(decode_audio(path, self.sample_rate), self.sample_rate)
+
+        with ThreadPoolExecutor(max_workers=max(1, len(paths))) as pool:
+            futures = {camera_id: pool.submit(envelope_of, path) for camera_id, path in paths.items()}
+            envelopes = {camera_id: future.result() for camera_id, future in futures.items()}
+        return self.align(envelopes, reference)
+
+
+# Shared coordinator with the configured sample rate and search range
+sync_coordinator = SyncCoordinator()
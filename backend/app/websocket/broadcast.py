@@ -0,0 +1,370 @@
+"""
+Cross-worker broadcast bus for game events.
+
+Each uvicorn/gunicorn worker holds its own ``ConnectionManager``. Events
+published in one worker are delivered to local sockets immediately and
+batched per tick onto a per-game channel so every other worker can deliver
+them to the sockets it holds. Batches carry per-origin sequence numbers so
+a worker never delivers the same event twice.
+
+Backends:
+    memory - in-process broker for single-worker deployments and tests
+    redis  - Redis pub/sub using ``REDIS_URL``
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.websocket.connection_manager import ConnectionManager, connection_manager
+from app.websocket.game_state import GameStateStore, game_state
+
+logger = logging.getLogger(__name__)
+
+MessageCallback = Callable[[str, bytes], Awaitable[None]]
+EventHandler = Callable[[str, Dict[str, Any]], None]
+
+CHANNEL_PREFIX = "game:"
+CHANNEL_SUFFIX = ":events"
+
+
+def game_channel(game_id: str) -> str:
+    """Pub/sub channel name for a game."""
+    return f"{CHANNEL_PREFIX}{game_id}{CHANNEL_SUFFIX}"
+
+
+def channel_game_id(channel: str) -> str:
+    """Inverse of ``game_channel``."""
+    return channel[len(CHANNEL_PREFIX):-len(CHANNEL_SUFFIX)]
+
+
+class BroadcastBackend(ABC):
+    """Transport interface used by ``BroadcastBus``."""
+
+    @abstractmethod
+    async def connect(self, on_message: MessageCallback) -> None:
+        """Open the transport; ``on_message(channel, data)`` is called for every message."""
+
+    @abstractmethod
+    async def disconnect(self) -> None:
+        """Close the transport and drop every subscription."""
+
+    @abstractmethod
+    async def subscribe(self, channel: str) -> None:
+        """Start receiving messages published on ``channel``."""
+
+    @abstractmethod
+    async def unsubscribe(self, channel: str) -> None:
+        """Stop receiving messages published on ``channel``."""
+
+    @abstractmethod
+    async def publish(self, channel: str, data: bytes) -> None:
+        """Send ``data`` to every subscriber of ``channel``."""
+
+
+class InMemoryBroker:
+    """Shared channel registry standing in for a pub/sub server inside one process."""
+
+    def __init__(self):
+        self.channels: Dict[str, Set["InMemoryBroadcastBackend"]] = {}
+
+    async def publish(self, channel: str, data: bytes) -> int:
+        subscribers = list(self.channels.get(channel, ()))
+        for backend in subscribers:
+            await backend._deliver(channel, data)
+        return len(subscribers)
+
+
+class InMemoryBroadcastBackend(BroadcastBackend):
+    """
+    In-process backend.
+
+    With the default private broker, a single worker has no peers and
+    publishes go nowhere. Passing a shared ``InMemoryBroker`` lets several
+    buses in one process behave like separate workers.
+    """
+
+    def __init__(self, broker: Optional[InMemoryBroker] = None):
+        self.broker = broker or InMemoryBroker()
+        self._on_message: Optional[MessageCallback] = None
+
+    async def connect(self, on_message: MessageCallback) -> None:
+        self._on_message = on_message
+
+    async def disconnect(self) -> None:
+        for subscribers in self.broker.channels.values():
+            subscribers.discard(self)
+        self._on_message = None
+
+    async def subscribe(self, channel: str) -> None:
+        self.broker.channels.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, channel: str) -> None:
+        subscribers = self.broker.channels.get(channel)
+        if subscribers is not None:
+            subscribers.discard(self)
+            if not subscribers:
+                del self.broker.channels[channel]
+
+    async def publish(self, channel: str, data: bytes) -> None:
+        await self.broker.publish(channel, data)
+
+    async def _deliver(self, channel: str, data: bytes) -> None:
+        if self._on_message is not None:
+            await self._on_message(channel, data)
+
+
+class RedisBroadcastBackend(BroadcastBackend):
+    """
+    Redis pub/sub backend.
+
+    Args:
+        url: Redis URL, defaults to ``settings.REDIS_URL``
+        client: Pre-built ``redis.asyncio`` compatible client, e.g. a
+            ``fakeredis.aioredis.FakeRedis`` in tests
+    """
+
+    def __init__(self, url: Optional[str] = None, client: Any = None):
+        self.url = url or settings.REDIS_URL
+        self._client = client
+        self._pubsub = None
+        self._reader: Optional[asyncio.Task] = None
+        self._on_message: Optional[MessageCallback] = None
+
+    async def connect(self, on_message: MessageCallback) -> None:
+        if self._client is None:
+            import redis.asyncio as aioredis
+
+            self._client = aioredis.from_url(self.url)
+        self._on_message = on_message
+        self._pubsub = self._client.pubsub()
+        self._reader = asyncio.get_running_loop().create_task(self._read_loop())
+
+    async def disconnect(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            try:
+                await self._reader
+            except asyncio.CancelledError:
+                pass
+            self._reader = None
+        if self._pubsub is not None:
+            await self._pubsub.close()
+            self._pubsub = None
+
+    async def subscribe(self, channel: str) -> None:
+        await self._pubsub.subscribe(channel)
+
+    async def unsubscribe(self, channel: str) -> None:
+        await self._pubsub.unsubscribe(channel)
+
+    async def publish(self, channel: str, data: bytes) -> None:
+        await self._client.publish(channel, data)
+
+    async def _read_loop(self) -> None:
+        while True:
+            if not self._pubsub.subscribed:
+                await asyncio.sleep(0.1)
+                continue
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Redis pub/sub read failed: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if message is None or message.get("type") != "message":
+                continue
+
+            channel = message["channel"]
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            try:
+                await self._on_message(channel, message["data"])
+            except Exception as e:
+                logger.error(f"Broadcast delivery failed on {channel}: {e}")
+
+
+class BroadcastBus:
+    """
+    Publishes game events to local sockets and to every other worker.
+
+    Outbound events are grouped per game and flushed once per tick as a
+    single pub/sub message. Inbound batches are deduplicated by
+    ``(origin, game_id)`` sequence numbers before delivery to the local hub.
+    Every delivered event is first appended to the game's resumable log,
+    which assigns its ``event_seq`` and encodes it once for all sockets.
+    """
+
+    def __init__(
+        self,
+        backend: BroadcastBackend,
+        hub: ConnectionManager = connection_manager,
+        tick_ms: int = settings.BROADCAST_TICK_MS,
+        state: GameStateStore = game_state
+    ):
+        self.backend = backend
+        self.hub = hub
+        self.state = state
+        self.tick = tick_ms / 1000.0
+        self.origin = uuid.uuid4().hex[:12]
+        self._subscriptions: Dict[str, int] = {}
+        self._next_seq: Dict[str, int] = {}
+        self._last_seen: Dict[Tuple[str, str], int] = {}
+        self._pending: Dict[str, List[Dict[str, Any]]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self._handlers: Dict[str, List[EventHandler]] = {}
+        self._connected = False
+        self.published_batches = 0
+        self.received_events = 0
+        self.duplicate_events = 0
+
+    async def start(self) -> None:
+        if not self._connected:
+            await self.backend.connect(self._on_message)
+            self._connected = True
+
+    async def stop(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        await self.flush()
+        if self._connected:
+            await self.backend.disconnect()
+            self._connected = False
+        self._subscriptions.clear()
+
+    # Subscriptions follow local membership
+
+    async def join(self, game_id: str) -> None:
+        """Register local interest in a game; subscribes on first member."""
+        count = self._subscriptions.get(game_id, 0)
+        self._subscriptions[game_id] = count + 1
+        if count == 0:
+            await self.backend.subscribe(game_channel(game_id))
+
+    async def leave(self, game_id: str) -> None:
+        """Drop local interest in a game; unsubscribes after the last member."""
+        count = self._subscriptions.get(game_id, 0)
+        if count <= 1:
+            self._subscriptions.pop(game_id, None)
+            if count == 1:
+                await self.backend.unsubscribe(game_channel(game_id))
+                for origin_key in [k for k in self._last_seen if k[1] == game_id]:
+                    del self._last_seen[origin_key]
+                self.state.prune()
+        else:
+            self._subscriptions[game_id] = count - 1
+
+    def add_handler(self, event_type: str, handler: EventHandler) -> None:
+        """Call ``handler(game_id, event)`` for events of a type arriving from other workers."""
+        self._handlers.setdefault(event_type, []).append(handler)
+
+    # Publishing
+
+    def publish(self, game_id: str, event: Dict[str, Any], key: Optional[Hashable] = None) -> int:
+        """
+        Deliver an event to local sockets now and to other workers next tick.
+
+        Args:
+            game_id: Target game
+            event: JSON-serializable event
+            key: Optional coalescing key (must be JSON-serializable)
+
+        Returns:
+            Number of local connections the event was queued on
+        """
+        seq = self._next_seq.get(game_id, 0) + 1
+        self._next_seq[game_id] = seq
+
+        batch = self._pending.get(game_id)
+        if batch is None:
+            batch = self._pending[game_id] = []
+        batch.append({"seq": seq, "key": key, "data": event})
+
+        if self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_after_tick())
+
+        _, text = self.state.append(game_id, event, key)
+        return self.hub.broadcast(game_id, text, key=key)
+
+    async def _flush_after_tick(self) -> None:
+        try:
+            await asyncio.sleep(self.tick)
+        finally:
+            self._flusher = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """Publish every pending batch, one message per game."""
+        pending, self._pending = self._pending, {}
+        for game_id, events in pending.items():
+            payload = json.dumps(
+                {"origin": self.origin, "game_id": game_id, "events": events},
+                separators=(",", ":")
+            ).encode()
+            try:
+                await self.backend.publish(game_channel(game_id), payload)
+                self.published_batches += 1
+            except Exception as e:
+                logger.error(f"Broadcast publish failed for game {game_id}: {e}")
+
+    # Receiving
+
+    async def _on_message(self, channel: str, data: bytes) -> None:
+        try:
+            batch = json.loads(data)
+        except ValueError:
+            logger.warning(f"Discarding malformed broadcast on {channel}")
+            return
+
+        origin = batch.get("origin")
+        if origin == self.origin:
+            return  # Already delivered locally at publish time
+
+        game_id = batch.get("game_id") or channel_game_id(channel)
+        last = self._last_seen.get((origin, game_id), 0)
+        for item in batch.get("events", ()):
+            seq = item["seq"]
+            if seq <= last:
+                self.duplicate_events += 1
+                continue
+            last = seq
+            self.received_events += 1
+            key = item.get("key")
+            event = item["data"]
+            for handler in self._handlers.get(event.get("type"), ()):
+                try:
+                    handler(game_id, event)
+                except Exception as e:
+                    logger.error(f"Event handler failed for game {game_id}: {e}")
+            _, text = self.state.append(game_id, event, key)
+            self.hub.broadcast(game_id, text, key=key)
+        self._last_seen[(origin, game_id)] = last
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "subscribed_games": len(self._subscriptions),
+            "published_batches": self.published_batches,
+            "received_events": self.received_events,
+            "duplicate_events": self.duplicate_events
+        }
+
+
+def create_backend(name: Optional[str] = None) -> BroadcastBackend:
+    """Build the configured broadcast backend (``BROADCAST_BACKEND``)."""
+    name = name or settings.BROADCAST_BACKEND
+    if name == "redis":
+        return RedisBroadcastBackend()
+    if name == "memory":
+        return InMemoryBroadcastBackend()
+    raise ValueError(f"Unknown broadcast backend: {name}")
+
+
+# Per-worker bus instance
+broadcast_bus = BroadcastBus(create_backend())
@@ -0,0 +1,376 @@
+"""
+WebSocket connection lifecycle management for live game coordination.
+
+The hub keeps one registry per game and fans messages out to the members of
+that game only. Every connection owns a small bounded send queue; slow
+clients lose (or have coalesced) their oldest messages instead of blocking
+the broadcaster. Idle connections carry no background task of their own —
+a sender task only exists while a connection has queued messages.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, List, Optional, Tuple, Union
+
+from fastapi import WebSocket
+
+from app.core.config import settings
+from app.core.exceptions import WebSocketConnectionException
+
+logger = logging.getLogger(__name__)
+
+Message = Union[str, bytes]
+
+# Close codes (RFC 6455 / IANA registry)
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+
+# Default number of pending messages kept per connection
+DEFAULT_SEND_QUEUE_SIZE = 64
+
+
+class GameConnection:
+    """
+    A single client socket registered with a game.
+
+    Uses ``__slots__`` so thousands of idle connections stay cheap; the
+    pending queue is a ``deque`` of either raw messages or coalescing keys
+    whose latest payload lives in ``_coalesced``.
+    """
+
+    __slots__ = (
+        "connection_id",
+        "websocket",
+        "game_id",
+        "user_id",
+        "role",
+        "protocol",
+        "last_seen",
+        "dropped",
+        "coalesced",
+        "_queue",
+        "_coalesced",
+        "_max_queue",
+        "_sender",
+        "__weakref__",
+    )
+
+    def __init__(
+        self,
+        connection_id: int,
+        websocket: WebSocket,
+        game_id: str,
+        user_id: Optional[str] = None,
+        role: str = "viewer",
+        protocol: Optional[str] = None,
+        max_queue: int = DEFAULT_SEND_QUEUE_SIZE
+    ):
+        self.connection_id = connection_id
+        self.websocket = websocket
+        self.game_id = game_id
+        self.user_id = user_id
+        self.role = role
+        self.protocol = protocol
+        self.last_seen = time.monotonic()
+        self.dropped = 0
+        self.coalesced = 0
+        self._queue: Deque[Tuple[Optional[Hashable], Optional[Message]]] = deque()
+        self._coalesced: Dict[Hashable, Message] = {}
+        self._max_queue = max_queue
+        self._sender: Optional[asyncio.Task] = None
+
+    def __repr__(self):
+        return f"<GameConnection(id={self.connection_id}, game='{self.game_id}', role='{self.role}')>"
+
+    @property
+    def pending(self) -> int:
+        """Number of messages waiting to be sent."""
+        return len(self._queue)
+
+    def touch(self) -> None:
+        """Record activity from the client (any inbound frame counts)."""
+        self.last_seen = time.monotonic()
+
+    def enqueue(self, message: Message, key: Optional[Hashable] = None) -> None:
+        """
+        Queue a message without ever blocking.
+
+        Args:
+            message: Pre-encoded text or binary frame
+            key: Optional coalescing key; a newer message with the same key
+                replaces the pending one in place instead of queueing again
+        """
+        if key is not None and key in self._coalesced:
+            self._coalesced[key] = message
+            self.coalesced += 1
+            return
+
+        if len(self._queue) >= self._max_queue:
+            old_key, _ = self._queue.popleft()
+            if old_key is not None:
+                self._coalesced.pop(old_key, None)
+            self.dropped += 1
+
+        if key is None:
+            self._queue.append((None, message))
+        else:
+            self._coalesced[key] = message
+            self._queue.append((key, None))
+
+    def pop(self) -> Optional[Message]:
+        """Pop the next message to send, or None when the queue is empty."""
+        if not self._queue:
+            return None
+        key, message = self._queue.popleft()
+        if key is not None:
+            message = self._coalesced.pop(key)
+        return message
+
+
+class ConnectionManager:
+    """
+    Per-worker WebSocket hub.
+
+    Connections are grouped by game so a broadcast touches only that game's
+    members. Messages are encoded once per broadcast and the same object is
+    queued on every member.
+    """
+
+    def __init__(
+        self,
+        heartbeat_interval: int = settings.WEBSOCKET_HEARTBEAT_INTERVAL,
+        max_connections_per_game: int = settings.MAX_WEBSOCKET_CONNECTIONS_PER_GAME,
+        send_queue_size: int = DEFAULT_SEND_QUEUE_SIZE
+    ):
+        self.heartbeat_interval = heartbeat_interval
+        self.max_connections_per_game = max_connections_per_game
+        self.send_queue_size = send_queue_size
+        self.games: Dict[str, Dict[int, GameConnection]] = {}
+        self._ids = itertools.count(1)
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self.total_dropped = 0
+        self.total_reaped = 0
+
+    # Registration
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        game_id: str,
+        user_id: Optional[str] = None,
+        role: str = "viewer",
+        subprotocol: Optional[str] = None
+    ) -> GameConnection:
+        """
+        Accept a socket and register it with a game.
+
+        Args:
+            websocket: Socket that has not been accepted yet
+            game_id: Game to join
+            user_id: Authenticated user
+            role: "camera" or "viewer"
+            subprotocol: Negotiated subprotocol echoed in the handshake
+
+        Raises:
+            WebSocketConnectionException: If the game is at capacity
+        """
+        members = self.games.get(game_id)
+        if members is not None and len(members) >= self.max_connections_per_game:
+            raise WebSocketConnectionException(
+                f"game {game_id} has reached {self.max_connections_per_game} connections"
+            )
+
+        await websocket.accept(subprotocol=subprotocol)
+        connection = GameConnection(
+            next(self._ids),
+            websocket,
+            game_id,
+            user_id=user_id,
+            role=role,
+            protocol=subprotocol,
+            max_queue=self.send_queue_size
+        )
+        self.games.setdefault(game_id, {})[connection.connection_id] = connection
+        logger.debug(f"WebSocket connected: {connection}")
+        return connection
+
+    def disconnect(self, connection: GameConnection) -> None:
+        """Remove a connection from its game; safe to call more than once."""
+        members = self.games.get(connection.game_id)
+        if members is None or members.pop(connection.connection_id, None) is None:
+            return
+        if not members:
+            del self.games[connection.game_id]
+        self.total_dropped += connection.dropped
+        if connection._sender is not None and connection._sender is not asyncio.current_task():
+            connection._sender.cancel()
+        logger.debug(f"WebSocket disconnected: {connection}")
+
+    def members(self, game_id: str) -> List[GameConnection]:
+        """Connections currently registered for a game."""
+        return list(self.games.get(game_id, {}).values())
+
+    # Sending
+
+    @staticmethod
+    def encode(message: Union[Dict[str, Any], Message]) -> Message:
+        """Encode a dict as compact JSON text; str/bytes pass through."""
+        if isinstance(message, (str, bytes)):
+            return message
+        return json.dumps(message, separators=(",", ":"))
+
+    def send(
+        self,
+        connection: GameConnection,
+        message: Union[Dict[str, Any], Message],
+        key: Optional[Hashable] = None
+    ) -> None:
+        """Queue a message for a single connection."""
+        connection.enqueue(self.encode(message), key)
+        self._schedule(connection)
+
+    def broadcast(
+        self,
+        game_id: str,
+        message: Union[Dict[str, Any], Message],
+        key: Optional[Hashable] = None,
+        exclude: Optional[GameConnection] = None
+    ) -> int:
+        """
+        Queue a message for every member of a game.
+
+        Never awaits, so a slow client cannot stall the caller.
+
+        Args:
+            game_id: Target game
+            message: Dict (encoded once) or pre-encoded frame
+            key: Optional coalescing key, see ``GameConnection.enqueue``
+            exclude: Connection to skip, typically the sender
+
+        Returns:
+            Number of connections the message was queued on
+        """
+        members = self.games.get(game_id)
+        if not members:
+            return 0
+
+        frame = self.encode(message)
+        count = 0
+        for connection in members.values():
+            if connection is exclude:
+                continue
+            connection.enqueue(frame, key)
+            self._schedule(connection)
+            count += 1
+        return count
+
+    def _schedule(self, connection: GameConnection) -> None:
+        if connection._sender is None:
+            connection._sender = asyncio.get_running_loop().create_task(self._drain(connection))
+
+    async def _drain(self, connection: GameConnection) -> None:
+        """Send queued frames until the queue is empty, then exit."""
+        websocket = connection.websocket
+        try:
+            while True:
+                message = connection.pop()
+                if message is None:
+                    break
+                if isinstance(message, bytes):
+                    await websocket.send_bytes(message)
+                else:
+                    await websocket.send_text(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.info(f"WebSocket send failed, reaping {connection}: {e}")
+            connection._sender = None
+            await self._reap(connection, CLOSE_GOING_AWAY)
+        finally:
+            connection._sender = None
+
+    # Heartbeats
+
+    async def start(self) -> None:
+        """Start the heartbeat loop for this worker."""
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        """Stop heartbeats and close every registered socket."""
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+
+        for members in list(self.games.values()):
+            for connection in list(members.values()):
+                await self._reap(connection, CLOSE_GOING_AWAY)
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                logger.error(f"WebSocket heartbeat failed: {e}")
+
+    async def heartbeat(self) -> int:
+        """
+        Ping every connection and reap those silent for two intervals.
+
+        Returns:
+            Number of connections reaped
+        """
+        now = time.monotonic()
+        deadline = now - 2 * self.heartbeat_interval
+        ping = self.encode({"type": "ping", "ts": time.time()})
+
+        stale = []
+        for members in self.games.values():
+            for connection in members.values():
+                if connection.last_seen < deadline:
+                    stale.append(connection)
+                else:
+                    connection.enqueue(ping, key="ping")
+                    self._schedule(connection)
+
+        for connection in stale:
+            await self._reap(connection, CLOSE_GOING_AWAY)
+        return len(stale)
+
+    async def _reap(self, connection: GameConnection, code: int) -> None:
+        self.disconnect(connection)
+        self.total_reaped += 1
+        try:
+            await connection.websocket.close(code=code)
+        except Exception:
+            pass  # Socket already gone
+
+    def stats(self) -> Dict[str, int]:
+        """Counters for monitoring."""
+        connections = sum(len(members) for members in self.games.values())
+        live_dropped = sum(
+            connection.dropped
+            for members in self.games.values()
+            for connection in members.values()
+        )
+        return {
+            "games": len(self.games),
+            "connections": connections,
+            "dropped_messages": self.total_dropped + live_dropped,
+            "reaped_connections": self.total_reaped
+        }
+
+
+# Per-worker hub instance
+connection_manager = ConnectionManager()
@@ -0,0 +1,344 @@
+"""
+Resumable per-game state: sequenced event log plus compacted snapshots.
+
+Every event fanned out for a game gets a per-game ``event_seq`` and is kept,
+already JSON-encoded, in a fixed-size ring. Events published with a
+coalescing key also update the game's keyed state (last event per key).
+Every ``capacity // 2`` events the keyed state is copied into a snapshot, so
+the snapshot plus the ring always covers the full history.
+
+A reconnecting client sends ``{"type": "resume", "epoch": E, "last_seq": N}``:
+
+    N still in the ring        -> only the missing events
+    N compacted away / new log -> snapshot plus the events after it
+
+Sequence numbers are local to the worker's log; the ``epoch`` identifies
+the log so a client landing on another worker (or a restarted one without
+durability) gets a snapshot instead of a wrong tail.
+
+With ``GAME_STATE_DIR`` set each game also keeps an append-only
+``{game}.log`` and a ``{game}.snapshot.json``, rewritten at compaction.
+The files are written by one background thread per store, so publishing
+an event never blocks the event loop on disk I/O; log lines queued
+together are flushed together.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from typing import IO, Any, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _safe_name(game_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", game_id)
+
+
+class JournalWriter:
+    """Background thread running game state file operations in submission order."""
+
+    def __init__(self):
+        self._queue: "queue.SimpleQueue[Tuple[Optional[Callable[..., Any]], tuple]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, operation: Callable[..., Any], *args: Any) -> None:
+        """Queue ``operation(*args)``; an operation returning a file gets it flushed."""
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="game-state-writer", daemon=True)
+                    self._thread.start()
+        self._queue.put((operation, args))
+
+    def drain(self) -> None:
+        """Block until everything submitted so far is written and flushed."""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put((None, (done,)))
+        done.wait()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            written: Set[IO[str]] = set()
+            drained: List[threading.Event] = []
+            for operation, args in batch:
+                if operation is None:
+                    drained.append(args[0])
+                    continue
+                try:
+                    f = operation(*args)
+                except Exception:
+                    logger.exception("Game state write failed")
+                    continue
+                if f is not None:
+                    written.add(f)
+            for f in written:
+                try:
+                    if not f.closed:
+                        f.flush()
+                except OSError as e:
+                    logger.error(f"Game state flush failed: {e}")
+            for done in drained:
+                done.set()
+
+
+class GameEventLog:
+    """Ring-buffered event log and snapshot for one game."""
+
+    __slots__ = (
+        "game_id",
+        "epoch",
+        "capacity",
+        "head",
+        "state",
+        "snapshot_seq",
+        "snapshot",
+        "last_active",
+        "_ring",
+        "_keys",
+        "_since_snapshot",
+        "_floor",
+        "_directory",
+        "_writer",
+        "_file",
+    )
+
+    def __init__(
+        self,
+        game_id: str,
+        capacity: int = 1024,
+        directory: Optional[str] = None,
+        writer: Optional[JournalWriter] = None
+    ):
+        self.game_id = game_id
+        self.epoch = uuid.uuid4().hex[:12]
+        self.capacity = max(2, capacity)
+        self.head = 0
+        self.state: Dict[str, str] = {}
+        self.snapshot_seq = 0
+        self.snapshot: Dict[str, str] = {}
+        self.last_active = time.monotonic()
+        self._ring: List[Optional[str]] = [None] * self.capacity
+        self._keys: List[Optional[str]] = [None] * self.capacity
+        self._since_snapshot = 0
+        self._floor = 0
+        self._directory = directory
+        self._writer = writer or (JournalWriter() if directory else None)
+        # Only touched by the writer thread once loaded
+        self._file: Optional[IO[str]] = None
+        if directory:
+            self._load()
+
+    @property
+    def oldest(self) -> int:
+        """Lowest sequence number still held in the ring."""
+        return max(self._floor + 1, self.head - self.capacity + 1)
+
+    def append(self, event: Dict, key: Optional[Hashable] = None) -> Tuple[int, str]:
+        """
+        Sequence and encode an event.
+
+        Returns:
+            ``(event_seq, encoded_json)``; the encoded text is what gets sent
+            to sockets so each event is serialized exactly once
+        """
+        seq = self.head + 1
+        text = json.dumps({**event, "event_seq": seq}, separators=(",", ":"))
+        slot = seq % self.capacity
+        state_key = None if key is None else str(key)
+        self._ring[slot] = text
+        self._keys[slot] = state_key
+        self.head = seq
+        self.last_active = time.monotonic()
+        if state_key is not None:
+            self.state[state_key] = text
+
+        if self._directory:
+            self._writer.submit(self._write_line, f"{seq}\t{json.dumps(state_key)}\t{text}\n")
+
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.capacity // 2:
+            self.compact()
+        return seq, text
+
+    def compact(self) -> None:
+        """Snapshot the keyed state at ``head`` and trim the durable log."""
+        self.snapshot = dict(self.state)
+        self.snapshot_seq = self.head
+        self._since_snapshot = 0
+        if self._directory:
+            self._writer.submit(self._write_snapshot, self.snapshot_seq, self.snapshot, [])
+
+    def events_after(self, seq: int) -> List[str]:
+        """Encoded events with sequence numbers in ``(seq, head]`` (must be in the ring)."""
+        return [self._ring[s % self.capacity] for s in range(seq + 1, self.head + 1)]
+
+    def resume(self, epoch: Optional[str], last_seq: int) -> str:
+        """
+        Build the catch-up message for a reconnecting client.
+
+        The message is assembled from pre-encoded event text without
+        re-serializing any event.
+        """
+        header = {"type": "resync", "epoch": self.epoch, "seq": self.head, "game_id": self.game_id}
+        if epoch == self.epoch and self.oldest - 1 <= last_seq <= self.head:
+            header["mode"] = "tail"
+            snapshot_text = None
+            events = self.events_after(last_seq)
+        else:
+            header["mode"] = "snapshot"
+            header["snapshot_seq"] = self.snapshot_seq
+            snapshot_text = "{" + ",".join(
+                f"{json.dumps(key)}:{text}" for key, text in self.snapshot.items()
+            ) + "}"
+            events = self.events_after(self.snapshot_seq)
+
+        text = json.dumps(header, separators=(",", ":"))[:-1]
+        if snapshot_text is not None:
+            text += f',"snapshot":{snapshot_text}'
+        return text + ',"events":[' + ",".join(events) + "]}"
+
+    def close(self) -> None:
+        if self._directory:
+            self._writer.submit(self._close_file)
+
+    # Durability (the writing methods run on the writer thread)
+
+    def _paths(self) -> Tuple[str, str]:
+        base = os.path.join(self._directory, _safe_name(self.game_id))
+        return base + ".log", base + ".snapshot.json"
+
+    def _write_line(self, line: str) -> Optional[IO[str]]:
+        if self._file is None:
+            return None
+        self._file.write(line)
+        return self._file
+
+    def _close_file(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_snapshot(self, seq: int, snapshot: Dict[str, str], lines: List[str]) -> None:
+        """Persist a snapshot and rewrite the log with ``lines``, the events after it."""
+        log_path, snapshot_path = self._paths()
+        tmp = snapshot_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"epoch": self.epoch, "seq": seq, "state": snapshot}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, snapshot_path)
+
+        self._close_file()
+        tmp = log_path + ".tmp"
+        with open(tmp, "w") as f:
+            f.writelines(lines)
+        os.replace(tmp, log_path)
+        self._file = open(log_path, "a")
+
+    def _load(self) -> None:
+        os.makedirs(self._directory, exist_ok=True)
+        log_path, snapshot_path = self._paths()
+
+        if os.path.exists(snapshot_path):
+            try:
+                with open(snapshot_path) as f:
+                    data = json.load(f)
+                self.epoch = data["epoch"]
+                self.snapshot_seq = self.head = self._floor = int(data["seq"])
+                self.snapshot = dict(data["state"])
+                self.state = dict(self.snapshot)
+            except (ValueError, KeyError, OSError) as e:
+                logger.error(f"Ignoring unreadable snapshot for game {self.game_id}: {e}")
+
+        if os.path.exists(log_path):
+            with open(log_path) as f:
+                for line in f:
+                    parts = line.rstrip("\n").split("\t", 2)
+                    if len(parts) != 3:
+                        break  # Torn final write
+                    seq = int(parts[0])
+                    if seq <= self.head:
+                        continue
+                    key = json.loads(parts[1])
+                    slot = seq % self.capacity
+                    self._ring[slot] = parts[2]
+                    self._keys[slot] = key
+                    self.head = seq
+                    if key is not None:
+                        self.state[key] = parts[2]
+            self._since_snapshot = self.head - self.snapshot_seq
+
+        if os.path.exists(snapshot_path):
+            self._writer.submit(self._open_file, log_path)
+        else:
+            # Persist the epoch before the first event
+            lines = []
+            for seq in range(self.snapshot_seq + 1, self.head + 1):
+                slot = seq % self.capacity
+                lines.append(f"{seq}\t{json.dumps(self._keys[slot])}\t{self._ring[slot]}\n")
+            self._writer.submit(self._write_snapshot, self.snapshot_seq, self.snapshot, lines)
+
+    def _open_file(self, log_path: str) -> None:
+        self._file = open(log_path, "a")
+
+
+class GameStateStore:
+    """Registry of per-game logs held by this worker."""
+
+    def __init__(
+        self,
+        capacity: int = settings.GAME_EVENT_LOG_SIZE,
+        directory: Optional[str] = settings.GAME_STATE_DIR
+    ):
+        self.capacity = capacity
+        self.directory = directory
+        self.writer = JournalWriter() if directory else None
+        self.games: Dict[str, GameEventLog] = {}
+
+    def get(self, game_id: str) -> GameEventLog:
+        log = self.games.get(game_id)
+        if log is None:
+            log = self.games[game_id] = GameEventLog(game_id, self.capacity, self.directory, self.writer)
+        return log
+
+    def append(self, game_id: str, event: Dict, key: Optional[Hashable] = None) -> Tuple[int, str]:
+        return self.get(game_id).append(event, key)
+
+    def prune(self, max_idle: float = settings.GAME_SESSION_TIMEOUT_HOURS * 3600) -> int:
+        """Drop logs idle for longer than a game session; returns how many."""
+        cutoff = time.monotonic() - max_idle
+        idle = [game_id for game_id, log in self.games.items() if log.last_active < cutoff]
+        for game_id in idle:
+            self.games.pop(game_id).close()
+        return len(idle)
+
+    async def stop(self) -> None:
+        """Close every log and wait for the pending writes to reach disk."""
+        for log in self.games.values():
+            log.close()
+        self.games.clear()
+        if self.writer is not None:
+            await asyncio.to_thread(self.writer.drain)
+
+
+# Per-worker state store
+game_state = GameStateStore()
@@ -0,0 +1,157 @@
+"""
+Coalesced presence and camera-status broadcasts.
+
+Parents joining, leaving or moving between camera positions change a game's
+roster. Instead of broadcasting the whole roster on each change, updates are
+merged per game and flushed once per tick (``PRESENCE_TICK_MS``) as a single
+diff:
+
+    {"type": "presence", "game_id": G, "changes": {camera: {field: value} | null}}
+
+Only fields whose value actually changed are sent; ``null`` means the camera
+left. Viewers receive the full roster (``presence_state``) once when they
+subscribe or resync and diffs afterwards.
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from app.core.config import settings
+from app.websocket.broadcast import BroadcastBus, broadcast_bus
+from app.websocket.connection_manager import ConnectionManager, GameConnection, connection_manager
+
+logger = logging.getLogger(__name__)
+
+# Marks a camera that left within the current tick
+_LEFT = None
+
+
+class PresenceTracker:
+    """Per-worker roster of cameras with tick-batched change fan-out."""
+
+    def __init__(
+        self,
+        bus: BroadcastBus = broadcast_bus,
+        hub: ConnectionManager = connection_manager,
+        tick_ms: int = settings.PRESENCE_TICK_MS
+    ):
+        self.bus = bus
+        self.hub = hub
+        self.tick = tick_ms / 1000.0
+        self.rosters: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._pending: Dict[str, Dict[str, Optional[Dict[str, Any]]]] = {}
+        self._counts: Dict[str, int] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self.updates = 0
+        self.diffs_published = 0
+        self.messages_saved = 0
+        bus.add_handler("presence", self._apply_remote)
+
+    # Recording changes
+
+    def update(self, game_id: str, camera_id: str, **fields: Any) -> None:
+        """Merge status fields for a camera into this tick's changes."""
+        pending = self._pending.setdefault(game_id, {})
+        current = pending.get(camera_id, _LEFT)
+        if current is _LEFT:
+            pending[camera_id] = dict(fields)
+        else:
+            current.update(fields)
+        self._record(game_id)
+
+    def leave(self, game_id: str, camera_id: str) -> None:
+        """Drop a camera from the roster at the next tick."""
+        self._pending.setdefault(game_id, {})[camera_id] = _LEFT
+        self._record(game_id)
+
+    def _record(self, game_id: str) -> None:
+        self.updates += 1
+        self._counts[game_id] = self._counts.get(game_id, 0) + 1
+        if self._flusher is None:
+            self._flusher = asyncio.get_running_loop().create_task(self._flush_after_tick())
+
+    async def _flush_after_tick(self) -> None:
+        try:
+            await asyncio.sleep(self.tick)
+        finally:
+            self._flusher = None
+        self.flush()
+
+    def flush(self) -> int:
+        """
+        Publish one merged diff per game with pending changes.
+
+        Returns:
+            Number of diffs published
+        """
+        pending, self._pending = self._pending, {}
+        counts, self._counts = self._counts, {}
+        published = 0
+        for game_id, changes in pending.items():
+            roster = self.rosters.setdefault(game_id, {})
+            diff: Dict[str, Optional[Dict[str, Any]]] = {}
+            for camera_id, fields in changes.items():
+                if fields is _LEFT:
+                    if roster.pop(camera_id, None) is not None:
+                        diff[camera_id] = _LEFT
+                    continue
+                state = roster.setdefault(camera_id, {})
+                changed = {k: v for k, v in fields.items() if state.get(k) != v}
+                if changed:
+                    state.update(changed)
+                    diff[camera_id] = changed
+            if not roster:
+                del self.rosters[game_id]
+
+            # Unmerged, every change would have been its own roster broadcast
+            sent = 1 if diff else 0
+            self.messages_saved += (counts.get(game_id, 0) - sent) * len(self.hub.members(game_id))
+            if not diff:
+                continue
+            self.bus.publish(game_id, {"type": "presence", "game_id": game_id, "changes": diff})
+            self.diffs_published += 1
+            published += 1
+        return published
+
+    async def stop(self) -> None:
+        if self._flusher is not None:
+            self._flusher.cancel()
+            self._flusher = None
+        self.flush()
+
+    def _apply_remote(self, game_id: str, event: Dict[str, Any]) -> None:
+        roster = self.rosters.setdefault(game_id, {})
+        for camera_id, fields in event.get("changes", {}).items():
+            if fields is None:
+                roster.pop(camera_id, None)
+            else:
+                roster.setdefault(camera_id, {}).update(fields)
+        if not roster:
+            del self.rosters[game_id]
+
+    # Reading
+
+    def snapshot(self, game_id: str) -> Dict[str, Any]:
+        """Full roster message for a newly subscribed client."""
+        roster = self.rosters.get(game_id, {})
+        return {
+            "type": "presence_state",
+            "game_id": game_id,
+            "cameras": {camera_id: dict(state) for camera_id, state in roster.items()},
+        }
+
+    def send_snapshot(self, connection: GameConnection) -> None:
+        self.hub.send(connection, self.snapshot(connection.game_id))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "games": len(self.rosters),
+            "updates": self.updates,
+            "diffs_published": self.diffs_published,
+            "messages_saved": self.messages_saved,
+        }
+
+
+# Per-worker presence tracker
+presence = PresenceTracker()
@@ -0,0 +1,377 @@
+"""
+Camera telemetry and control message protocol.
+
+Cameras report position, heading, quality and battery every
+``QUALITY_ASSESSMENT_INTERVAL`` seconds. Clients negotiate the encoding per
+connection through the WebSocket subprotocol header:
+
+    hlt.bin.v1 - struct-packed little-endian frames (preferred)
+    json       - plain JSON objects (fallback, also used when nothing is offered)
+
+Binary frame layouts (all little-endian):
+
+    FULL   <BB> version, type + RECORD                     (18 bytes)
+    DELTA  <BBHHB> version, type, seq, dt_ms, mask + changed fields
+    BATCH  <BBH> version, type, count + count * RECORD     (4 + 16n bytes)
+    CONTROL <BBBH> version, type, opcode, arg              (5 bytes)
+
+    RECORD <HIhhHBBBB> seq, ts_ms, x, y, heading, quality, stability, battery, flags
+
+Positions are tenths of a foot in rink coordinates, heading is in
+hundredths of a degree and scores are quantized to 0-255. A DELTA frame
+carries only the fields whose quantized value changed since the previous
+report on the same connection.
+"""
+
+import json
+import struct
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+
+from app.core.exceptions import InvalidMessageException
+
+PROTOCOL_BINARY_V1 = "hlt.bin.v1"
+PROTOCOL_JSON = "json"
+SUPPORTED_PROTOCOLS = (PROTOCOL_BINARY_V1, PROTOCOL_JSON)
+
+VERSION = 1
+
+# Frame types
+FRAME_FULL = 1
+FRAME_DELTA = 2
+FRAME_BATCH = 3
+FRAME_CONTROL = 4
+
+# Control opcodes
+CONTROL_COMMANDS = {
+    "start_recording": 1,
+    "stop_recording": 2,
+    "assign_position": 3,
+    "request_keyframe": 4,
+    "quality_feedback": 5,
+}
+CONTROL_OPCODES = {opcode: command for command, opcode in CONTROL_COMMANDS.items()}
+
+# Status flag bits
+FLAG_RECORDING = 0x01
+FLAG_CHARGING = 0x02
+
+# Quantized field order shared by RECORD, DELTA masks and the numpy dtype
+FIELDS = ("x", "y", "heading", "quality", "stability", "battery", "flags")
+FIELD_FORMATS = ("h", "h", "H", "B", "B", "B", "B")
+
+RECORD = struct.Struct("<HIhhHBBBB")
+FULL_HEADER = struct.Struct("<BB")
+DELTA_HEADER = struct.Struct("<BBHHB")
+BATCH_HEADER = struct.Struct("<BBH")
+CONTROL_FRAME = struct.Struct("<BBBH")
+FIELD_STRUCTS = tuple(struct.Struct("<" + fmt) for fmt in FIELD_FORMATS)
+
+RECORD_DTYPE = np.dtype([
+    ("seq", "<u2"),
+    ("ts_ms", "<u4"),
+    ("x", "<i2"),
+    ("y", "<i2"),
+    ("heading", "<u2"),
+    ("quality", "u1"),
+    ("stability", "u1"),
+    ("battery", "u1"),
+    ("flags", "u1"),
+])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+# Send a FULL frame at least this often so a lost decoder state heals quickly
+KEYFRAME_EVERY = 12
+
+
+def negotiate(offered: List[str]) -> Optional[str]:
+    """
+    Pick the subprotocol to accept from the client's offer.
+
+    Returns:
+        The chosen subprotocol, or None when the client offered nothing we
+        support (the connection then speaks JSON without a subprotocol).
+    """
+    for protocol in SUPPORTED_PROTOCOLS:
+        if protocol in offered:
+            return protocol
+    return None
+
+
+class TelemetryReport:
+    """Quantized camera telemetry, identical for JSON and binary clients."""
+
+    __slots__ = ("seq", "ts_ms") + FIELDS
+
+    def __init__(
+        self,
+        seq: int = 0,
+        ts_ms: int = 0,
+        x: int = 0,
+        y: int = 0,
+        heading: int = 0,
+        quality: int = 0,
+        stability: int = 0,
+        battery: int = 0,
+        flags: int = 0
+    ):
+        self.seq = seq
+        self.ts_ms = ts_ms
+        self.x = x
+        self.y = y
+        self.heading = heading
+        self.quality = quality
+        self.stability = stability
+        self.battery = battery
+        self.flags = flags
+
+    def __eq__(self, other):
+        return isinstance(other, TelemetryReport) and self.values() == other.values()
+
+    def __repr__(self):
+        return f"<TelemetryReport(seq={self.seq}, x={self.x}, y={self.y}, quality={self.quality})>"
+
+    def values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def copy(self) -> "TelemetryReport":
+        return TelemetryReport(*self.values())
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], previous: Optional["TelemetryReport"] = None) -> "TelemetryReport":
+        """
+        Quantize a JSON telemetry message; missing fields keep their previous value.
+
+        Expects ``x``/``y`` in feet, ``heading`` in degrees, ``quality`` and
+        ``stability`` in 0..1 and ``battery`` in percent.
+        """
+        report = previous.copy() if previous is not None else cls()
+        try:
+            if "seq" in data:
+                report.seq = int(data["seq"]) & 0xFFFF
+            elif previous is not None:
+                report.seq = (previous.seq + 1) & 0xFFFF
+            if "ts" in data:
+                report.ts_ms = int(data["ts"]) & 0xFFFFFFFF
+            if "x" in data:
+                report.x = _clamp(round(float(data["x"]) * 10), -32768, 32767)
+            if "y" in data:
+                report.y = _clamp(round(float(data["y"]) * 10), -32768, 32767)
+            if "heading" in data:
+                report.heading = round((float(data["heading"]) % 360) * 100) % 36000
+            if "quality" in data:
+                report.quality = _clamp(round(float(data["quality"]) * 255), 0, 255)
+            if "stability" in data:
+                report.stability = _clamp(round(float(data["stability"]) * 255), 0, 255)
+            if "battery" in data:
+                report.battery = _clamp(int(data["battery"]), 0, 100)
+            if "recording" in data:
+                report.flags = _set_flag(report.flags, FLAG_RECORDING, bool(data["recording"]))
+            if "charging" in data:
+                report.flags = _set_flag(report.flags, FLAG_CHARGING, bool(data["charging"]))
+        except (TypeError, ValueError, OverflowError) as e:
+            raise InvalidMessageException(f"invalid telemetry field: {e}")
+        return report
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Dequantize for JSON consumers (viewers, dashboards)."""
+        return {
+            "seq": self.seq,
+            "ts": self.ts_ms,
+            "x": self.x / 10.0,
+            "y": self.y / 10.0,
+            "heading": self.heading / 100.0,
+            "quality": round(self.quality / 255.0, 3),
+            "stability": round(self.stability / 255.0, 3),
+            "battery": self.battery,
+            "recording": bool(self.flags & FLAG_RECORDING),
+            "charging": bool(self.flags & FLAG_CHARGING),
+        }
+
+
+def _clamp(value: int, low: int, high: int) -> int:
+    return low if value < low else high if value > high else value
+
+
+def _set_flag(flags: int, bit: int, on: bool) -> int:
+    return flags | bit if on else flags & ~bit
+
+
+class TelemetryEncoder:
+    """Client-side binary encoder: FULL keyframes plus DELTA frames in between."""
+
+    def __init__(self, keyframe_every: int = KEYFRAME_EVERY):
+        self.keyframe_every = keyframe_every
+        self._previous: Optional[TelemetryReport] = None
+        self._since_keyframe = 0
+
+    def request_keyframe(self) -> None:
+        """Force the next frame to be FULL (server lost state)."""
+        self._previous = None
+
+    def encode(self, report: TelemetryReport) -> bytes:
+        previous = self._previous
+        dt = report.ts_ms - previous.ts_ms if previous is not None else -1
+        if previous is None or self._since_keyframe >= self.keyframe_every or not 0 <= dt <= 0xFFFF:
+            self._previous = report.copy()
+            self._since_keyframe = 0
+            return encode_full(report)
+
+        mask = 0
+        parts = []
+        for bit, name in enumerate(FIELDS):
+            value = getattr(report, name)
+            if value != getattr(previous, name):
+                mask |= 1 << bit
+                parts.append(FIELD_STRUCTS[bit].pack(value))
+
+        self._previous = report.copy()
+        self._since_keyframe += 1
+        return DELTA_HEADER.pack(VERSION, FRAME_DELTA, report.seq, dt, mask) + b"".join(parts)
+
+
+def encode_full(report: TelemetryReport) -> bytes:
+    return FULL_HEADER.pack(VERSION, FRAME_FULL) + RECORD.pack(*report.values())
+
+
+def encode_batch(reports: List[TelemetryReport]) -> bytes:
+    """Pack buffered reports (e.g. sent after a reconnect) into one BATCH frame."""
+    if len(reports) > 0xFFFF:
+        raise ValueError("too many reports for one batch frame")
+    return BATCH_HEADER.pack(VERSION, FRAME_BATCH, len(reports)) + b"".join(
+        RECORD.pack(*report.values()) for report in reports
+    )
+
+
+def encode_control(command: str, arg: int = 0, protocol: Optional[str] = PROTOCOL_BINARY_V1) -> Union[bytes, str]:
+    """
+    Encode a server-to-camera control message for the connection's protocol.
+
+    Raises:
+        InvalidMessageException: If the command is unknown
+    """
+    opcode = CONTROL_COMMANDS.get(command)
+    if opcode is None:
+        raise InvalidMessageException(f"unknown control command: {command}")
+    if protocol == PROTOCOL_BINARY_V1:
+        return CONTROL_FRAME.pack(VERSION, FRAME_CONTROL, opcode, arg)
+    return json.dumps({"type": "control", "command": command, "arg": arg}, separators=(",", ":"))
+
+
+def decode_control(data: bytes) -> Dict[str, Any]:
+    view = memoryview(data)
+    if len(view) != CONTROL_FRAME.size:
+        raise InvalidMessageException("truncated control frame")
+    version, frame_type, opcode, arg = CONTROL_FRAME.unpack_from(view)
+    if version != VERSION or frame_type != FRAME_CONTROL or opcode not in CONTROL_OPCODES:
+        raise InvalidMessageException("not a control frame")
+    return {"type": "control", "command": CONTROL_OPCODES[opcode], "arg": arg}
+
+
+def decode_batch(data: Union[bytes, memoryview]) -> np.ndarray:
+    """
+    View a BATCH frame as a structured array without copying the records.
+
+    The result is read-only and shares memory with ``data``.
+    """
+    view = memoryview(data)
+    if len(view) < BATCH_HEADER.size:
+        raise InvalidMessageException("truncated batch frame")
+    version, frame_type, count = BATCH_HEADER.unpack_from(view)
+    if version != VERSION or frame_type != FRAME_BATCH:
+        raise InvalidMessageException("not a batch frame")
+    if len(view) != BATCH_HEADER.size + count * RECORD.size:
+        raise InvalidMessageException("batch length does not match record count")
+    return np.frombuffer(view, dtype=RECORD_DTYPE, count=count, offset=BATCH_HEADER.size)
+
+
+class TelemetryDecoder:
+    """
+    Per-connection server-side decoder.
+
+    Keeps the last report so DELTA frames can be applied; raises
+    ``InvalidMessageException`` when a delta arrives without a base or out of
+    sequence, in which case the caller should send ``request_keyframe``.
+    """
+
+    __slots__ = ("previous",)
+
+    def __init__(self):
+        self.previous: Optional[TelemetryReport] = None
+
+    def decode(self, data: Union[bytes, memoryview]) -> TelemetryReport:
+        """
+        Decode one binary frame and return the camera's latest report.
+
+        For BATCH frames only the newest record is materialized; use
+        ``decode_batch`` to get every record as an array.
+        """
+        view = memoryview(data)
+        if len(view) < 2:
+            raise InvalidMessageException("empty frame")
+        version, frame_type = view[0], view[1]
+        if version != VERSION:
+            raise InvalidMessageException(f"unsupported protocol version {version}")
+
+        if frame_type == FRAME_FULL:
+            if len(view) != FULL_HEADER.size + RECORD.size:
+                raise InvalidMessageException("truncated full frame")
+            self.previous = TelemetryReport(*RECORD.unpack_from(view, FULL_HEADER.size))
+            return self.previous
+
+        if frame_type == FRAME_DELTA:
+            return self._apply_delta(view)
+
+        if frame_type == FRAME_BATCH:
+            records = self.decode_batch(view)
+            if not len(records):
+                raise InvalidMessageException("empty batch frame")
+            return self.previous
+
+        raise InvalidMessageException(f"unexpected frame type {frame_type}")
+
+    def decode_batch(self, data: Union[bytes, memoryview]) -> np.ndarray:
+        """Zero-copy view of a BATCH frame; the newest record becomes the delta base."""
+        records = decode_batch(data)
+        if len(records):
+            self.previous = TelemetryReport(*records[-1].tolist())
+        return records
+
+    def decode_json(self, message: Dict[str, Any]) -> TelemetryReport:
+        """Decode a JSON telemetry message, merging partial updates."""
+        report = TelemetryReport.from_dict(message, self.previous)
+        self.previous = report
+        return report
+
+    def _apply_delta(self, view: memoryview) -> TelemetryReport:
+        previous = self.previous
+        if previous is None:
+            raise InvalidMessageException("delta frame without keyframe")
+        if len(view) < DELTA_HEADER.size:
+            raise InvalidMessageException("truncated delta frame")
+
+        _, _, seq, dt, mask = DELTA_HEADER.unpack_from(view)
+        if seq != (previous.seq + 1) & 0xFFFF:
+            self.previous = None
+            raise InvalidMessageException(f"sequence gap: expected {(previous.seq + 1) & 0xFFFF}, got {seq}")
+
+        report = previous.copy()
+        report.seq = seq
+        report.ts_ms = (previous.ts_ms + dt) & 0xFFFFFFFF
+        offset = DELTA_HEADER.size
+        try:
+            for bit, name in enumerate(FIELDS):
+                if mask & (1 << bit):
+                    field = FIELD_STRUCTS[bit]
+                    setattr(report, name, field.unpack_from(view, offset)[0])
+                    offset += field.size
+        except struct.error:
+            self.previous = None
+            raise InvalidMessageException("truncated delta frame")
+        if offset != len(view):
+            self.previous = None
+            raise InvalidMessageException("trailing bytes in delta frame")
+
+        self.previous = report
+        return report
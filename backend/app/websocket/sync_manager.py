@@ -0,0 +1,274 @@
+"""
+Camera clock synchronization over the game WebSocket.
+
+The server periodically sends each camera a burst of NTP-style probes:
+
+    server -> camera  {"type": "clock_sync", "id": n, "server_ts": s1}
+    camera -> server  {"type": "clock_sync", "id": n, "client_ts": c}
+
+and notes the receive time ``s2``. Each reply yields one sample with
+``rtt = s2 - s1`` and ``offset = c - (s1 + s2) / 2`` (client minus server).
+Samples with the lowest round-trip times carry the least queueing noise, so
+the model keeps only those and fits ``offset = a + b * (t - ref)`` by least
+squares; ``b`` is the camera clock's skew. Mapping a camera timestamp to
+server (game) time is then O(1) arithmetic.
+
+After each burst the fitted model is published on the game bus under the
+key ``clock:{camera}``, so it lands in the game's keyed state alongside the
+rest of the session and reaches every worker and viewer.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.websocket.broadcast import BroadcastBus, broadcast_bus
+from app.websocket.connection_manager import ConnectionManager, GameConnection, connection_manager
+from app.websocket.game_state import GameStateStore, game_state
+
+logger = logging.getLogger(__name__)
+
+# Samples kept per camera (oldest fall off as the clock drifts)
+MAX_SAMPLES = 64
+# Spacing between probes within a burst
+PROBE_SPACING = 0.2
+# Minimum span of sample times before a skew is estimated
+MIN_SKEW_SPAN_MS = 30_000.0
+
+
+def _now_ms() -> float:
+    return time.time() * 1000.0
+
+
+def clock_key(camera_id: str) -> str:
+    """Game-state key holding a camera's published clock model."""
+    return f"clock:{camera_id}"
+
+
+class ClockModel:
+    """Linear clock model: ``client = server + offset_ms + skew * (server - ref_ms)``."""
+
+    __slots__ = ("offset_ms", "skew", "ref_ms", "uncertainty_ms", "samples")
+
+    def __init__(
+        self,
+        offset_ms: float = 0.0,
+        skew: float = 0.0,
+        ref_ms: float = 0.0,
+        uncertainty_ms: float = 0.0,
+        samples: int = 0
+    ):
+        self.offset_ms = offset_ms
+        self.skew = skew
+        self.ref_ms = ref_ms
+        self.uncertainty_ms = uncertainty_ms
+        self.samples = samples
+
+    def to_server_time(self, client_ms: float) -> float:
+        """Map a camera timestamp to server wall-clock milliseconds."""
+        return (client_ms - self.offset_ms + self.skew * self.ref_ms) / (1.0 + self.skew)
+
+    def to_game_time(self, client_ms: float, game_start_ms: float) -> float:
+        """Milliseconds since the game started for a camera timestamp."""
+        return self.to_server_time(client_ms) - game_start_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "offset_ms": round(self.offset_ms, 3),
+            "skew_ppm": round(self.skew * 1e6, 3),
+            "ref_ms": round(self.ref_ms, 3),
+            "uncertainty_ms": round(self.uncertainty_ms, 3),
+            "samples": self.samples,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ClockModel":
+        return cls(
+            offset_ms=float(data["offset_ms"]),
+            skew=float(data.get("skew_ppm", 0.0)) / 1e6,
+            ref_ms=float(data.get("ref_ms", 0.0)),
+            uncertainty_ms=float(data.get("uncertainty_ms", 0.0)),
+            samples=int(data.get("samples", 0)),
+        )
+
+
+def fit_clock_model(samples: List[Tuple[float, float, float]]) -> Optional[ClockModel]:
+    """
+    Fit a clock model from ``(server_mid_ms, offset_ms, rtt_ms)`` samples.
+
+    Keeps samples whose RTT is within 50% (plus 2 ms) of the best one, or at
+    least the best quarter, then regresses offset against time.
+    """
+    if not samples:
+        return None
+
+    by_rtt = sorted(samples, key=lambda s: s[2])
+    best_rtt = by_rtt[0][2]
+    cutoff = best_rtt * 1.5 + 2.0
+    kept = [s for s in by_rtt if s[2] <= cutoff]
+    minimum = max(1, len(by_rtt) // 4)
+    if len(kept) < minimum:
+        kept = by_rtt[:minimum]
+
+    n = len(kept)
+    ref = sum(s[0] for s in kept) / n
+    mean_offset = sum(s[1] for s in kept) / n
+    span = max(s[0] for s in kept) - min(s[0] for s in kept)
+
+    skew = 0.0
+    if n >= 3 and span >= MIN_SKEW_SPAN_MS:
+        sxx = sum((s[0] - ref) ** 2 for s in kept)
+        sxy = sum((s[0] - ref) * (s[1] - mean_offset) for s in kept)
+        skew = sxy / sxx if sxx else 0.0
+        offset = mean_offset
+    else:
+        # Too short a baseline for drift: trust the least-delayed sample
+        offset = by_rtt[0][1] if n < 3 else sorted(s[1] for s in kept)[n // 2]
+
+    return ClockModel(
+        offset_ms=offset,
+        skew=skew,
+        ref_ms=ref,
+        uncertainty_ms=best_rtt / 2.0,
+        samples=n,
+    )
+
+
+class CameraClock:
+    """Probe bookkeeping and samples for one camera connection."""
+
+    __slots__ = ("camera_id", "samples", "pending", "next_id", "model", "task")
+
+    def __init__(self, camera_id: str):
+        self.camera_id = camera_id
+        self.samples: Deque[Tuple[float, float, float]] = deque(maxlen=MAX_SAMPLES)
+        self.pending: Dict[int, float] = {}
+        self.next_id = 1
+        self.model: Optional[ClockModel] = None
+        self.task: Optional[asyncio.Task] = None
+
+
+class ClockSyncManager:
+    """Runs probe bursts for camera connections and keeps their clock models."""
+
+    def __init__(
+        self,
+        hub: ConnectionManager = connection_manager,
+        bus: BroadcastBus = broadcast_bus,
+        state: GameStateStore = game_state,
+        burst_size: int = settings.CLOCK_SYNC_SAMPLES,
+        resync_interval: int = settings.CLOCK_SYNC_INTERVAL
+    ):
+        self.hub = hub
+        self.bus = bus
+        self.state = state
+        self.burst_size = burst_size
+        self.resync_interval = resync_interval
+        self.games: Dict[str, Dict[str, CameraClock]] = {}
+
+    def start(self, connection: GameConnection) -> CameraClock:
+        """Begin probing a camera; the first burst is sent immediately."""
+        cameras = self.games.setdefault(connection.game_id, {})
+        clock = cameras.get(connection.user_id)
+        if clock is None:
+            clock = cameras[connection.user_id] = CameraClock(connection.user_id)
+        if clock.task is not None:
+            clock.task.cancel()
+        clock.pending.clear()
+        clock.task = asyncio.get_running_loop().create_task(self._probe_loop(connection, clock))
+        return clock
+
+    def stop(self, connection: GameConnection) -> None:
+        """
+        Stop probing a camera.
+
+        Samples are kept while any camera of the game is still connected so
+        a quick reconnect resumes the fit; the published model outlives them
+        in the game state either way.
+        """
+        cameras = self.games.get(connection.game_id)
+        if not cameras:
+            return
+        clock = cameras.get(connection.user_id)
+        if clock is not None and clock.task is not None:
+            clock.task.cancel()
+            clock.task = None
+        if all(c.task is None for c in cameras.values()):
+            del self.games[connection.game_id]
+
+    async def _probe_loop(self, connection: GameConnection, clock: CameraClock) -> None:
+        while True:
+            for _ in range(self.burst_size):
+                probe_id = clock.next_id
+                clock.next_id += 1
+                sent = _now_ms()
+                clock.pending[probe_id] = sent
+                self.hub.send(connection, {"type": "clock_sync", "id": probe_id, "server_ts": sent})
+                await asyncio.sleep(PROBE_SPACING)
+            # Unanswered probes are useless once the burst is over
+            clock.pending.clear()
+            if clock.model is not None:
+                self.publish(connection.game_id, clock)
+            await asyncio.sleep(self.resync_interval)
+
+    def publish(self, game_id: str, clock: CameraClock) -> None:
+        event = clock.model.to_dict()
+        event["type"] = "clock_model"
+        event["camera"] = clock.camera_id
+        self.bus.publish(game_id, event, key=clock_key(clock.camera_id))
+
+    def handle_reply(self, connection: GameConnection, message: Dict[str, Any]) -> Optional[ClockModel]:
+        """
+        Record a probe reply.
+
+        Returns:
+            The refitted model, or None for unknown or malformed replies
+        """
+        received = _now_ms()
+        clock = self.games.get(connection.game_id, {}).get(connection.user_id)
+        if clock is None:
+            return None
+        try:
+            sent = clock.pending.pop(int(message["id"]))
+            client_ts = float(message["client_ts"])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+        rtt = received - sent
+        offset = client_ts - (sent + received) / 2.0
+        clock.samples.append(((sent + received) / 2.0, offset, rtt))
+        clock.model = fit_clock_model(list(clock.samples))
+        return clock.model
+
+    def get_model(self, game_id: str, camera_id: str) -> Optional[ClockModel]:
+        """
+        Current clock model for a camera.
+
+        Falls back to the last model published into the game state, which
+        also covers cameras connected to another worker.
+        """
+        clock = self.games.get(game_id, {}).get(camera_id)
+        if clock is not None and clock.model is not None:
+            return clock.model
+        log = self.state.games.get(game_id)
+        text = log.state.get(clock_key(camera_id)) if log is not None else None
+        return ClockModel.from_dict(json.loads(text)) if text is not None else None
+
+    def to_game_time(self, game_id: str, camera_id: str, client_ms: float, game_start_ms: float) -> float:
+        """
+        Map a camera timestamp (e.g. a chunk's start) onto the game timeline.
+
+        Cameras that never completed a sync are assumed to be on server time.
+        """
+        model = self.get_model(game_id, camera_id)
+        if model is None:
+            return client_ms - game_start_ms
+        return model.to_game_time(client_ms, game_start_ms)
+
+
+# Per-worker sync manager
+clock_sync = ClockSyncManager()
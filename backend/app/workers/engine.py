@@ -0,0 +1,866 @@
+"""
+Local background job engine.
+
+Tasks are declared with a Celery-style decorator and queued with
+``delay``/``apply_async``; callers get an ``AsyncResult`` back::
+
+    @job_engine.task(bind=True, priority=PRIORITY_COMPILATION,
+                     time_limit=settings.VIDEO_COMPILATION_TIMEOUT)
+    def compile_game(self, game_id):
+        ...
+        self.update_state(meta={"current": done, "total": total})
+
+    compile_game.delay(game_id)
+
+Jobs run in a pool of ``JOB_WORKERS`` spawned processes, so no broker is
+needed. The queue is ordered by priority (lower runs first, so live previews
+at ``PRIORITY_LIVE_PREVIEW`` run ahead of jobs at ``PRIORITY_DEFAULT``, which
+overtake full compilations) and then by submission order. A job that runs
+past its ``time_limit`` has its worker process group killed and is marked
+failed; a replacement worker is spawned on demand.
+
+Every state change is written to ``{JOB_STATE_DIR}/{job_id}.json``. On
+startup, queued jobs are queued again, and jobs that were running when the
+API went down are retried up to ``MAX_ATTEMPTS`` times. Several API worker
+processes share the directory: an engine holds an ``flock`` on
+``{job_id}.lock`` for every unfinished job it owns, so recovery only takes
+over jobs whose owner has exited, and each of them exactly once. Arguments and
+results must therefore be JSON-serializable, as with Celery's default
+serializer.
+
+A job owned by another live engine cannot be revoked directly: ``revoke``
+leaves a ``{job_id}.revoke`` request that the owner applies within
+``REVOKE_POLL_INTERVAL`` seconds (or the engine recovering the job, if the
+owner exits first). Until then the record still shows the old state.
+"""
+
+import asyncio
+import fcntl
+import heapq
+import importlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import re
+import signal
+import threading
+import time
+import traceback
+import uuid
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from app.core.config import settings
+from app.core.exceptions import (
+    AuthorizationException,
+    JobFailedException,
+    JobNotFoundException,
+    StorageException,
+)
+
+logger = logging.getLogger(__name__)
+
+# Job states (same names as Celery)
+PENDING = "PENDING"
+STARTED = "STARTED"
+PROGRESS = "PROGRESS"
+SUCCESS = "SUCCESS"
+FAILURE = "FAILURE"
+REVOKED = "REVOKED"
+READY_STATES = frozenset({SUCCESS, FAILURE, REVOKED})
+
+# Queue priorities; lower runs first
+PRIORITY_LIVE_PREVIEW = 1
+PRIORITY_DEFAULT = 5
+PRIORITY_COMPILATION = 9
+
+# Runs per job, counting restarts that interrupted it
+MAX_ATTEMPTS = 3
+# Minimum seconds between persisted progress updates of one job
+PROGRESS_SAVE_INTERVAL = 1.0
+# Seconds between sweeps of expired job records
+PRUNE_INTERVAL = 300
+# Seconds between checks for revoke requests left by other processes
+REVOKE_POLL_INTERVAL = 1.0
+
+_JOB_ID = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+
+# Set in worker processes: pipe back to the engine
+_channel: Optional[Connection] = None
+
+
+class JobRecord:
+    """Persisted state of one job."""
+
+    __slots__ = (
+        "job_id", "name", "module", "args", "kwargs", "priority", "time_limit", "owner",
+        "state", "info", "result", "error", "attempts", "created_at", "started_at", "finished_at",
+        "_saved_at",
+    )
+
+    def __init__(
+        self,
+        job_id: str,
+        name: str,
+        module: str,
+        args: Sequence[Any],
+        kwargs: Dict[str, Any],
+        priority: int,
+        time_limit: int,
+        owner: Optional[str] = None
+    ):
+        self.job_id = job_id
+        self.name = name
+        self.module = module
+        self.args = list(args)
+        self.kwargs = dict(kwargs)
+        self.priority = priority
+        self.time_limit = time_limit
+        self.owner = owner
+        self.state = PENDING
+        self.info: Optional[Dict[str, Any]] = None
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._saved_at = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__ if not name.startswith("_")}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "JobRecord":
+        record = cls(
+            data["job_id"], data["name"], data["module"], data["args"], data["kwargs"],
+            data["priority"], data["time_limit"], data.get("owner")
+        )
+        for name in ("state", "info", "result", "error", "attempts", "created_at", "started_at", "finished_at"):
+            setattr(record, name, data.get(name))
+        return record
+
+    def status(self) -> Dict[str, Any]:
+        """Client view of the job."""
+        return {
+            "job_id": self.job_id,
+            "task": self.name,
+            "state": self.state,
+            "progress": self.info,
+            "result": self.result if self.state == SUCCESS else None,
+            "error": self.error,
+            "priority": self.priority,
+            "attempts": self.attempts,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobRequest:
+    """Context of the running job, available to bound tasks as ``self.request``."""
+
+    __slots__ = ("id", "attempt")
+
+    def __init__(self, job_id: Optional[str] = None, attempt: int = 0):
+        self.id = job_id
+        self.attempt = attempt
+
+
+class AsyncResult:
+    """Handle on a queued job (subset of Celery's ``AsyncResult``)."""
+
+    def __init__(self, job_id: str, engine: "JobEngine"):
+        self.id = job_id
+        self.engine = engine
+
+    def _record(self) -> JobRecord:
+        return self.engine.get(self.id)
+
+    @property
+    def state(self) -> str:
+        return self._record().state
+
+    status = state
+
+    @property
+    def info(self) -> Any:
+        """Progress meta while running, the result or error once finished."""
+        record = self._record()
+        if record.state == SUCCESS:
+            return record.result
+        if record.state in (FAILURE, REVOKED):
+            return record.error
+        return record.info
+
+    @property
+    def result(self) -> Any:
+        return self._record().result
+
+    def ready(self) -> bool:
+        return self.state in READY_STATES
+
+    def successful(self) -> bool:
+        return self.state == SUCCESS
+
+    def failed(self) -> bool:
+        return self.state == FAILURE
+
+    def get(self, timeout: Optional[float] = None, interval: float = 0.1) -> Any:
+        """
+        Block until the job finishes and return its result.
+
+        Raises:
+            JobFailedException: Job failed, timed out or was revoked
+            TimeoutError: Not finished within ``timeout`` seconds
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            record = self._record()
+            if record.state == SUCCESS:
+                return record.result
+            if record.state in (FAILURE, REVOKED):
+                raise JobFailedException(record.job_id, record.error or record.state)
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"Job {self.id} not finished after {timeout}s")
+            time.sleep(interval)
+
+    def revoke(self, terminate: bool = False) -> None:
+        self.engine.revoke(self.id, terminate=terminate)
+
+    def __repr__(self) -> str:
+        return f"<AsyncResult: {self.id}>"
+
+
+class Task:
+    """A job function registered with the engine."""
+
+    def __init__(
+        self,
+        engine: "JobEngine",
+        fn: Callable[..., Any],
+        name: str,
+        bind: bool,
+        priority: int,
+        time_limit: int
+    ):
+        self.engine = engine
+        self.fn = fn
+        self.name = name
+        self.module = fn.__module__
+        self.bind = bind
+        self.priority = priority
+        self.time_limit = time_limit
+        self.request = JobRequest()
+        self.__doc__ = fn.__doc__
+
+    def run(self, *args: Any, **kwargs: Any) -> Any:
+        if self.bind:
+            return self.fn(self, *args, **kwargs)
+        return self.fn(*args, **kwargs)
+
+    __call__ = run
+
+    def delay(self, *args: Any, **kwargs: Any) -> AsyncResult:
+        return self.apply_async(args, kwargs)
+
+    def apply_async(
+        self,
+        args: Optional[Sequence[Any]] = None,
+        kwargs: Optional[Dict[str, Any]] = None,
+        priority: Optional[int] = None,
+        time_limit: Optional[int] = None,
+        task_id: Optional[str] = None,
+        owner: Optional[str] = None
+    ) -> AsyncResult:
+        """
+        Queue the task.
+
+        Args:
+            args: Positional arguments (JSON-serializable)
+            kwargs: Keyword arguments (JSON-serializable)
+            priority: Override the task's queue priority
+            time_limit: Override the task's hard time limit in seconds
+            task_id: Job id to use instead of a generated one
+            owner: User the job belongs to (checked by the jobs API)
+        """
+        record = JobRecord(
+            task_id or uuid.uuid4().hex,
+            self.name,
+            self.module,
+            args or (),
+            kwargs or {},
+            self.priority if priority is None else priority,
+            time_limit or self.time_limit,
+            owner
+        )
+        return self.engine.submit(record)
+
+    def AsyncResult(self, task_id: str) -> AsyncResult:
+        return AsyncResult(task_id, self.engine)
+
+    def update_state(
+        self,
+        task_id: Optional[str] = None,
+        state: str = PROGRESS,
+        meta: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """Report progress of the running job; ``meta`` is shown by the jobs API."""
+        job_id = task_id or self.request.id
+        if job_id is None:
+            return
+        if _channel is not None:
+            _channel.send((PROGRESS, job_id, state, meta))
+        else:
+            self.engine.progress(job_id, state, meta)
+
+
+class _Worker:
+    __slots__ = ("process", "conn", "job_id", "deadline")
+
+    def __init__(self, process: multiprocessing.Process, conn: Connection):
+        self.process = process
+        self.conn = conn
+        self.job_id: Optional[str] = None
+        self.deadline = 0.0
+
+
+def _worker_main(conn: Connection) -> None:
+    """Worker process: run jobs sent over ``conn`` until it closes."""
+    global _channel
+    # Own process group, so a timeout also kills ffmpeg and other children
+    os.setpgid(0, 0)
+    _channel = conn
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if message is None:
+            return
+
+        job_id, module, name, args, kwargs, attempt = message
+        try:
+            importlib.import_module(module)
+            task = job_engine.tasks[name]
+            task.request = JobRequest(job_id, attempt)
+            result = task.run(*args, **kwargs)
+        except Exception as e:
+            reply = (FAILURE, job_id, f"{type(e).__name__}: {e}", traceback.format_exc())
+        else:
+            reply = (SUCCESS, job_id, result)
+        try:
+            conn.send(reply)
+        except (OSError, ValueError):
+            return
+
+
+class JobEngine:
+    """Priority queue, worker pool and persisted job records."""
+
+    def __init__(
+        self,
+        directory: str = settings.JOB_STATE_DIR,
+        workers: int = settings.JOB_WORKERS,
+        default_time_limit: int = settings.CELERY_TASK_TIMEOUT,
+        result_expires: int = settings.JOB_RESULT_EXPIRES
+    ):
+        self.directory = directory
+        self.max_workers = max(1, workers)
+        self.default_time_limit = default_time_limit
+        self.result_expires = result_expires
+        # Run jobs inline in the caller (scripts and tests)
+        self.always_eager = False
+        self.tasks: Dict[str, Task] = {}
+
+        self._jobs: Dict[str, JobRecord] = {}
+        self._queue: List[Any] = []
+        self._sequence = itertools.count()
+        self._workers: List[_Worker] = []
+        self._lock = threading.RLock()
+        self._context = multiprocessing.get_context("spawn")
+        self._wake_recv, self._wake_send = self._context.Pipe(duplex=False)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._pruned_at = 0.0
+        self._revokes_checked_at = 0.0
+        # Locked claim file per unfinished job this process owns
+        self._claims: Dict[str, int] = {}
+
+    def task(
+        self,
+        fn: Optional[Callable[..., Any]] = None,
+        *,
+        name: Optional[str] = None,
+        bind: bool = False,
+        priority: int = PRIORITY_DEFAULT,
+        time_limit: Optional[int] = None
+    ) -> Any:
+        """
+        Register a job function (``@job_engine.task`` or ``@job_engine.task(...)``).
+
+        Args:
+            name: Task name; defaults to ``module.function`` like Celery
+            bind: Pass the task as first argument (for ``self.update_state``)
+            priority: Default queue priority
+            time_limit: Hard limit in seconds; defaults to ``CELERY_TASK_TIMEOUT``
+        """
+        def register(func: Callable[..., Any]) -> Task:
+            task = Task(
+                self,
+                func,
+                name or f"{func.__module__}.{func.__name__}",
+                bind,
+                priority,
+                time_limit or self.default_time_limit
+            )
+            self.tasks[task.name] = task
+            return task
+
+        return register(fn) if fn is not None else register
+
+    # Job records
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self.directory, job_id + ".json")
+
+    def _revoke_path(self, job_id: str) -> str:
+        return os.path.join(self.directory, job_id + ".revoke")
+
+    def _save(self, record: JobRecord) -> None:
+        tmp = self._path(record.job_id) + ".tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump(record.to_dict(), f, default=str)
+            os.replace(tmp, self._path(record.job_id))
+        except OSError as e:
+            raise StorageException("save_job", str(e))
+        record._saved_at = time.monotonic()
+
+    def _claim(self, job_id: str) -> bool:
+        """
+        Take ownership of a job across processes.
+
+        The lock lasts until ``_release`` or until this process exits, so a
+        job claimed by a live engine is never recovered by another one.
+        """
+        if job_id in self._claims:
+            return True
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd = os.open(os.path.join(self.directory, job_id + ".lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        except OSError as e:
+            raise StorageException("claim_job", str(e))
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._claims[job_id] = fd
+        return True
+
+    def _release(self, job_id: str) -> None:
+        fd = self._claims.pop(job_id, None)
+        if fd is not None:
+            os.close(fd)
+
+    def _load(self, job_id: str) -> Optional[JobRecord]:
+        try:
+            with open(self._path(job_id)) as f:
+                return JobRecord.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (KeyError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable job record {job_id}: {e}")
+            return None
+
+    def get(self, job_id: str, owner: Optional[str] = None) -> JobRecord:
+        """
+        Raises:
+            JobNotFoundException: Unknown or expired job
+            AuthorizationException: Job belongs to another user
+        """
+        with self._lock:
+            record = self._jobs.get(job_id)
+        if record is None and _JOB_ID.match(job_id):
+            record = self._load(job_id)
+        if record is None:
+            raise JobNotFoundException(job_id)
+        if owner is not None and record.owner is not None and record.owner != owner:
+            raise AuthorizationException("Job belongs to another user")
+        return record
+
+    def AsyncResult(self, job_id: str) -> AsyncResult:
+        return AsyncResult(job_id, self)
+
+    def submit(self, record: JobRecord) -> AsyncResult:
+        if not _JOB_ID.match(record.job_id):
+            raise JobNotFoundException(record.job_id)
+        if self.always_eager:
+            self._run_eager(record)
+            return AsyncResult(record.job_id, self)
+
+        with self._lock:
+            if not self._claim(record.job_id):
+                raise StorageException("submit_job", f"job {record.job_id} is owned by another process")
+            self._jobs[record.job_id] = record
+            self._save(record)
+            heapq.heappush(self._queue, (record.priority, next(self._sequence), record.job_id))
+        self._wake()
+        return AsyncResult(record.job_id, self)
+
+    def _run_eager(self, record: JobRecord) -> None:
+        task = self.tasks[record.name]
+        with self._lock:
+            self._jobs[record.job_id] = record
+        record.state = STARTED
+        record.attempts = 1
+        record.started_at = time.time()
+        previous = task.request
+        task.request = JobRequest(record.job_id, 1)
+        try:
+            record.result = task.run(*record.args, **record.kwargs)
+            record.state = SUCCESS
+        except Exception as e:
+            record.state = FAILURE
+            record.error = f"{type(e).__name__}: {e}"
+        finally:
+            task.request = previous
+        record.finished_at = time.time()
+        self._save(record)
+
+    def progress(self, job_id: str, state: str, meta: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            record = self._jobs.get(job_id)
+            if record is None or record.state in READY_STATES:
+                return
+            record.state = state
+            record.info = meta
+            if time.monotonic() - record._saved_at >= PROGRESS_SAVE_INTERVAL:
+                self._save(record)
+
+    def revoke(self, job_id: str, terminate: bool = False, owner: Optional[str] = None) -> JobRecord:
+        """
+        Cancel a queued job; with ``terminate`` also kill it if it is running.
+
+        A job owned by another live engine is only asked to stop, and the
+        record returned is the last one that engine saved.
+
+        Raises:
+            JobNotFoundException: Unknown or expired job
+            AuthorizationException: Job belongs to another user
+        """
+        with self._lock:
+            record = self.get(job_id, owner)
+            if record.state in READY_STATES:
+                return record
+            if record.state != PENDING and not terminate:
+                return record
+            if job_id in self._jobs:
+                # The dispatcher kills a worker whose job was revoked
+                self._finish(record, REVOKED, error="Revoked")
+            elif self._claim(job_id):
+                # Its owner exited; the claim makes the record ours to finish
+                record = self._load(job_id) or record
+                if record.state in READY_STATES:
+                    self._release(job_id)
+                else:
+                    self._finish(record, REVOKED, error="Revoked")
+                self._jobs[job_id] = record
+            else:
+                self._request_revoke(job_id, terminate)
+        self._wake()
+        return record
+
+    def _request_revoke(self, job_id: str, terminate: bool) -> None:
+        """Ask the engine that owns a job to revoke it."""
+        try:
+            with open(self._revoke_path(job_id), "w") as f:
+                f.write("terminate" if terminate else "")
+        except OSError as e:
+            raise StorageException("revoke_job", str(e))
+
+    def _apply_revokes(self) -> None:
+        """Revoke owned jobs that other processes asked to revoke."""
+        self._revokes_checked_at = time.monotonic()
+        with self._lock:
+            for job_id in list(self._claims):
+                path = self._revoke_path(job_id)
+                try:
+                    with open(path) as f:
+                        terminate = f.read() == "terminate"
+                    os.remove(path)
+                except OSError:
+                    continue
+                record = self._jobs.get(job_id)
+                if record is None or record.state in READY_STATES:
+                    continue
+                if record.state == PENDING or terminate:
+                    self._finish(record, REVOKED, error="Revoked")
+
+    def _finish(self, record: JobRecord, state: str, result: Any = None, error: Optional[str] = None) -> None:
+        record.state = state
+        record.result = result
+        record.error = error
+        record.finished_at = time.time()
+        self._save(record)
+        self._release(record.job_id)
+
+    # Worker pool
+
+    def _wake(self) -> None:
+        try:
+            self._wake_send.send(None)
+        except OSError:
+            pass
+
+    def _spawn(self) -> _Worker:
+        parent, child = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child,), name="job-worker")
+        process.start()
+        child.close()
+        worker = _Worker(process, parent)
+        self._workers.append(worker)
+        return worker
+
+    def _kill(self, worker: _Worker) -> None:
+        """Kill a worker and everything it started; it is not reused."""
+        try:
+            os.killpg(worker.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            worker.process.kill()
+        worker.process.join(5)
+        worker.conn.close()
+        if worker in self._workers:
+            self._workers.remove(worker)
+
+    def _dispatch(self) -> None:
+        with self._lock:
+            while self._queue:
+                idle = next((w for w in self._workers if w.job_id is None), None)
+                if idle is None and len(self._workers) >= self.max_workers:
+                    return
+                _, _, job_id = heapq.heappop(self._queue)
+                record = self._jobs.get(job_id)
+                if record is None or record.state != PENDING:
+                    continue
+
+                worker = idle or self._spawn()
+                record.attempts += 1
+                message = (job_id, record.module, record.name, record.args, record.kwargs, record.attempts)
+                try:
+                    worker.conn.send(message)
+                except (OSError, ValueError):
+                    # Worker died while idle; put the job back and try another
+                    self._kill(worker)
+                    record.attempts -= 1
+                    heapq.heappush(self._queue, (record.priority, next(self._sequence), job_id))
+                    continue
+                worker.job_id = job_id
+                worker.deadline = time.monotonic() + record.time_limit
+                record.state = STARTED
+                record.started_at = time.time()
+                self._save(record)
+
+    def _handle(self, worker: _Worker, message: Any) -> None:
+        kind, job_id = message[0], message[1]
+        if kind == PROGRESS:
+            self.progress(job_id, message[2], message[3])
+            return
+
+        with self._lock:
+            worker.job_id = None
+            record = self._jobs.get(job_id)
+            if record is None or record.state in READY_STATES:
+                return
+            if kind == SUCCESS:
+                self._finish(record, SUCCESS, result=message[2])
+            else:
+                logger.error(f"Job {job_id} ({record.name}) failed:\n{message[3]}")
+                self._finish(record, FAILURE, error=message[2])
+
+    def _lost(self, worker: _Worker) -> None:
+        with self._lock:
+            job_id = worker.job_id
+            self._kill(worker)
+            record = self._jobs.get(job_id) if job_id else None
+            if record is not None and record.state not in READY_STATES:
+                logger.error(f"Worker running job {job_id} ({record.name}) exited unexpectedly")
+                self._finish(record, FAILURE, error="WorkerLostError: worker process exited")
+
+    def _enforce_time_limits(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for worker in list(self._workers):
+                if worker.job_id is None:
+                    continue
+                record = self._jobs[worker.job_id]
+                if record.state == REVOKED:
+                    self._kill(worker)
+                    continue
+                if now < worker.deadline:
+                    continue
+                logger.warning(f"Job {record.job_id} ({record.name}) exceeded {record.time_limit}s; killing worker")
+                self._kill(worker)
+                self._finish(record, FAILURE, error=f"TimeLimitExceeded({record.time_limit})")
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._dispatch()
+                with self._lock:
+                    busy = {w.conn: w for w in self._workers if w.job_id is not None}
+                    deadlines = [w.deadline for w in busy.values()]
+                    if self._claims:
+                        deadlines.append(self._revokes_checked_at + REVOKE_POLL_INTERVAL)
+                timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else PRUNE_INTERVAL
+                for conn in wait([self._wake_recv, *busy], timeout):
+                    if conn is self._wake_recv:
+                        while self._wake_recv.poll():
+                            self._wake_recv.recv()
+                        continue
+                    try:
+                        message = conn.recv()
+                    except (EOFError, OSError):
+                        self._lost(busy[conn])
+                        continue
+                    self._handle(busy[conn], message)
+                if time.monotonic() - self._revokes_checked_at >= REVOKE_POLL_INTERVAL:
+                    self._apply_revokes()
+                self._enforce_time_limits()
+                if time.monotonic() - self._pruned_at > PRUNE_INTERVAL:
+                    self.prune()
+            except Exception:
+                logger.exception("Job dispatcher error")
+                time.sleep(1)
+
+    # Lifecycle
+
+    def recover(self) -> int:
+        """
+        Queue jobs left pending or running by processes that have exited;
+        returns how many.
+
+        Each unfinished record is claimed first and read again once claimed,
+        so jobs owned by a live engine are skipped and a job is never taken
+        over by two recovering engines.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        requeued = 0
+        with self._lock:
+            for filename in names:
+                if not filename.endswith(".json"):
+                    continue
+                job_id = filename[:-5]
+                if job_id in self._jobs or not _JOB_ID.match(job_id):
+                    continue
+                record = self._load(job_id)
+                if record is None:
+                    continue
+                if record.state not in READY_STATES:
+                    if not self._claim(job_id):
+                        continue
+                    # The previous owner may have finished it before exiting
+                    record = self._load(job_id)
+                    if record is None:
+                        self._release(job_id)
+                        continue
+                    if record.state in READY_STATES:
+                        self._release(job_id)
+                self._jobs[record.job_id] = record
+                if record.state in READY_STATES:
+                    continue
+                if record.state != PENDING and record.attempts >= MAX_ATTEMPTS:
+                    self._finish(record, FAILURE, error="WorkerLostError: interrupted too many times")
+                    continue
+                record.state = PENDING
+                record.info = None
+                self._save(record)
+                heapq.heappush(self._queue, (record.priority, next(self._sequence), record.job_id))
+                requeued += 1
+        # Revoke requests the previous owner did not get to
+        self._apply_revokes()
+        if requeued:
+            logger.info(f"Requeued {requeued} unfinished jobs")
+        return requeued
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Forget finished jobs older than ``JOB_RESULT_EXPIRES``; returns how many."""
+        now = now or time.time()
+        self._pruned_at = time.monotonic()
+        removed = 0
+        with self._lock:
+            for job_id, record in list(self._jobs.items()):
+                if record.state in READY_STATES and now - (record.finished_at or 0) > self.result_expires:
+                    del self._jobs[job_id]
+                    for path in (
+                        self._path(job_id),
+                        self._revoke_path(job_id),
+                        os.path.join(self.directory, job_id + ".lock"),
+                    ):
+                        try:
+                            os.remove(path)
+                        except FileNotFoundError:
+                            pass
+                    removed += 1
+        return removed
+
+    async def start(self) -> None:
+        """Recover persisted jobs and start dispatching."""
+        if self._thread is not None:
+            return
+        await asyncio.to_thread(self.recover)
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="job-dispatcher", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        """
+        Stop dispatching and shut the workers down.
+
+        Running jobs keep their ``STARTED`` record and run again on the next
+        start; unfinished jobs are released so any engine's recovery can
+        take them over.
+        """
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wake()
+        await asyncio.to_thread(self._thread.join)
+        self._thread = None
+        with self._lock:
+            for worker in list(self._workers):
+                if worker.job_id is None:
+                    try:
+                        worker.conn.send(None)
+                    except (OSError, ValueError):
+                        pass
+                    worker.process.join(1)
+                self._kill(worker)
+            self._queue.clear()
+            for job_id, record in list(self._jobs.items()):
+                if record.state not in READY_STATES:
+                    del self._jobs[job_id]
+                    self._release(job_id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            states: Dict[str, int] = {}
+            for record in self._jobs.values():
+                states[record.state] = states.get(record.state, 0) + 1
+            return {
+                "workers": len(self._workers),
+                "busy": sum(1 for w in self._workers if w.job_id is not None),
+                "queued": states.get(PENDING, 0),
+                **{state.lower(): count for state, count in states.items() if state != PENDING},
+            }
+
+
+# Shared engine; task modules register with it
+job_engine = JobEngine()
@@ -0,0 +1,355 @@
+"""
+Multi-core frame decoding and analysis.
+
+Frame analysis is CPU-bound, and pickling decoded frames between processes
+costs more than analysing them. The pool therefore owns one
+``multiprocessing.shared_memory`` block split into fixed slots (the ring);
+each slot holds up to ``FRAME_POOL_MAX_FRAMES`` downsampled luma frames.
+A worker process decodes a chunk file straight into a free slot, runs the
+analysis there, and sends back only a descriptor (slot, frame count,
+analysis result). The coordinator maps the slot as a NumPy view without
+copying.
+
+A slot is only handed to a worker when it is free, so in-flight frame
+memory never exceeds ``slots * slot_bytes`` however many chunks are queued.
+Chunks are scheduled round-robin across cameras, so all feeds advance
+together.
+
+``.npy`` chunk files (pre-decoded ``(N, H, W[, 3])`` frame dumps) are read
+directly; anything else is decoded with ffmpeg at ``FRAME_ANALYSIS_FPS`` and
+scaled to ``FRAME_ANALYSIS_WIDTH`` x ``FRAME_ANALYSIS_HEIGHT``.
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.quality_service import ChunkQuality, QualityEngine, quality_engine, to_luma
+
+logger = logging.getLogger(__name__)
+
+# Analysis run in the worker on each decoded chunk: (camera_id, chunk, frames) -> picklable result
+Analyzer = Callable[[str, int, np.ndarray], Any]
+Job = Tuple[str, int, str]
+
+# A chunk in flight when this many worker crashes happened is reported as failed
+MAX_CRASHES = 2
+
+
+class FrameRing:
+    """Fixed-size frame slots in one shared memory block."""
+
+    def __init__(self, slots: int, frame_shape: Tuple[int, int], max_frames: int, name: Optional[str] = None):
+        self.slots = slots
+        self.slot_shape = (max_frames, *frame_shape)
+        self.slot_bytes = int(np.prod(self.slot_shape))
+        if name is None:
+            self.memory = SharedMemory(create=True, size=slots * self.slot_bytes)
+            self.owner = True
+        else:
+            self.memory = SharedMemory(name=name)
+            self.owner = False
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def slot(self, index: int) -> np.ndarray:
+        """Writable ``(max_frames, H, W)`` uint8 view of a slot."""
+        return np.ndarray(self.slot_shape, dtype=np.uint8, buffer=self.memory.buf, offset=index * self.slot_bytes)
+
+    def close(self) -> None:
+        try:
+            self.memory.close()
+        except BufferError:
+            # A consumer still holds a frame view; the mapping goes with it
+            logger.warning("Frame ring closed while frames were still referenced")
+        if self.owner:
+            self.memory.unlink()
+
+
+class ChunkDescriptor:
+    """What a worker sends back instead of the frames."""
+
+    __slots__ = ("slot", "camera_id", "chunk", "path", "frames", "truncated", "result", "error")
+
+    def __init__(self, slot: int, camera_id: str, chunk: int, path: str):
+        self.slot = slot
+        self.camera_id = camera_id
+        self.chunk = chunk
+        self.path = path
+        self.frames = 0
+        self.truncated = False
+        self.result: Any = None
+        self.error: Optional[str] = None
+
+
+class DecodedChunk:
+    """A finished chunk; ``frames`` is a read-only view into the ring."""
+
+    __slots__ = ("camera_id", "chunk", "path", "frames", "truncated", "result", "error")
+
+    def __init__(self, descriptor: ChunkDescriptor, frames: np.ndarray):
+        self.camera_id = descriptor.camera_id
+        self.chunk = descriptor.chunk
+        self.path = descriptor.path
+        self.frames = frames
+        self.truncated = descriptor.truncated
+        self.result = descriptor.result
+        self.error = descriptor.error
+
+
+def score_quality(camera_id: str, chunk: int, frames: np.ndarray) -> ChunkQuality:
+    """
+    Default analyzer: frame quality metrics for camera weighting.
+
+    Chunks are scored independently; the first frame's motion against the
+    prior chunk is filled in when the results meet in ``QualityEngine.store``.
+    """
+    return ChunkQuality(camera_id, chunk, frames)
+
+
+def decode_into(path: str, out: np.ndarray, fps: float, ffmpeg: Optional[str] = None) -> Tuple[int, bool]:
+    """
+    Decode a chunk's frames into ``out`` (``(max_frames, H, W)`` uint8).
+
+    Returns:
+        ``(frames, truncated)``; ``truncated`` when the chunk had more
+        frames than fit
+    """
+    max_frames, height, width = out.shape
+    if path.endswith(".npy"):
+        source = np.load(path, mmap_mode="r")
+        if source.shape[1:3] != (height, width):
+            raise ValueError(f"frames are {source.shape[1:3]}, pool expects {(height, width)}")
+        count = min(len(source), max_frames)
+        out[:count] = to_luma(source[:count])
+        return count, len(source) > max_frames
+
+    ffmpeg = ffmpeg or settings.FFMPEG_BINARY or shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg is required to decode video chunks")
+    process = subprocess.Popen(
+        [ffmpeg, "-nostdin", "-v", "error", "-i", path, "-an",
+         "-vf", f"fps={fps},scale={width}:{height}", "-pix_fmt", "gray", "-f", "rawvideo", "-"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    buffer = memoryview(out.reshape(-1))
+    filled = 0
+    try:
+        while filled < len(buffer):
+            n = process.stdout.readinto(buffer[filled:])
+            if not n:
+                break
+            filled += n
+        truncated = filled == len(buffer) and bool(process.stdout.read(1))
+    finally:
+        if process.poll() is None:
+            process.kill()
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        returncode = process.wait()
+    if returncode not in (0, -9) and not filled:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+    return filled // (height * width), truncated
+
+
+# Worker process state
+_ring: Optional[FrameRing] = None
+
+
+def _init_worker(name: str, slots: int, frame_shape: Tuple[int, int], max_frames: int) -> None:
+    global _ring
+    _ring = FrameRing(slots, frame_shape, max_frames, name=name)
+
+
+def _process_chunk(
+    slot: int,
+    camera_id: str,
+    chunk: int,
+    path: str,
+    fps: float,
+    analyze: Optional[Analyzer]
+) -> ChunkDescriptor:
+    descriptor = ChunkDescriptor(slot, camera_id, chunk, path)
+    try:
+        out = _ring.slot(slot)
+        descriptor.frames, descriptor.truncated = decode_into(path, out, fps)
+        if analyze is not None and descriptor.frames:
+            descriptor.result = analyze(camera_id, chunk, out[:descriptor.frames])
+    except Exception as e:
+        descriptor.error = f"{type(e).__name__}: {e}"
+    return descriptor
+
+
+def interleave(jobs: Iterable[Tuple[str, int, str]]) -> Iterator[Tuple[str, int, str]]:
+    """Order ``(camera_id, chunk, path)`` jobs round-robin across cameras, by chunk within each."""
+    cameras: Dict[str, List[Tuple[str, int, str]]] = OrderedDict()
+    for job in jobs:
+        cameras.setdefault(job[0], []).append(job)
+    queues = deque(deque(sorted(camera_jobs, key=lambda job: job[1])) for camera_jobs in cameras.values())
+    while queues:
+        queue = queues.popleft()
+        yield queue.popleft()
+        if queue:
+            queues.append(queue)
+
+
+class FramePool:
+    """Worker processes decoding and analysing chunks into a shared ring."""
+
+    def __init__(
+        self,
+        workers: int = settings.FRAME_POOL_WORKERS,
+        slots: Optional[int] = None,
+        width: int = settings.FRAME_ANALYSIS_WIDTH,
+        height: int = settings.FRAME_ANALYSIS_HEIGHT,
+        max_frames: int = settings.FRAME_POOL_MAX_FRAMES,
+        fps: float = settings.FRAME_ANALYSIS_FPS,
+        engine: QualityEngine = quality_engine
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        # One slot per busy worker, one held by the consumer, one spare
+        self.slots = slots or self.workers + 2
+        self.frame_shape = (height, width)
+        self.max_frames = max_frames
+        self.fps = fps
+        self.engine = engine
+        self.ring: Optional[FrameRing] = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.slots * self.max_frames * self.frame_shape[0] * self.frame_shape[1]
+
+    def start(self) -> None:
+        if self.executor is not None:
+            return
+        self.ring = FrameRing(self.slots, self.frame_shape, self.max_frames)
+        self._spawn()
+
+    def _spawn(self) -> None:
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.ring.name, self.slots, self.frame_shape, self.max_frames),
+        )
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def __enter__(self) -> "FramePool":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def map(
+        self,
+        jobs: Iterable[Job],
+        analyze: Optional[Analyzer] = score_quality
+    ) -> Iterator[DecodedChunk]:
+        """
+        Decode and analyse ``(camera_id, chunk, path)`` jobs, yielding chunks as they finish.
+
+        A yielded chunk's ``frames`` stay valid until the next item is
+        requested; copy them to keep them longer. Quality results are also
+        stored in the quality engine cache. Chunks that fail carry ``error``
+        and no frames.
+
+        A crashed worker takes the whole process pool down; the pool is
+        restarted and the chunks that were in flight are retried one at a
+        time, failing after ``MAX_CRASHES`` crashes. When the generator
+        finishes or is closed early, queued chunks are cancelled and running
+        ones awaited so no worker still writes into the ring; a pool started
+        by ``map`` itself is closed.
+        """
+        owned = self.executor is None
+        self.start()
+        pending = interleave(jobs)
+        retries: Deque[Job] = deque()
+        crashes: Dict[Job, int] = {}
+        free = deque(range(self.slots))
+        running: Dict[Future, Tuple[int, Job]] = {}
+
+        try:
+            while True:
+                # Keep a slot back for the chunk the consumer is holding
+                while len(free) > 1 or (free and not running):
+                    if retries or any(job in crashes for _, job in running.values()):
+                        # Chunks are retried one at a time, so a second crash names its chunk
+                        if running:
+                            break
+                        job = retries.popleft()
+                    else:
+                        job = next(pending, None)
+                    if job is None:
+                        break
+                    slot = free.popleft()
+                    future = self.executor.submit(_process_chunk, slot, *job, self.fps, analyze)
+                    running[future] = (slot, job)
+                if not running:
+                    return
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                broken = any(isinstance(future.exception(), BrokenProcessPool) for future in done)
+                if broken:
+                    # Every chunk still running went down with the pool
+                    done, _ = wait(running)
+                    self.executor.shutdown(wait=True)
+                    self._spawn()
+
+                for future in done:
+                    slot, job = running.pop(future)
+                    error = future.exception()
+                    if isinstance(error, BrokenProcessPool):
+                        crashes[job] = crashes.get(job, 0) + 1
+                        if crashes[job] < MAX_CRASHES:
+                            logger.warning(f"Frame pool worker crashed; retrying {job[2]}")
+                            retries.append(job)
+                            free.append(slot)
+                            continue
+                    if error is not None:
+                        descriptor = ChunkDescriptor(slot, *job)
+                        descriptor.error = f"{type(error).__name__}: {error}"
+                    else:
+                        descriptor = future.result()
+                    if descriptor.error is not None:
+                        logger.error(f"Frame analysis of {descriptor.path} failed: {descriptor.error}")
+                    elif descriptor.truncated:
+                        logger.warning(f"{descriptor.path} has more than {self.max_frames} frames; analysed the first ones")
+                    if isinstance(descriptor.result, ChunkQuality):
+                        self.engine.store(descriptor.result)
+
+                    frames = self.ring.slot(slot)[:descriptor.frames]
+                    frames.flags.writeable = False
+                    try:
+                        yield DecodedChunk(descriptor, frames)
+                    finally:
+                        del frames
+                        free.append(slot)
+        finally:
+            for future in running:
+                future.cancel()
+            wait(running)
+            if owned:
+                self.close()
@@ -0,0 +1,676 @@
+"""
+Video compilation tasks.
+
+Stage 5 of ``docs/research/video_processing_pipeline.md`` renders the
+camera-switch edit decision list into one game video. Re-encoding the whole
+game costs about as much CPU time as the game is long, so the compiler only
+encodes what a cut forces it to:
+
+- Each shot maps to its camera's own timeline (EDL time minus the camera's
+  audio sync offset).
+- The span between the first and the last keyframe inside the shot is
+  stream-copied: the concat list points ffmpeg at the source file with an
+  ``inpoint``/``outpoint`` on those keyframes, so those packets are never
+  decoded nor written to an intermediate file.
+- Only the head (cut to first keyframe) and tail (last keyframe to cut) are
+  re-encoded, with the program's codec, resolution, pixel format and
+  profile, and no B-frames so their timestamps join the copied spans
+  cleanly. A cut within ``KEYFRAME_TOLERANCE`` of a keyframe snaps to it.
+- A shot without a whole GOP inside, or from a camera whose format differs
+  from the program's (the first shot's camera), is encoded whole. The
+  format covers codec, resolution, pixel format and profile, plus the audio
+  codec, sample rate and channel count when the program has audio.
+
+All pieces are then joined by one ffmpeg concat pass with ``-c copy`` into
+``{VIDEO_STORAGE_DIR}/{video_id}.mp4``. Every phone's encoder and every
+re-encoded piece has its own SPS/PPS. An MP4 sample entry holds only one
+set, so the parameter sets travel in-band before each keyframe, and the
+output uses the ``avc3``/``hev1`` sample entries that allow this. For H.264
+the concat demuxer converts each piece to Annex-B with its own parameter
+sets. HEVC has no such per-file conversion, so its pieces, copied spans
+included, are first written through ``hevc_mp4toannexb`` to ``hev1`` MP4
+files that carry their parameter sets in-band. With a 2-second GOP a cut costs at
+most about 4 seconds of encoding, so compile time follows file size rather
+than game length. With a remote ``STORAGE_BACKEND`` the job then uploads
+the result (``file_storage``) before it completes.
+
+Keyframes of MP4/MOV recordings come from their sample tables
+(``media_probe``); other containers are listed with ``ffprobe`` when it is
+installed and otherwise with an ffmpeg ``framecrc`` pass over the packets.
+None of these decodes any frames.
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.exceptions import InvalidVideoFormatException, ValidationException, VideoProcessingException
+from app.utils.camera_switching import EditDecisionList
+from app.utils.file_storage import file_storage
+from app.utils.media_probe import MediaInfo, media_probe
+from app.workers.engine import PRIORITY_COMPILATION, PRIORITY_LIVE_PREVIEW, job_engine
+
+logger = logging.getLogger(__name__)
+
+# A cut this close to a keyframe (seconds) is moved onto it instead of encoding
+KEYFRAME_TOLERANCE = 0.01
+# Pieces shorter than this (seconds) are dropped
+MIN_PIECE_SECONDS = 0.001
+# Copied spans stop this far (seconds) before the next keyframe's dts
+OUTPOINT_MARGIN = 0.001
+# Encoders for program codecs; other codecs are compiled to H.264
+ENCODERS = {"h264": "libx264", "hevc": "libx265"}
+# Sample entries that allow parameter sets in-band (they change between pieces)
+SAMPLE_ENTRIES = {"h264": "avc3", "hevc": "hev1"}
+# Codecs the concat demuxer does not convert to Annex-B per file; their pieces
+# are staged through these bitstream filters first
+ANNEXB_FILTERS = {"hevc": "hevc_mp4toannexb"}
+# Encoder options repeating the parameter sets before every keyframe
+IN_BAND_OPTIONS = {"hevc": ["-x265-params", "repeat-headers=1"]}
+# Encoders for program audio codecs; other codecs are compiled to AAC
+AUDIO_ENCODERS = {"aac": "aac"}
+# framecrc channel layout names
+CHANNEL_LAYOUTS = {"mono": 1, "stereo": 2}
+ENCODE_PRESET = "veryfast"
+ENCODE_CRF = 18
+# Concurrent encodes (each ffmpeg is itself multi-threaded)
+ENCODE_WORKERS = 4
+# Cached source probes, keyed by path, size and mtime
+PROBE_CACHE_SIZE = 64
+
+COPY = "copy"
+ENCODE = "encode"
+
+_VIDEO_ID = re.compile(r"^[0-9A-Za-z_-]{1,64}$")
+
+
+class SourceInfo:
+    """Stream parameters and keyframe times (seconds from the start) of one recording."""
+
+    __slots__ = (
+        "path", "duration", "start_time", "keyframes", "reorder_delay", "codec", "width", "height", "pix_fmt",
+        "profile", "audio", "audio_codec", "sample_rate", "channels",
+    )
+
+    def __init__(
+        self,
+        path: str,
+        duration: float,
+        keyframes: List[float],
+        codec: str,
+        width: int,
+        height: int,
+        pix_fmt: Optional[str] = None,
+        profile: Optional[str] = None,
+        audio: bool = False,
+        sample_rate: Optional[int] = None,
+        channels: Optional[int] = None,
+        start_time: float = 0.0,
+        reorder_delay: float = 0.0,
+        audio_codec: Optional[str] = None
+    ):
+        self.path = path
+        self.duration = duration
+        self.start_time = start_time
+        self.keyframes = sorted(keyframes)
+        # Keyframe pts minus dts (B-frames); concat outpoints compare dts
+        self.reorder_delay = reorder_delay
+        self.codec = codec
+        self.width = width
+        self.height = height
+        self.pix_fmt = pix_fmt
+        self.profile = profile
+        self.audio = audio
+        self.audio_codec = audio_codec
+        self.sample_rate = sample_rate
+        self.channels = channels
+
+    def compatible(self, program: "SourceInfo", audio: bool = False) -> bool:
+        """Whether packets of this source (and its audio, with ``audio``) can be copied into the program."""
+        return (
+            self.codec == program.codec
+            and (self.width, self.height) == (program.width, program.height)
+            and (self.pix_fmt is None or program.pix_fmt is None or self.pix_fmt == program.pix_fmt)
+            and (self.profile is None or program.profile is None or self.profile == program.profile)
+            and (not audio or (
+                self.audio_codec == program.audio_codec
+                and (self.sample_rate, self.channels) == (program.sample_rate, program.channels)
+            ))
+        )
+
+    def keyframe_span(self, start: float, end: float, tolerance: float = KEYFRAME_TOLERANCE) -> Optional[Tuple[float, float]]:
+        """First and last keyframe within ``[start, end]`` (with tolerance), if they differ."""
+        first = bisect_left(self.keyframes, start - tolerance)
+        last = bisect_right(self.keyframes, end + tolerance) - 1
+        if first >= last:
+            return None
+        return self.keyframes[first], self.keyframes[last]
+
+
+class Piece:
+    """A span of one source in the program, stream-copied or encoded."""
+
+    __slots__ = ("camera_id", "path", "start", "end", "mode", "output")
+
+    def __init__(self, camera_id: str, path: str, start: float, end: float, mode: str):
+        self.camera_id = camera_id
+        self.path = path
+        self.start = start
+        self.end = end
+        self.mode = mode
+        # Encoded file, once written
+        self.output: Optional[str] = None
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "camera_id": self.camera_id,
+            "start": round(self.start, 3),
+            "end": round(self.end, 3),
+            "mode": self.mode,
+        }
+
+
+class CompilePlan:
+    """Pieces of a program in order, with the format encoded pieces must match."""
+
+    def __init__(self, pieces: List[Piece], program: SourceInfo, sources: Dict[str, SourceInfo], audio: bool):
+        self.pieces = pieces
+        self.sources = sources
+        self.program = program
+        self.audio = audio
+
+    @property
+    def encoded(self) -> List[Piece]:
+        return [piece for piece in self.pieces if piece.mode == ENCODE]
+
+    @property
+    def duration(self) -> float:
+        return sum(piece.duration for piece in self.pieces)
+
+    @property
+    def copied_seconds(self) -> float:
+        return sum(piece.duration for piece in self.pieces if piece.mode == COPY)
+
+    @property
+    def encoded_seconds(self) -> float:
+        return sum(piece.duration for piece in self.encoded)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "pieces": len(self.pieces),
+            "encoded_pieces": len(self.encoded),
+            "duration": round(self.duration, 3),
+            "copied_seconds": round(self.copied_seconds, 3),
+            "encoded_seconds": round(self.encoded_seconds, 3),
+            "codec": self.program.codec,
+            "resolution": f"{self.program.width}x{self.program.height}",
+            "audio": self.audio,
+        }
+
+
+def _run(args: List[str], what: str, timeout: Optional[float] = None) -> str:
+    """Run ffmpeg/ffprobe and return stdout; raises ``VideoProcessingException``."""
+    try:
+        completed = subprocess.run(args, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise VideoProcessingException(what, f"{os.path.basename(args[0])} timed out")
+    if completed.returncode != 0:
+        raise VideoProcessingException(what, completed.stderr.decode(errors="replace").strip()[-500:])
+    return completed.stdout.decode(errors="replace")
+
+
+def _probe_ffprobe(path: str, ffprobe: str) -> SourceInfo:
+    data = json.loads(_run(
+        [ffprobe, "-v", "error", "-show_entries",
+         "stream=codec_type,codec_name,width,height,pix_fmt,profile,sample_rate,channels:format=duration,start_time",
+         "-of", "json", path],
+        path,
+    ))
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+    if video is None:
+        raise VideoProcessingException(path, "no video stream")
+    start_time = float(data.get("format", {}).get("start_time") or 0.0)
+
+    keyframes = []
+    reorder_delay = 0.0
+    packets = _run(
+        [ffprobe, "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,dts_time,flags",
+         "-of", "csv=p=0", path],
+        path,
+    )
+    for line in packets.splitlines():
+        fields = line.split(",")
+        if len(fields) < 3 or not fields[2].startswith("K") or fields[0] in ("", "N/A"):
+            continue
+        keyframes.append(float(fields[0]) - start_time)
+        if fields[1] not in ("", "N/A"):
+            reorder_delay = max(reorder_delay, float(fields[0]) - float(fields[1]))
+
+    return SourceInfo(
+        path,
+        float(data.get("format", {}).get("duration") or 0.0),
+        keyframes,
+        video.get("codec_name", ""),
+        int(video.get("width", 0)),
+        int(video.get("height", 0)),
+        pix_fmt=video.get("pix_fmt"),
+        profile=video.get("profile"),
+        audio=audio is not None,
+        sample_rate=int(audio["sample_rate"]) if audio and audio.get("sample_rate") else None,
+        channels=audio.get("channels") if audio else None,
+        start_time=start_time,
+        reorder_delay=reorder_delay,
+        audio_codec=audio.get("codec_name") if audio else None,
+    )
+
+
+def _from_media_info(path: str, media: MediaInfo) -> SourceInfo:
+    video, audio = media.video, media.audio
+    return SourceInfo(
+        path,
+        media.duration,
+        video.keyframes,
+        video.codec,
+        video.width,
+        video.height,
+        profile=video.profile,
+        audio=audio is not None,
+        sample_rate=audio.sample_rate if audio else None,
+        channels=audio.channels if audio else None,
+        reorder_delay=video.reorder_delay,
+        audio_codec=audio.codec if audio else None,
+    )
+
+
+def _probe_framecrc(path: str, ffmpeg: str) -> SourceInfo:
+    """Packet listing through ffmpeg's ``framecrc`` muxer when ffprobe is missing."""
+    output = _run([ffmpeg, "-nostdin", "-v", "error", "-i", path, "-map", "0:v:0", "-map", "0:a:0?",
+                   "-c", "copy", "-f", "framecrc", "-"], path)
+    time_bases: Dict[int, float] = {}
+    media: Dict[int, str] = {}
+    codec: Dict[int, str] = {}
+    width = height = 0
+    sample_rate = channels = None
+    keyframes = []
+    reorder_delay = 0.0
+    duration = 0.0
+    for line in output.splitlines():
+        if line.startswith("#"):
+            key, _, value = line[1:].partition(":")
+            name, _, index = key.partition(" ")
+            if not index.isdigit():
+                continue
+            value = value.strip()
+            if name == "tb":
+                num, _, den = value.partition("/")
+                time_bases[int(index)] = int(num) / int(den)
+            elif name == "media_type":
+                media[int(index)] = value
+            elif name == "codec_id":
+                codec[int(index)] = value
+            elif name == "dimensions" and index == "0":
+                width, height = (int(v) for v in value.split("x"))
+            elif name == "sample_rate" and index == "1":
+                sample_rate = int(value)
+            elif name == "channel_layout_name" and index == "1":
+                channels = CHANNEL_LAYOUTS.get(value)
+            continue
+        fields = [field.strip() for field in line.split(",")]
+        if len(fields) < 6:
+            continue
+        index = int(fields[0])
+        time_base = time_bases.get(index, 0.0)
+        pts = int(fields[2]) * time_base
+        duration = max(duration, pts + int(fields[3]) * time_base)
+        flags = int(fields[6].split("=")[1], 16) if len(fields) > 6 and fields[6].startswith("F=") else 1
+        if index == 0 and flags & 1:
+            keyframes.append(pts)
+            reorder_delay = max(reorder_delay, pts - int(fields[1]) * time_base)
+
+    audio = media.get(1) == "audio"
+    return SourceInfo(
+        path, duration, keyframes, codec.get(0, ""), width, height, audio=audio,
+        sample_rate=sample_rate if audio else None, channels=channels if audio else None,
+        reorder_delay=reorder_delay, audio_codec=codec.get(1) if audio else None,
+    )
+
+
+class VideoCompiler:
+    """Plans and renders programs from edit decision lists."""
+
+    def __init__(
+        self,
+        ffmpeg: Optional[str] = settings.FFMPEG_BINARY,
+        output_dir: str = settings.VIDEO_STORAGE_DIR,
+        work_dir: str = os.path.join(settings.TEMP_UPLOAD_DIR, "compile"),
+        workers: int = ENCODE_WORKERS,
+        tolerance: float = KEYFRAME_TOLERANCE
+    ):
+        self.ffmpeg = ffmpeg or shutil.which("ffmpeg")
+        ffprobe = os.path.join(os.path.dirname(self.ffmpeg), "ffprobe") if self.ffmpeg else None
+        self.ffprobe = ffprobe if ffprobe and os.path.exists(ffprobe) else shutil.which("ffprobe")
+        self.output_dir = output_dir
+        self.work_dir = work_dir
+        self.workers = workers
+        self.tolerance = tolerance
+        self._probes: "OrderedDict[Tuple[str, int, int], SourceInfo]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def probe(self, path: str) -> SourceInfo:
+        """Stream parameters and keyframes of a recording (cached until the file changes)."""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            if key in self._probes:
+                self._probes.move_to_end(key)
+                return self._probes[key]
+
+        try:
+            info = _from_media_info(path, media_probe.probe(path, limit_size=False))
+        except InvalidVideoFormatException:
+            # Not a readable MP4/MOV: list the packets instead
+            if self.ffprobe:
+                info = _probe_ffprobe(path, self.ffprobe)
+            elif self.ffmpeg:
+                info = _probe_framecrc(path, self.ffmpeg)
+            else:
+                raise VideoProcessingException(path, "ffmpeg is required to compile videos")
+
+        with self._lock:
+            self._probes[key] = info
+            while len(self._probes) > PROBE_CACHE_SIZE:
+                self._probes.popitem(last=False)
+        return info
+
+    def plan(
+        self,
+        edl: EditDecisionList,
+        sources: Dict[str, SourceInfo],
+        offsets: Optional[Dict[str, float]] = None
+    ) -> CompilePlan:
+        """
+        Split every shot into copied and encoded pieces.
+
+        Args:
+            edl: Shots on the reference timeline
+            sources: Probed recording of every camera in the EDL
+            offsets: Audio sync offset per camera (camera time + offset =
+                reference time); missing cameras count as 0
+
+        Raises:
+            ValidationException: The EDL is empty or names a camera
+                without a source
+        """
+        offsets = offsets or {}
+        if not edl.shots:
+            raise ValidationException("edl", "edit decision list has no shots")
+        missing = sorted({shot.camera_id for shot in edl.shots} - set(sources))
+        if missing:
+            raise ValidationException("sources", f"no recording for cameras: {', '.join(missing)}")
+
+        program = sources[edl.shots[0].camera_id]
+        audio = all(sources[camera_id].audio for camera_id in {shot.camera_id for shot in edl.shots})
+        if program.codec not in ENCODERS:
+            logger.warning(f"No encoder for {program.codec}; compiling {edl.shots[0].camera_id} to h264")
+            program = SourceInfo(
+                program.path, program.duration, [], "h264", program.width, program.height, "yuv420p", None,
+                program.audio, program.sample_rate, program.channels, audio_codec=program.audio_codec,
+            )
+        if audio and program.audio_codec not in AUDIO_ENCODERS:
+            logger.warning(f"No encoder for {program.audio_codec} audio; compiling the program's audio to aac")
+            program = SourceInfo(
+                program.path, program.duration, program.keyframes, program.codec, program.width, program.height,
+                program.pix_fmt, program.profile, program.audio, program.sample_rate, program.channels,
+                audio_codec="aac",
+            )
+
+        pieces: List[Piece] = []
+        for shot in edl.shots:
+            source = sources[shot.camera_id]
+            offset = offsets.get(shot.camera_id, 0.0)
+            start = max(0.0, shot.start - offset)
+            end = min(source.duration, shot.end - offset)
+            if end - start < shot.duration - self.tolerance:
+                logger.warning(
+                    f"{shot.camera_id} has footage for {max(0.0, end - start):.2f}s "
+                    f"of its {shot.duration:.2f}s shot at {shot.start:.2f}s"
+                )
+            if end - start < MIN_PIECE_SECONDS:
+                continue
+
+            span = source.keyframe_span(start, end, self.tolerance) if source.compatible(program, audio) else None
+            if span is None:
+                pieces.append(Piece(shot.camera_id, source.path, start, end, ENCODE))
+                continue
+            first, last = span
+            if first - start > self.tolerance:
+                pieces.append(Piece(shot.camera_id, source.path, start, first, ENCODE))
+            pieces.append(Piece(shot.camera_id, source.path, first, last, COPY))
+            if end - last > self.tolerance:
+                pieces.append(Piece(shot.camera_id, source.path, last, end, ENCODE))
+
+        return CompilePlan(pieces, program, sources, audio)
+
+    def compile(
+        self,
+        video_id: str,
+        edl: EditDecisionList,
+        paths: Dict[str, str],
+        offsets: Optional[Dict[str, float]] = None,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[str, Any]:
+        """
+        Render an EDL to ``{output_dir}/{video_id}.mp4``.
+
+        Args:
+            video_id: Output name
+            edl: Shots on the reference timeline
+            paths: Recording of every camera in the EDL
+            offsets: Audio sync offset per camera
+            progress: Called with ``(done, total)`` as pieces are encoded
+                (or staged)
+
+        Returns:
+            Plan statistics plus ``path``, ``size`` and ``seconds``
+
+        Raises:
+            VideoProcessingException: ffmpeg is missing or fails
+        """
+        if not _VIDEO_ID.match(video_id):
+            raise ValidationException("video_id", "invalid video id", video_id)
+        if not self.ffmpeg:
+            raise VideoProcessingException(video_id, "ffmpeg is required to compile videos")
+        started = time.monotonic()
+
+        cameras = {shot.camera_id for shot in edl.shots}
+        missing = sorted(cameras - set(paths))
+        if missing:
+            raise ValidationException("sources", f"no recording for cameras: {', '.join(missing)}")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            infos = dict(zip(cameras, executor.map(lambda camera_id: self.probe(paths[camera_id]), cameras)))
+        plan = self.plan(edl, infos, offsets)
+
+        os.makedirs(self.work_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        work = tempfile.mkdtemp(prefix=f"{video_id}-", dir=self.work_dir)
+        try:
+            # Pieces written to the work directory before the concat
+            staged = plan.encoded if plan.program.codec not in ANNEXB_FILTERS else plan.pieces
+            total = len(staged) + 1
+            for index, piece in enumerate(staged):
+                piece.output = os.path.join(work, f"piece{index:05d}.mp4")
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                for done, _ in enumerate(executor.map(lambda piece: self._stage(video_id, piece, plan), staged), 1):
+                    if progress is not None:
+                        progress(done, total)
+
+            target = os.path.join(self.output_dir, f"{video_id}.mp4")
+            self._concat(video_id, plan, os.path.join(work, "pieces.ffconcat"), target)
+            if progress is not None:
+                progress(total, total)
+        finally:
+            shutil.rmtree(work, ignore_errors=True)
+
+        result = plan.to_dict()
+        result.update({
+            "video_id": video_id,
+            "path": target,
+            "size": os.path.getsize(target),
+            "seconds": round(time.monotonic() - started, 3),
+        })
+        logger.info(
+            f"Compiled {video_id}: {result['copied_seconds']}s copied, {result['encoded_seconds']}s encoded "
+            f"in {result['seconds']}s"
+        )
+        return result
+
+    def _stage(self, video_id: str, piece: Piece, plan: CompilePlan) -> None:
+        if piece.mode == ENCODE:
+            self._encode(video_id, piece, plan)
+            return
+        # A copied span remuxed on its own, so the filter sees its source's
+        # parameter sets. -copyts keeps the video at the inpoint; the audio
+        # packet straddling it starts earlier instead of shifting the video.
+        list_path = piece.output + ".ffconcat"
+        with open(list_path, "w") as f:
+            f.write("\n".join(["ffconcat version 1.0", *self._copy_entry(piece, plan)]) + "\n")
+        codec = plan.program.codec
+        _run(
+            [self.ffmpeg, "-nostdin", "-v", "error", "-y", "-copyts", "-f", "concat", "-safe", "0", "-i", list_path,
+             "-map", "0:v:0", *(["-map", "0:a:0"] if plan.audio else []), "-c", "copy",
+             "-bsf:v", ANNEXB_FILTERS[codec], "-tag:v", SAMPLE_ENTRIES[codec], "-f", "mp4", piece.output],
+            video_id,
+            timeout=settings.VIDEO_COMPILATION_TIMEOUT,
+        )
+
+    def _encode(self, video_id: str, piece: Piece, plan: CompilePlan) -> None:
+        program = plan.program
+        args = [
+            self.ffmpeg, "-nostdin", "-v", "error", "-y",
+            "-ss", f"{piece.start:.6f}", "-i", piece.path, "-t", f"{piece.duration:.6f}",
+            "-map", "0:v:0", "-c:v", ENCODERS[program.codec], "-preset", ENCODE_PRESET, "-crf", str(ENCODE_CRF),
+            "-bf", "0", "-vf", f"scale={program.width}:{program.height}",
+        ]
+        if program.pix_fmt:
+            args += ["-pix_fmt", program.pix_fmt]
+        if program.profile:
+            # "Constrained Baseline" -> "baseline", "High 10" -> "high10"
+            args += ["-profile:v", program.profile.lower().replace("constrained ", "").replace(" ", "")]
+        if plan.audio:
+            args += ["-map", "0:a:0", "-c:a", AUDIO_ENCODERS[program.audio_codec]]
+            if program.sample_rate:
+                args += ["-ar", str(program.sample_rate)]
+            if program.channels:
+                args += ["-ac", str(program.channels)]
+        if program.codec in ANNEXB_FILTERS:
+            args += [*IN_BAND_OPTIONS[program.codec], "-tag:v", SAMPLE_ENTRIES[program.codec]]
+        args += ["-f", "mp4", piece.output]
+        _run(args, video_id, timeout=settings.VIDEO_COMPILATION_TIMEOUT)
+
+    @staticmethod
+    def _copy_entry(piece: Piece, plan: CompilePlan) -> List[str]:
+        """ffconcat lines reading a copied span straight from its source."""
+        # inpoint/outpoint are container timestamps. The demuxer drops packets
+        # from the outpoint on by dts, so it goes just before the closing
+        # keyframe's dts to keep the B-frames shown before it; duration keeps
+        # the timeline exact.
+        source = plan.sources[piece.camera_id]
+        outpoint = piece.end - source.reorder_delay - OUTPOINT_MARGIN
+        return [
+            f"file {_quote(piece.path)}",
+            f"inpoint {piece.start + source.start_time:.6f}",
+            f"outpoint {outpoint + source.start_time:.6f}",
+            f"duration {piece.duration:.6f}",
+        ]
+
+    def _concat(self, video_id: str, plan: CompilePlan, list_path: str, target: str) -> None:
+        lines = ["ffconcat version 1.0"]
+        for piece in plan.pieces:
+            if piece.output is None:
+                lines += self._copy_entry(piece, plan)
+            else:
+                lines += [f"file {_quote(piece.output)}", f"duration {piece.duration:.6f}"]
+        with open(list_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+        partial = f"{target}.part"
+        _run(
+            [self.ffmpeg, "-nostdin", "-v", "error", "-y", "-f", "concat", "-safe", "0", "-i", list_path,
+             "-map", "0:v:0", *(["-map", "0:a:0"] if plan.audio else []),
+             "-c", "copy", "-tag:v", SAMPLE_ENTRIES[plan.program.codec],
+             "-movflags", "+faststart", "-f", "mp4", partial],
+            video_id,
+            timeout=settings.VIDEO_COMPILATION_TIMEOUT,
+        )
+        os.replace(partial, target)
+
+
+def _quote(path: str) -> str:
+    """Path as an ffconcat string (single-quoted, quotes escaped)."""
+    return "'" + os.path.abspath(path).replace("'", "'\\''") + "'"
+
+
+# Shared compiler with the configured ffmpeg and storage directories
+video_compiler = VideoCompiler()
+
+
+@job_engine.task(bind=True, priority=PRIORITY_COMPILATION, time_limit=settings.VIDEO_COMPILATION_TIMEOUT)
+def compile_video(
+    self,
+    video_id: str,
+    edl: Dict[str, Any],
+    sources: Dict[str, str],
+    offsets: Optional[Dict[str, float]] = None
+) -> Dict[str, Any]:
+    """
+    Compile a game video from an edit decision list (``EditDecisionList.to_dict()``).
+
+    ``sources`` maps camera ids to recordings and ``offsets`` holds the
+    audio sync offsets (``SyncResult.offset``) per camera.
+    """
+    def progress(done: int, total: int) -> None:
+        self.update_state(meta={"current": done, "total": total, "video_id": video_id})
+
+    result = video_compiler.compile(video_id, EditDecisionList.from_dict(edl), sources, offsets, progress)
+    if file_storage.remote:
+        # Offload from the job worker so request handlers never wait on the upload
+        self.update_state(meta={"video_id": video_id, "stage": "upload"})
+        result["storage"] = file_storage.put_file(os.path.basename(result["path"]), result["path"], "video/mp4").to_dict()
+    return result
+
+
+@job_engine.task(bind=True, priority=PRIORITY_LIVE_PREVIEW, time_limit=settings.VIDEO_PROCESSING_TIMEOUT)
+def compile_preview(
+    self,
+    video_id: str,
+    edl: Dict[str, Any],
+    sources: Dict[str, str],
+    offsets: Optional[Dict[str, float]] = None
+) -> Dict[str, Any]:
+    """
+    Compile a preview of a game in progress from the EDL so far.
+
+    Same arguments as ``compile_video``; previews are queued ahead of full
+    compilations and stay in local storage.
+    """
+    def progress(done: int, total: int) -> None:
+        self.update_state(meta={"current": done, "total": total, "video_id": video_id})
+
+    return video_compiler.compile(video_id, EditDecisionList.from_dict(edl), sources, offsets, progress)
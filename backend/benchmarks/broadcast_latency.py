@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Broadcast latency benchmark.
+
+Simulates N workers in one process, each with its own WebSocket hub,
+broadcast bus and backend connection. Worker 0 publishes events; the
+benchmark records the time until each fake socket on every worker has the
+event queued for sending.
+
+Usage:
+    python benchmarks/broadcast_latency.py --workers 4 --sockets 50 --events 500
+    python benchmarks/broadcast_latency.py --backend redis --redis-url redis://localhost:6379/0
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.websocket.broadcast import (
+    BroadcastBus,
+    InMemoryBroadcastBackend,
+    InMemoryBroker,
+    RedisBroadcastBackend,
+)
+from app.websocket.connection_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    """Minimal WebSocket stand-in that records delivery latency."""
+
+    def __init__(self, worker: int, latencies: dict):
+        self.worker = worker
+        self.latencies = latencies
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text: str):
+        now = time.perf_counter()
+        event = json.loads(text)
+        self.latencies.setdefault(self.worker, []).append(now - event["sent_at"])
+
+    async def send_bytes(self, data: bytes):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(args) -> dict:
+    broker = InMemoryBroker()
+    latencies = {}
+    game_id = "bench"
+    buses = []
+
+    for worker in range(args.workers):
+        hub = ConnectionManager(max_connections_per_game=args.sockets)
+        if args.backend == "redis":
+            backend = RedisBroadcastBackend(url=args.redis_url)
+        else:
+            backend = InMemoryBroadcastBackend(broker)
+        bus = BroadcastBus(backend, hub=hub, tick_ms=args.tick_ms)
+        await bus.start()
+        for _ in range(args.sockets):
+            await hub.connect(FakeWebSocket(worker, latencies), game_id)
+            await bus.join(game_id)
+        buses.append(bus)
+
+    # Let subscriptions settle
+    await asyncio.sleep(0.5)
+
+    publisher = buses[0]
+    interval = 1.0 / args.rate if args.rate else 0
+    started = time.perf_counter()
+    for i in range(args.events):
+        publisher.publish(game_id, {"type": "bench", "n": i, "sent_at": time.perf_counter()})
+        await asyncio.sleep(interval)
+
+    expected = args.events * args.sockets
+    deadline = time.perf_counter() + 10
+    while time.perf_counter() < deadline:
+        if all(len(latencies.get(w, ())) >= expected for w in range(args.workers)):
+            break
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    for bus in buses:
+        await bus.stop()
+
+    remote = [v for w, values in latencies.items() if w != 0 for v in values]
+    local = latencies.get(0, [])
+    result = {
+        "backend": args.backend,
+        "workers": args.workers,
+        "sockets_per_worker": args.sockets,
+        "events": args.events,
+        "tick_ms": args.tick_ms,
+        "elapsed_s": round(elapsed, 3),
+        "delivered": sum(len(v) for v in latencies.values()),
+        "expected": expected * args.workers,
+    }
+    for label, values in (("local", local), ("remote", remote)):
+        if values:
+            result[f"{label}_p50_ms"] = round(percentile(values, 50) * 1000, 3)
+            result[f"{label}_p95_ms"] = round(percentile(values, 95) * 1000, 3)
+            result[f"{label}_p99_ms"] = round(percentile(values, 99) * 1000, 3)
+            result[f"{label}_mean_ms"] = round(statistics.mean(values) * 1000, 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cross-worker broadcast latency")
+    parser.add_argument("--backend", choices=["memory", "redis"], default="memory")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sockets", type=int, default=10, help="sockets per worker")
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=200.0, help="events per second (0 = as fast as possible)")
+    parser.add_argument("--tick-ms", type=int, default=50)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
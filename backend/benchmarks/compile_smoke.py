@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+End-to-end check of multi-camera compilation.
+
+Generates short recordings from ffmpeg test sources that differ the way real
+phones do, compiles a multi-camera edit decision list with
+``VideoCompiler`` and checks the result by decoding it:
+
+- cameras ``a`` and ``b`` share codec, profile and audio format, but their
+  encoder settings differ (GOP, references, B-frames), and so do their
+  SPS/PPS. Their whole GOPs are stream-copied next to each other and next
+  to re-encoded heads and tails.
+- camera ``c`` (H.264 only) has another profile and 44.1 kHz stereo audio,
+  so its shot is re-encoded whole.
+- the output decodes without errors and uses the ``avc3``/``hev1`` sample
+  entry (parameter sets in-band).
+- frames sampled in every shot, including just after each cut, match the
+  camera the EDL names there, and video and audio last as long as the EDL.
+
+Compile time and copied/encoded seconds are reported per codec. Needs an
+ffmpeg build with libx264 (and libx265 for ``--codecs hevc``).
+
+Usage:
+    python benchmarks/compile_smoke.py
+    python benchmarks/compile_smoke.py --codecs h264,hevc --ffmpeg /usr/local/bin/ffmpeg
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.utils.camera_switching import EditDecisionList, Shot
+from app.workers.video_compiler import SAMPLE_ENTRIES, VideoCompiler
+
+WIDTH, HEIGHT, FPS, SECONDS = 320, 180, 30, 20
+
+# camera -> (video source, audio rate, audio channels, encoder options); phones write closed GOPs
+CAMERAS = {
+    "h264": {
+        "a": ("testsrc2", 48000, 1, ["-c:v", "libx264", "-profile:v", "high", "-g", "60", "-refs", "3"]),
+        "b": ("testsrc", 48000, 1, ["-c:v", "libx264", "-profile:v", "high", "-g", "45", "-refs", "1",
+                                    "-bf", "2", "-x264-params", "cabac=0:weightp=0"]),
+        "c": ("smptebars", 44100, 2, ["-c:v", "libx264", "-profile:v", "main", "-g", "30"]),
+    },
+    "hevc": {
+        "a": ("testsrc2", 48000, 1, ["-c:v", "libx265", "-tag:v", "hvc1", "-x265-params", "log-level=error:keyint=60:open-gop=0"]),
+        "b": ("testsrc", 48000, 1, ["-c:v", "libx265", "-tag:v", "hvc1",
+                                    "-x265-params", "log-level=error:keyint=45:bframes=0:ref=1:ctu=32:open-gop=0"]),
+    },
+}
+SHOTS = {
+    "h264": [("a", 0.0, 5.5), ("b", 5.5, 13.3), ("a", 13.3, 16.0), ("c", 16.0, 19.9)],
+    "hevc": [("a", 0.0, 5.5), ("b", 5.5, 13.3), ("a", 13.3, 19.9)],
+}
+# Mean absolute luma difference accepted between a program frame and its source
+MAX_FRAME_DIFFERENCE = 4.0
+
+
+def check(condition, message):
+    if not condition:
+        raise SystemExit(f"FAIL: {message}")
+    print(f"ok   {message}")
+
+
+def ffmpeg_run(ffmpeg, args):
+    completed = subprocess.run([ffmpeg, "-nostdin", "-v", "error", "-y", *args], capture_output=True)
+    if completed.returncode != 0:
+        raise SystemExit(f"FAIL: ffmpeg {' '.join(args)}: {completed.stderr.decode(errors='replace')[-500:]}")
+    return completed
+
+
+def record(ffmpeg, path, source, rate, channels, options):
+    ffmpeg_run(ffmpeg, [
+        "-f", "lavfi", "-i", f"{source}=s={WIDTH}x{HEIGHT}:r={FPS}:d={SECONDS}",
+        "-f", "lavfi", "-i", f"sine=f={rate // 100}:r={rate}:d={SECONDS}",
+        *options, "-pix_fmt", "yuv420p", "-c:a", "aac", "-ac", str(channels), "-shortest", path,
+    ])
+
+
+def frame_at(ffmpeg, path, seconds):
+    output = ffmpeg_run(ffmpeg, ["-ss", f"{seconds:.3f}", "-i", path, "-frames:v", "1",
+                                 "-f", "rawvideo", "-pix_fmt", "gray", "-"]).stdout
+    return np.frombuffer(output, dtype=np.uint8).astype(np.int16)
+
+
+def stream_seconds(ffmpeg, path, stream):
+    """Decoded duration of the first video or audio stream, from the last frame's timestamp."""
+    output = ffmpeg_run(ffmpeg, ["-i", path, "-map", f"0:{stream}:0", "-f", "framecrc", "-"]).stdout.decode()
+    tb = next(line for line in output.splitlines() if line.startswith("#tb 0:")).split(":")[1].strip()
+    num, den = (int(value) for value in tb.split("/"))
+    last = [line.split(",") for line in output.splitlines() if not line.startswith("#")][-1]
+    return (int(last[2]) + int(last[3])) * num / den
+
+
+def run(ffmpeg, codec, directory):
+    print(f"--- {codec}")
+    paths = {}
+    for camera, (source, rate, channels, options) in CAMERAS[codec].items():
+        paths[camera] = os.path.join(directory, f"{codec}_{camera}.mp4")
+        record(ffmpeg, paths[camera], source, rate, channels, options)
+
+    shots = SHOTS[codec]
+    edl = EditDecisionList([Shot(camera, start, end, 1.0) for camera, start, end in shots])
+    compiler = VideoCompiler(
+        ffmpeg=ffmpeg, output_dir=os.path.join(directory, "out"), work_dir=os.path.join(directory, "work"),
+    )
+    start = time.perf_counter()
+    result = compiler.compile(f"smoke_{codec}", edl, paths)
+    elapsed = time.perf_counter() - start
+    print(f"compiled {result['duration']}s in {elapsed:.2f}s: {result['copied_seconds']}s copied, "
+          f"{result['encoded_seconds']}s encoded in {result['encoded_pieces']} of {result['pieces']} pieces")
+    output = result["path"]
+
+    check(result["copied_seconds"] > 0, "some spans are stream-copied")
+    errors = ffmpeg_run(ffmpeg, ["-i", output, "-f", "null", "-"]).stderr.decode(errors="replace").strip()
+    check(not errors, "output decodes without errors" + (f" ({errors[:200]})" if errors else ""))
+    info = subprocess.run([ffmpeg, "-nostdin", "-i", output], capture_output=True).stderr.decode(errors="replace")
+    check(f"({SAMPLE_ENTRIES[codec]} /" in info, f"{SAMPLE_ENTRIES[codec]} sample entry")
+
+    total = shots[-1][2]
+    video = stream_seconds(ffmpeg, output, "v")
+    audio = stream_seconds(ffmpeg, output, "a")
+    check(abs(video - total) < 2 / FPS, f"video lasts {video:.3f}s")
+    check(abs(audio - total) < 0.1, f"audio lasts {audio:.3f}s")
+
+    for camera, shot_start, shot_end in shots:
+        for at in (shot_start + 0.1, (shot_start + shot_end) / 2, shot_end - 0.1):
+            frame = frame_at(ffmpeg, output, at)
+            differences = {other: float(np.abs(frame - frame_at(ffmpeg, path, at)).mean())
+                           for other, path in paths.items()}
+            best = min(differences, key=differences.get)
+            if best != camera or differences[camera] > MAX_FRAME_DIFFERENCE:
+                raise SystemExit(f"FAIL: frame at {at:.2f}s should show {camera}: differences {differences}")
+        check(True, f"{camera} shot {shot_start}-{shot_end}s shows {camera}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile a multi-camera EDL and verify the result")
+    parser.add_argument("--ffmpeg", default=settings.FFMPEG_BINARY or shutil.which("ffmpeg"))
+    parser.add_argument("--codecs", default="h264", help="comma-separated program codecs (h264, hevc)")
+    args = parser.parse_args()
+    if not args.ffmpeg:
+        parser.error("ffmpeg not found; pass --ffmpeg")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for codec in args.codecs.split(","):
+            run(args.ffmpeg, codec, directory)
+    print("all checks passed")
+
+
+if __name__ == "__main__":
+    main()
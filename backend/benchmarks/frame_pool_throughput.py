@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Frame pool throughput benchmark.
+
+Writes synthetic pre-decoded chunks (``.npy`` frame dumps, BGR at the
+analysis resolution) for several cameras, then decodes and scores them
+with ``FramePool`` at 1..N worker processes and reports frames/sec and the
+speedup over one worker. ``--pickle-baseline`` also runs the same work with
+a plain process pool that returns the decoded frames by pickling and
+scores them in the parent, which is what the shared ring avoids.
+
+Usage:
+    python benchmarks/frame_pool_throughput.py --cameras 6 --chunks 8 --frames 100
+    python benchmarks/frame_pool_throughput.py --workers 1,2,4,8 --pickle-baseline
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.quality_service import ChunkQuality, QualityEngine, to_luma
+from app.workers.frame_pool import FramePool
+
+
+def write_chunks(directory, cameras, chunks, frames, height, width):
+    rng = np.random.default_rng(0)
+    jobs = []
+    for camera in range(cameras):
+        for chunk in range(chunks):
+            path = os.path.join(directory, f"cam{camera}_{chunk}.npy")
+            np.save(path, rng.integers(0, 256, (frames, height, width, 3), dtype=np.uint8))
+            jobs.append((f"cam{camera}", chunk, path))
+    return jobs
+
+
+def run_pool(jobs, workers, frames, height, width):
+    with FramePool(workers=workers, width=width, height=height, max_frames=frames, engine=QualityEngine()) as pool:
+        # Warm up the worker processes before timing
+        list(pool.map(jobs[:workers]))
+        start = time.perf_counter()
+        decoded = sum(len(chunk.frames) for chunk in pool.map(jobs))
+        return decoded / (time.perf_counter() - start), pool.memory_bytes
+
+
+def _decode_and_return(path):
+    return to_luma(np.load(path))
+
+
+def run_pickle_baseline(jobs, workers):
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as executor:
+        list(executor.map(_decode_and_return, [path for _, _, path in jobs[:workers]]))
+        start = time.perf_counter()
+        decoded = 0
+        for (camera_id, chunk, _), luma in zip(jobs, executor.map(_decode_and_return, [path for _, _, path in jobs])):
+            ChunkQuality(camera_id, chunk, luma)
+            decoded += len(luma)
+        return decoded / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure frame pool decode + analysis throughput")
+    parser.add_argument("--cameras", type=int, default=6)
+    parser.add_argument("--chunks", type=int, default=8, help="chunks per camera")
+    parser.add_argument("--frames", type=int, default=100, help="frames per chunk")
+    parser.add_argument("--width", type=int, default=320)
+    parser.add_argument("--height", type=int, default=180)
+    parser.add_argument("--workers", default=None, help="comma-separated worker counts (default 1..cores)")
+    parser.add_argument("--pickle-baseline", action="store_true")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    counts = [int(n) for n in args.workers.split(",")] if args.workers else sorted({1, *range(2, cores + 1, 2), cores})
+
+    with tempfile.TemporaryDirectory() as directory:
+        jobs = write_chunks(directory, args.cameras, args.chunks, args.frames, args.height, args.width)
+        total = len(jobs) * args.frames
+        print(f"{len(jobs)} chunks, {total} frames of {args.width}x{args.height}, {cores} cores")
+        print(f"{'workers':>8} {'frames/s':>10} {'speedup':>8} {'ring MB':>8}" + (f" {'pickle f/s':>11}" if args.pickle_baseline else ""))
+
+        baseline = None
+        for workers in counts:
+            rate, memory = run_pool(jobs, workers, args.frames, args.height, args.width)
+            baseline = baseline or rate
+            line = f"{workers:>8} {rate:>10.0f} {rate / baseline:>7.2f}x {memory / 2 ** 20:>8.1f}"
+            if args.pickle_baseline:
+                line += f" {run_pickle_baseline(jobs, workers):>11.0f}"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
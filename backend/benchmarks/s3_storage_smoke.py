@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+S3 storage smoke check and upload throughput.
+
+Runs ``S3Storage`` against an S3-compatible endpoint (moto server, MinIO or
+a real bucket) and checks what compilation jobs and video delivery rely on:
+
+- single-request and parallel multipart uploads round-trip byte for byte
+- ``stat`` sizes and range reads at random offsets and across part edges
+- a failing part aborts the upload: ``StorageException``, no object and
+  no unfinished multipart upload
+- whether the endpoint rejects a part whose body does not match its
+  ``Content-MD5`` (S3 and MinIO do; moto does not verify body checksums,
+  so this is reported rather than required)
+- missing keys and delete
+
+Upload throughput (MB/s) is reported per file size. Needs ``boto3`` and,
+for ``--moto``, ``moto[server]``.
+
+Usage:
+    python benchmarks/s3_storage_smoke.py --moto
+    python benchmarks/s3_storage_smoke.py --endpoint-url http://127.0.0.1:9000 --bucket videos \\
+        --sizes 4,64,256 --part-mb 8 --concurrency 8
+"""
+
+import argparse
+import hashlib
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.exceptions import StorageException
+from app.utils.file_storage import MB, S3Storage
+
+
+def write_file(path, size, seed):
+    rng = random.Random(seed)
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining:
+            block = min(remaining, 4 * MB)
+            f.write(rng.randbytes(block))
+            remaining -= block
+
+
+def check(condition, message):
+    if not condition:
+        raise SystemExit(f"FAIL: {message}")
+    print(f"ok   {message}")
+
+
+def run(storage, directory, sizes, part_size):
+    client = storage.client
+    existing = [bucket["Name"] for bucket in client.list_buckets().get("Buckets", [])]
+    if storage.bucket not in existing:
+        client.create_bucket(Bucket=storage.bucket)
+
+    print(f"{'size MB':>8} {'parts':>6} {'upload s':>9} {'MB/s':>8}")
+    for index, megabytes in enumerate(sizes):
+        size = int(megabytes * MB) + index  # odd sizes leave a short last part
+        path = os.path.join(directory, f"smoke{index}.mp4")
+        write_file(path, size, index)
+        key = f"smoke/{index}.mp4"
+
+        start = time.perf_counter()
+        stored = storage.put_file(key, path, "video/mp4")
+        elapsed = time.perf_counter() - start
+        parts = -(-size // part_size) if size > part_size else 1
+        print(f"{megabytes:>8} {parts:>6} {elapsed:>9.3f} {size / MB / elapsed:>8.1f}")
+
+        check(stored.size == size, f"{key}: stored size {stored.size}")
+        rng = random.Random(index)
+        offsets = [0, size - 1, min(part_size, size) - 3] + [rng.randrange(size) for _ in range(5)]
+        with open(path, "rb") as f:
+            for offset in offsets:
+                offset = max(0, offset)
+                count = min(7, size - offset)
+                f.seek(offset)
+                if storage.read_range(key, offset, count) != f.read(count):
+                    raise SystemExit(f"FAIL: {key}: range {offset}+{count} differs")
+        check(True, f"{key}: {len(offsets)} range reads")
+
+        copy = path + ".download"
+        storage.get_file(key, copy)
+        with open(path, "rb") as a, open(copy, "rb") as b:
+            same = hashlib.sha256(a.read()).digest() == hashlib.sha256(b.read()).digest()
+        check(same, f"{key}: download matches")
+        check(storage.delete(key) and storage.stat(key) is None, f"{key}: deleted")
+        os.remove(copy)
+
+    size = 2 * part_size + 1
+    path = os.path.join(directory, "failing.mp4")
+    write_file(path, size, 99)
+    upload_part = client.upload_part
+
+    # A part that fails outright must abort the whole upload
+    def failing_part(**kwargs):
+        if kwargs["PartNumber"] == 2:
+            raise ConnectionError("injected part failure")
+        return upload_part(**kwargs)
+
+    client.upload_part = failing_part
+    try:
+        storage.put_file("smoke/failing.mp4", path)
+        raise SystemExit("FAIL: upload with a failed part succeeded")
+    except StorageException as e:
+        check(True, f"failed part raises StorageException ({e.message[:50]}...)")
+    finally:
+        client.upload_part = upload_part
+    pending = client.list_multipart_uploads(Bucket=storage.bucket, Prefix="smoke/").get("Uploads", [])
+    check(not pending, "no unfinished multipart uploads")
+    check(storage.stat("smoke/failing.mp4") is None, "no object for the failed upload")
+
+    # A body changed after its Content-MD5 was computed
+    def corrupt_part(**kwargs):
+        if kwargs["PartNumber"] == 2:
+            kwargs["Body"] = b"\0" + kwargs["Body"][1:]
+        return upload_part(**kwargs)
+
+    client.upload_part = corrupt_part
+    try:
+        storage.put_file("smoke/corrupt.mp4", path)
+        print("note endpoint does not verify Content-MD5 (expected for moto; S3 and MinIO reject the part)")
+        storage.delete("smoke/corrupt.mp4")
+    except StorageException as e:
+        pending = client.list_multipart_uploads(Bucket=storage.bucket, Prefix="smoke/").get("Uploads", [])
+        check(not pending, f"corrupted part rejected and aborted ({e.message[:50]}...)")
+    finally:
+        client.upload_part = upload_part
+    check(storage.stat("smoke/missing.mp4") is None and not storage.delete("smoke/missing.mp4"), "missing key")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Smoke-test S3Storage against an S3-compatible endpoint")
+    parser.add_argument("--endpoint-url", default=settings.AWS_S3_ENDPOINT_URL)
+    parser.add_argument("--moto", action="store_true", help="start an in-process moto server as the endpoint")
+    parser.add_argument("--bucket", default="storage-smoke")
+    parser.add_argument("--sizes", default="1,12,40", help="comma-separated file sizes in MB")
+    parser.add_argument("--part-mb", type=int, default=5, help="multipart part size (minimum 5)")
+    parser.add_argument("--concurrency", type=int, default=settings.S3_UPLOAD_CONCURRENCY)
+    args = parser.parse_args()
+
+    server = None
+    endpoint_url = args.endpoint_url
+    if args.moto:
+        from moto.server import ThreadedMotoServer
+
+        # moto accepts any credentials, including the development defaults
+        logging.getLogger("werkzeug").setLevel(logging.ERROR)
+        server = ThreadedMotoServer(ip_address="127.0.0.1", port=0, verbose=False)
+        server.start()
+        host, port = server.get_host_and_port()
+        endpoint_url = f"http://{host}:{port}"
+    if not endpoint_url:
+        parser.error("--endpoint-url (or AWS_S3_ENDPOINT_URL) or --moto is required")
+
+    storage = S3Storage(
+        bucket=args.bucket,
+        endpoint_url=endpoint_url,
+        part_size=args.part_mb * MB,
+        concurrency=args.concurrency,
+    )
+    print(f"endpoint {endpoint_url}, bucket {args.bucket}, part {storage.part_size // MB} MB, "
+          f"concurrency {storage.concurrency}")
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            run(storage, directory, [float(size) for size in args.sizes.split(",")], storage.part_size)
+    finally:
+        if server is not None:
+            server.stop()
+    print("all checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+#!/usr/bin/env python3
+"""
+WebSocket fan-out load simulator.
+
+Two modes:
+
+In-process (default): drives one worker's game hub (connection manager,
+broadcast bus, game state and presence) with thousands of simulated camera
+and viewer sockets. The sockets are in-memory stand-ins, so this measures
+the hub itself, not the ASGI server, the WebSocket framing or the network
+stack. Cameras send binary telemetry every ``QUALITY_ASSESSMENT_INTERVAL``
+seconds, which goes through the same decode and publish path as the real
+endpoint, and a fraction of them disconnect, reclaim a position and resume
+each interval to churn game state.
+
+Network (``--url``): opens real WebSocket connections to a running server's
+``/ws/game/{game_id}`` endpoint with the ``websockets`` client. Cameras
+negotiate ``hlt.bin.v1``, answer clock sync probes and key frame requests,
+and churning cameras reconnect and resume. Latency is measured from the
+report's ``ts`` to its arrival at a viewer (millisecond resolution; run the
+simulator on the server host or with synchronized clocks). Server memory and
+CPU are not visible from the client; read them off the server process.
+
+Reported (JSON, optionally written to ``--output`` for comparing builds):
+    end-to-end broadcast latency percentiles (publish -> socket send, or
+    camera report -> viewer receive in network mode)
+    memory per connection (tracemalloc while sockets connect; in-process only)
+    CPU per published event and per delivered message (of this process)
+    dropped and coalesced message counts from the bounded send queues
+    (in-process only)
+
+Usage:
+    python benchmarks/ws_load_simulator.py --games 200 --cameras 6 --viewers 20 --duration 30
+    python benchmarks/ws_load_simulator.py --interval 1 --slow-viewers 0.1 --output before.json
+    python benchmarks/ws_load_simulator.py --url ws://127.0.0.1:8000/api/v1/ws --token <access token> \\
+        --games 20 --cameras 6 --viewers 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings
+from app.core.exceptions import InvalidMessageException
+from app.services.position_service import InMemoryPositionStore, PositionAssignmentService
+from app.websocket.broadcast import BroadcastBus, InMemoryBroadcastBackend
+from app.websocket.connection_manager import ConnectionManager
+from app.websocket.game_state import GameStateStore
+from app.websocket.presence import PresenceTracker
+from app.websocket.protocol import (
+    PROTOCOL_BINARY_V1,
+    PROTOCOL_JSON,
+    TelemetryDecoder,
+    TelemetryEncoder,
+    TelemetryReport,
+    decode_control,
+)
+
+
+class SimulatedSocket:
+    """WebSocket stand-in that timestamps telemetry deliveries."""
+
+    __slots__ = ("latencies", "delay", "received")
+
+    def __init__(self, latencies: list, delay: float = 0.0):
+        self.latencies = latencies
+        self.delay = delay
+        self.received = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text: str):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        self.received += 1
+        if '"sent_at"' in text:
+            event = json.loads(text)
+            sent_at = event.get("sent_at")
+            if sent_at is not None:
+                self.latencies.append(time.perf_counter() - sent_at)
+
+    async def send_bytes(self, data: bytes):
+        self.received += 1
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+class SimulatedCamera:
+    """One phone: encoder on the client side, decoder on the server side."""
+
+    def __init__(self, game_id: str, user_id: str):
+        self.game_id = game_id
+        self.user_id = user_id
+        self.encoder = TelemetryEncoder()
+        self.decoder = TelemetryDecoder()
+        self.report = None
+        self.connection = None
+        self.battery = 100.0
+
+    def next_frame(self) -> bytes:
+        self.battery = max(0.0, self.battery - random.random() * 0.05)
+        self.report = TelemetryReport.from_dict({
+            "ts": int(time.time() * 1000),
+            "x": random.uniform(0, 200),
+            "y": random.uniform(0, 85),
+            "heading": random.uniform(0, 360),
+            "quality": random.random(),
+            "stability": random.random(),
+            "battery": self.battery,
+            "recording": True,
+        }, self.report)
+        return self.encoder.encode(self.report)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LoadSimulation:
+    def __init__(self, args):
+        self.args = args
+        per_game = args.cameras + args.viewers
+        self.hub = ConnectionManager(
+            max_connections_per_game=per_game,
+            send_queue_size=args.queue_size
+        )
+        self.state = GameStateStore(directory=None)
+        self.bus = BroadcastBus(
+            InMemoryBroadcastBackend(), hub=self.hub, tick_ms=args.tick_ms, state=self.state
+        )
+        self.presence = PresenceTracker(bus=self.bus, hub=self.hub, tick_ms=args.presence_tick_ms)
+        self.positions = PositionAssignmentService(InMemoryPositionStore())
+        self.latencies = []
+        self.sockets = []
+        self.cameras = []
+        self.published = 0
+        self.reconnects = 0
+        self.decode_errors = 0
+
+    async def connect_camera(self, camera: SimulatedCamera) -> None:
+        socket = SimulatedSocket(self.latencies)
+        self.sockets.append(socket)
+        camera.connection = await self.hub.connect(
+            socket, camera.game_id, user_id=camera.user_id, role="camera", subprotocol=PROTOCOL_BINARY_V1
+        )
+        await self.bus.join(camera.game_id)
+        camera.encoder.request_keyframe()
+        camera.decoder = TelemetryDecoder()
+        assignment = await self.positions.claim(
+            camera.game_id, camera.user_id, camera_count=self.args.cameras
+        )
+        self.presence.update(camera.game_id, camera.user_id, status="online", position=assignment.position)
+
+    async def disconnect_camera(self, camera: SimulatedCamera) -> None:
+        self.presence.leave(camera.game_id, camera.user_id)
+        await self.positions.release(camera.game_id, camera.user_id)
+        self.hub.disconnect(camera.connection)
+        await self.bus.leave(camera.game_id)
+
+    async def setup(self) -> dict:
+        """Connect every socket; returns memory accounting for the connect phase."""
+        args = self.args
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        for g in range(args.games):
+            game_id = f"game-{g}"
+            for v in range(args.viewers):
+                slow = random.random() < args.slow_viewers
+                socket = SimulatedSocket(self.latencies, args.slow_delay_ms / 1000.0 if slow else 0.0)
+                self.sockets.append(socket)
+                await self.hub.connect(socket, game_id, user_id=f"{game_id}-viewer-{v}")
+                await self.bus.join(game_id)
+            for c in range(args.cameras):
+                camera = SimulatedCamera(game_id, f"{game_id}-camera-{c}")
+                await self.connect_camera(camera)
+                self.cameras.append(camera)
+        after, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        connections = len(self.sockets)
+        return {
+            "connections": connections,
+            "memory_per_connection_bytes": round((after - before) / max(1, connections), 1),
+            "connect_peak_bytes": peak,
+        }
+
+    async def run_camera(self, camera: SimulatedCamera, deadline: float) -> None:
+        interval = self.args.interval
+        # Spread cameras over the interval so they do not fire in lockstep
+        await asyncio.sleep(random.random() * interval)
+        while time.perf_counter() < deadline:
+            frame = camera.next_frame()
+            try:
+                report = camera.decoder.decode(frame)
+            except InvalidMessageException:
+                self.decode_errors += 1
+                camera.encoder.request_keyframe()
+            else:
+                event = report.to_dict()
+                event["type"] = "telemetry"
+                event["camera"] = camera.user_id
+                event["sent_at"] = time.perf_counter()
+                self.bus.publish(camera.game_id, event, key=f"telemetry:{camera.user_id}")
+                self.published += 1
+
+            if random.random() < self.args.churn:
+                log = self.state.get(camera.game_id)
+                epoch, seen = log.epoch, log.head
+                await self.disconnect_camera(camera)
+                await self.connect_camera(camera)
+                self.hub.send(camera.connection, log.resume(epoch, seen))
+                self.reconnects += 1
+
+            await asyncio.sleep(interval * random.uniform(0.9, 1.1))
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        deadline = time.perf_counter() + timeout
+        while time.perf_counter() < deadline:
+            pending = sum(
+                connection.pending
+                for members in self.hub.games.values()
+                for connection in members.values()
+            )
+            if not pending:
+                return
+            await asyncio.sleep(0.05)
+
+    async def run(self) -> dict:
+        args = self.args
+        await self.bus.start()
+        setup = await self.setup()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        deadline = wall_start + args.duration
+        await asyncio.gather(*(self.run_camera(camera, deadline) for camera in self.cameras))
+        await self.presence.stop()
+        await self.drain()
+        cpu = time.process_time() - cpu_start
+        elapsed = time.perf_counter() - wall_start
+
+        delivered = sum(socket.received for socket in self.sockets)
+        coalesced = sum(
+            connection.coalesced
+            for members in self.hub.games.values()
+            for connection in members.values()
+        )
+        hub_stats = self.hub.stats()
+        await self.bus.stop()
+
+        result = {
+            "mode": "in-process",
+            "python": platform.python_version(),
+            "games": args.games,
+            "cameras_per_game": args.cameras,
+            "viewers_per_game": args.viewers,
+            "interval_s": args.interval,
+            "duration_s": round(elapsed, 3),
+            "churn": args.churn,
+            "slow_viewers": args.slow_viewers,
+            "queue_size": args.queue_size,
+            **setup,
+            "published_events": self.published,
+            "delivered_messages": delivered,
+            "telemetry_deliveries": len(self.latencies),
+            "dropped_messages": hub_stats["dropped_messages"],
+            "coalesced_messages": coalesced,
+            "reconnects": self.reconnects,
+            "decode_errors": self.decode_errors,
+            "cpu_s": round(cpu, 3),
+            "cpu_per_event_us": round(cpu / max(1, self.published) * 1e6, 2),
+            "cpu_per_message_us": round(cpu / max(1, delivered) * 1e6, 2),
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "presence": self.presence.stats(),
+        }
+        if self.latencies:
+            result["latency_p50_ms"] = round(percentile(self.latencies, 50) * 1000, 3)
+            result["latency_p95_ms"] = round(percentile(self.latencies, 95) * 1000, 3)
+            result["latency_p99_ms"] = round(percentile(self.latencies, 99) * 1000, 3)
+            result["latency_max_ms"] = round(max(self.latencies) * 1000, 3)
+            result["latency_mean_ms"] = round(statistics.mean(self.latencies) * 1000, 3)
+        return result
+
+
+class NetworkSimulation:
+    """The same load over real WebSocket connections to a running server."""
+
+    def __init__(self, args):
+        # Optional client dependency, only needed for this mode
+        import websockets
+
+        self.websockets = websockets
+        self.args = args
+        self.url = args.url.rstrip("/")
+        self.latencies = []
+        self.tasks = []
+        self.sockets = 0
+        self.published = 0
+        self.delivered = 0
+        self.reconnects = 0
+        self.keyframe_requests = 0
+        self.rejected = 0
+
+    def endpoint(self, game_id: str, role: str) -> str:
+        return f"{self.url}/game/{game_id}?token={self.args.token}&role={role}"
+
+    async def open(self, game_id: str, role: str, subprotocol: str):
+        socket = await self.websockets.connect(
+            self.endpoint(game_id, role), subprotocols=[subprotocol], max_queue=None, open_timeout=30
+        )
+        self.sockets += 1
+        return socket
+
+    async def run_viewer(self, game_id: str, slow: bool) -> None:
+        socket = await self.open(game_id, "viewer", PROTOCOL_JSON)
+        delay = self.args.slow_delay_ms / 1000.0 if slow else 0.0
+        try:
+            async for text in socket:
+                if delay:
+                    await asyncio.sleep(delay)
+                self.delivered += 1
+                if '"telemetry"' in text:
+                    event = json.loads(text)
+                    if event.get("type") == "telemetry" and event.get("ts") is not None:
+                        now_ms = int(time.time() * 1000) & 0xFFFFFFFF
+                        self.latencies.append(((now_ms - int(event["ts"])) & 0xFFFFFFFF) / 1000.0)
+        except self.websockets.ConnectionClosed:
+            pass
+
+    async def camera_receiver(self, socket, camera: SimulatedCamera) -> None:
+        try:
+            async for message in socket:
+                self.delivered += 1
+                if isinstance(message, bytes):
+                    try:
+                        if decode_control(message)["command"] == "request_keyframe":
+                            camera.encoder.request_keyframe()
+                            self.keyframe_requests += 1
+                    except InvalidMessageException:
+                        pass
+                elif '"clock_sync"' in message:
+                    probe = json.loads(message)
+                    await socket.send(json.dumps({
+                        "type": "clock_sync", "id": probe["id"], "client_ts": time.time() * 1000
+                    }))
+        except self.websockets.ConnectionClosed:
+            pass
+
+    async def run_camera(self, camera: SimulatedCamera, deadline: float) -> None:
+        interval = self.args.interval
+        socket = await self.open(camera.game_id, "camera", PROTOCOL_BINARY_V1)
+        receiver = asyncio.ensure_future(self.camera_receiver(socket, camera))
+        await asyncio.sleep(random.random() * interval)
+        try:
+            while time.perf_counter() < deadline:
+                await socket.send(camera.next_frame())
+                self.published += 1
+                if random.random() < self.args.churn:
+                    await socket.close()
+                    await receiver
+                    socket = await self.open(camera.game_id, "camera", PROTOCOL_BINARY_V1)
+                    receiver = asyncio.ensure_future(self.camera_receiver(socket, camera))
+                    # A new connection has a fresh server-side decoder
+                    camera.encoder.request_keyframe()
+                    await socket.send(json.dumps({"type": "resume", "last_seq": 0}))
+                    self.reconnects += 1
+                await asyncio.sleep(interval * random.uniform(0.9, 1.1))
+        except self.websockets.ConnectionClosed:
+            self.rejected += 1
+        finally:
+            await socket.close()
+            await receiver
+
+    async def run(self) -> dict:
+        args = self.args
+        viewers = []
+        cameras = []
+        for g in range(args.games):
+            game_id = f"game-{g}"
+            for _ in range(args.viewers):
+                viewers.append(asyncio.ensure_future(self.run_viewer(game_id, random.random() < args.slow_viewers)))
+            cameras.extend(SimulatedCamera(game_id, f"{game_id}-camera-{c}") for c in range(args.cameras))
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        deadline = wall_start + args.duration
+        await asyncio.gather(*(self.run_camera(camera, deadline) for camera in cameras))
+        # Let the last reports reach the viewers before closing them
+        await asyncio.sleep(max(1.0, args.tick_ms / 1000.0 * 4))
+        cpu = time.process_time() - cpu_start
+        elapsed = time.perf_counter() - wall_start
+        for task in viewers:
+            task.cancel()
+        results = await asyncio.gather(*viewers, return_exceptions=True)
+        failed = [r for r in results if isinstance(r, Exception) and not isinstance(r, asyncio.CancelledError)]
+
+        result = {
+            "mode": "network",
+            "url": self.url,
+            "python": platform.python_version(),
+            "games": args.games,
+            "cameras_per_game": args.cameras,
+            "viewers_per_game": args.viewers,
+            "interval_s": args.interval,
+            "duration_s": round(elapsed, 3),
+            "churn": args.churn,
+            "slow_viewers": args.slow_viewers,
+            "connections": self.sockets,
+            "failed_viewers": len(failed),
+            "rejected_cameras": self.rejected,
+            "published_events": self.published,
+            "delivered_messages": self.delivered,
+            "telemetry_deliveries": len(self.latencies),
+            "reconnects": self.reconnects,
+            "keyframe_requests": self.keyframe_requests,
+            "client_cpu_s": round(cpu, 3),
+            "client_max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
+        if self.latencies:
+            result["latency_p50_ms"] = round(percentile(self.latencies, 50) * 1000, 3)
+            result["latency_p95_ms"] = round(percentile(self.latencies, 95) * 1000, 3)
+            result["latency_p99_ms"] = round(percentile(self.latencies, 99) * 1000, 3)
+            result["latency_max_ms"] = round(max(self.latencies) * 1000, 3)
+            result["latency_mean_ms"] = round(statistics.mean(self.latencies) * 1000, 3)
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate camera/viewer WebSocket load on one worker")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--cameras", type=int, default=settings.MAX_CAMERAS_PER_GAME, help="cameras per game")
+    parser.add_argument("--viewers", type=int, default=20, help="viewers per game")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of telemetry")
+    parser.add_argument("--interval", type=float, default=settings.QUALITY_ASSESSMENT_INTERVAL,
+                        help="seconds between telemetry reports per camera")
+    parser.add_argument("--churn", type=float, default=0.02,
+                        help="probability a camera reconnects after each report")
+    parser.add_argument("--slow-viewers", type=float, default=0.0, help="fraction of slow viewer sockets")
+    parser.add_argument("--slow-delay-ms", type=float, default=200.0, help="send delay of slow sockets")
+    parser.add_argument("--queue-size", type=int, default=64, help="per-socket send queue bound")
+    parser.add_argument("--tick-ms", type=int, default=settings.BROADCAST_TICK_MS)
+    parser.add_argument("--presence-tick-ms", type=int, default=settings.PRESENCE_TICK_MS)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="also write the JSON result to this file")
+    parser.add_argument("--url", help="WebSocket base of a running server (e.g. ws://host:8000/api/v1/ws); "
+                                      "connects real sockets instead of in-process stand-ins")
+    parser.add_argument("--token", help="access token for --url connections")
+    args = parser.parse_args()
+    if args.url and not args.token:
+        parser.error("--url requires --token")
+
+    random.seed(args.seed)
+    simulation = NetworkSimulation(args) if args.url else LoadSimulation(args)
+    result = asyncio.run(simulation.run())
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
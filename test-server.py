@@ -3,9 +3,18 @@
 Simple test server to verify mobile app connectivity
 """
 import json
+import os
+import sys
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 
+# Serve the real arena registry when the backend's dependencies are installed
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+try:
+    from app.services.arena_service import arena_registry
+except ImportError:
+    arena_registry = None
+
 class TestHandler(BaseHTTPRequestHandler):
     def do_OPTIONS(self):
         """Handle CORS preflight requests"""
@@ -39,11 +48,14 @@ class TestHandler(BaseHTTPRequestHandler):
                 "status": "running"
             }
         elif parsed_url.path == '/api/v1/arena/types':
+            if arena_registry is not None:
+                self.wfile.write(arena_registry.types_response.body)
+                return
             response = {
                 "arena_types": [
                     {"id": 1, "name": "standard", "description": "Standard NHL size rink"},
                     {"id": 2, "name": "olympic", "description": "Olympic size rink"},
-                    {"id": 3, "name": "practice", "description": "Practice rink"}
+                    {"id": 3, "name": "junior", "description": "Junior/Youth rink"}
                 ]
             }
         else: